@@ -4,6 +4,7 @@
 from abc import ABC
 from typing import final, Any, FrozenSet, List, Type
 from enum import Enum
+from pathlib import Path
 from typing import Optional
 
 from astropy.time import TimeDelta
@@ -12,6 +13,7 @@ import astropy.units as u
 from lucupy.minimodel.observation import ObservationClass
 from lucupy.minimodel.program import ProgramTypes
 
+from definitions import ROOT_DIR
 from scheduler.config import config, ConfigurationError
 from scheduler.core.components.optimizer.optimizers import BaseOptimizer, Optimizers
 
@@ -57,12 +59,18 @@ class Blueprint(ABC):
 class CollectorBlueprint(Blueprint):
     """Blueprint for the Collector.
     This is based on the configuration in config.yml.
+    track_cache_dir is the directory of the on-disk target track cache, relative to the root of the project if it is
+    not absolute, and the cache is disabled if it is not set.
+    max_target_info_nights is the number of nights of target information kept by the Collector, which are all kept
+    if it is not set.
     """
 
     def __init__(self,
                  obs_class: List[str],
                  prg_type: List[str],
-                 time_slot_length: float) -> None:
+                 time_slot_length: float,
+                 track_cache_dir: Optional[str] = None,
+                 max_target_info_nights: Optional[int] = None) -> None:
         self.obs_classes: FrozenSet[ObservationClass] = frozenset(
             map(lambda x: parse_configuration(ObservationClass, x), obs_class)
         )
@@ -70,6 +78,8 @@ class CollectorBlueprint(Blueprint):
             map(lambda x: parse_configuration(ProgramTypes, x), prg_type)
         )
         self.time_slot_length: TimeDelta = TimeDelta(time_slot_length * u.min)
+        self.track_cache_dir: Optional[Path] = Path(ROOT_DIR) / track_cache_dir if track_cache_dir else None
+        self.max_target_info_nights = max_target_info_nights
 
     def __iter__(self):
         return iter((self.time_slot_length,
@@ -82,12 +92,19 @@ class SelectorBlueprint(Blueprint):
     """Blueprint for the Selector.
     This is based on the configuration in config.yml used to specify the buffer time to determine by how much programs
     may go over their time limit.
+    num_processes is the number of processes that score the programs, and incremental determines if selections are
+    derived from the previous one when possible: see Selector. By default, programs are scored sequentially and
+    selections are not derived.
     """
     def __init__(self,
                  buffer_type_str: str,
-                 buffer_amount: Optional[float]):
+                 buffer_amount: Optional[float],
+                 num_processes: int = 1,
+                 incremental: bool = False):
         self.buffer_type_str = buffer_type_str
         self.buffer_amount = buffer_amount
+        self.num_processes = num_processes
+        self.incremental = incremental
 
     def __iter__(self):
         return iter((self.buffer_type_str,
@@ -119,7 +136,11 @@ class OptimizerBlueprint(Blueprint):
 class Blueprints:
     collector: CollectorBlueprint = CollectorBlueprint(config.collector.observation_classes,
                                                        config.collector.program_types,
-                                                       config.collector.time_slot_length)
+                                                       config.collector.time_slot_length,
+                                                       config.collector.get('track_cache_dir'),
+                                                       config.collector.get('max_target_info_nights'))
     selector: SelectorBlueprint = SelectorBlueprint(config.selector.buffer_type,
-                                                    config.selector.buffer_amount)
+                                                    config.selector.buffer_amount,
+                                                    config.selector.get('num_processes', 1),
+                                                    config.selector.get('incremental', False))
     optimizer: OptimizerBlueprint = OptimizerBlueprint(config.optimizer.name)
@@ -43,16 +43,28 @@ class SchedulerBuilder(ABC):
                         program_list: Optional[bytes] = None) -> Collector:
         # TODO: Removing sources from Collector I think it was an idea
         # TODO: we might want to implement so all these are static methods.
-        collector = Collector(start, end, num_of_nights, sites, semesters, self.sources, with_redis, *blueprint)
+        collector = Collector(start, end, num_of_nights, sites, semesters, self.sources, with_redis, *blueprint,
+                              max_target_info_nights=blueprint.max_target_info_nights,
+                              track_cache_dir=blueprint.track_cache_dir)
         return collector
 
     @staticmethod
     def build_selector(collector: Collector,
                        num_nights_to_schedule: int,
-                       blueprint: SelectorBlueprint) -> Selector:
+                       blueprint: SelectorBlueprint,
+                       num_processes: Optional[int] = None,
+                       incremental: Optional[bool] = None,
+                       sparse_scores: bool = False) -> Selector:
+        """
+        Build a Selector. The number of processes and the incremental mode are taken from the blueprint unless they
+        are given.
+        """
         return Selector(collector=collector,
                         num_nights_to_schedule=num_nights_to_schedule,
-                        time_buffer=create_time_buffer(*blueprint))
+                        time_buffer=create_time_buffer(*blueprint),
+                        num_processes=blueprint.num_processes if num_processes is None else num_processes,
+                        incremental=blueprint.incremental if incremental is None else incremental,
+                        sparse_scores=sparse_scores)
 
     @staticmethod
     def build_optimizer(blueprint: OptimizerBlueprint) -> Optimizer:
@@ -1,9 +1,11 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
+from .slotmask import *
 from .targetinfo import *
 from .groupinfo import *
 from .nightevents import *
 from .programinfo import *
 from .scores import *
+from .timeaccounting import *
 from .selection import *
@@ -2,12 +2,13 @@
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
 from dataclasses import dataclass
-from typing import final, Dict, TypeAlias
+from typing import final, Dict, Optional, TypeAlias
 
-from lucupy.minimodel import Conditions, Group, NightIndex, TimeslotIndex, UniqueGroupID
+from lucupy.minimodel import Conditions, Group, NightIndex, UniqueGroupID
 import numpy.typing as npt
 
 from .scores import Scores
+from .slotmask import SlotMask
 
 
 __all__ = [
@@ -33,16 +34,20 @@ class GroupInfo:
        configuration data.
     4. Scoring based on how close the conditions for the group are to the actual conditions.
     5. Scoring based on how the wind affects the group.
-    6. A list of indices of the time slots across the nights as to when the group can be scheduled.
+    6. The time slots across the nights as to when the group can be scheduled.
     7. The score assigned to the group.
+    8. For observation groups, the completion-dependent metric factor of the Ranker that went into the score,
+       if the Ranker supports it. As the score is proportional to it, the score can be rescaled when only the
+       metric factor changes (see Selector.rescore_program).
     """
     minimum_conditions: Conditions
     is_splittable: bool
     night_filtering: Dict[NightIndex, bool]
     conditions_score: Dict[NightIndex, npt.NDArray[float]]
     wind_score: Dict[NightIndex, npt.NDArray[float]]
-    schedulable_slot_indices: Dict[NightIndex, npt.NDArray[TimeslotIndex]]
+    schedulable_slots: Dict[NightIndex, SlotMask]
     scores: Scores
+    metric_factor: Optional[float] = None
 
 
 # Leave this non-immutable as group might change, and we want that change to perpetuate.
@@ -50,9 +55,9 @@ class GroupInfo:
 class GroupData:
     """
     Associates Groups with their GroupInfo.
-    group is a deep copy.
+    group is shared with the Collector.
     """
-    # Deep-copied.
+    # Shared with the Collector.
     group: Group
 
     group_info: GroupInfo
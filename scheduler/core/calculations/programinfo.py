@@ -24,13 +24,13 @@ class ProgramInfo:
     This represents the information for a program that contains schedulable components during the time frame
     under consideration, along with those schedulable components.
     """
-    # Deep-copied.
+    # Shared with the Collector: see TimeAccounting.
     program: Program
 
     # Schedulable groups by ID and their information.
     group_data_map: GroupDataMap
 
-    # Deep-coped.
+    # Shared with the Collector.
     # Schedulable observations by their ID. This is duplicated in the group information above
     # but provided for convenience.
     observations: Mapping[ObservationID, Observation]
@@ -1,16 +1,23 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
-from typing import Dict, TypeAlias
+from typing import final, Dict, Iterable, List, Optional, Sequence, Tuple, TypeAlias, Union
 
-from lucupy.minimodel import NightIndex
+from lucupy.minimodel import NightIndex, NightIndices, Site, UniqueGroupID
+import numpy as np
 import numpy.typing as npt
 
+from .slotmask import SlotMask
+
 
 __all__ = [
     'NightIndex',
     'NightTimeslotScores',
     'Scores',
+    'ScoreMatrix',
+    'SparseNightScores',
+    'stack_scores',
+    'unstack_scores',
 ]
 
 
@@ -19,4 +26,203 @@ NightTimeslotScores: TypeAlias = npt.NDArray[float]
 
 # Scores across all nights per timeslot.
 # Indexed by night index, and then timeslot index.
-Scores: TypeAlias = Dict[NightIndex, NightTimeslotScores]
+# The scores of a night may be stored as SparseNightScores (see Selector.sparse_scores).
+Scores: TypeAlias = Dict[NightIndex, Union[NightTimeslotScores, 'SparseNightScores']]
+
+
+@final
+class SparseNightScores:
+    """
+    The scores of a group for a single night, stored as the spans of time slots with a non-zero score: the spans are
+    kept as an array with entries [a, b], where the span goes from a (inclusive) to b (exclusive), and their scores
+    are concatenated in one array. The scores are zero outside the visibility and timing windows of a group, so this
+    is usually a small fraction of the size of the array of scores for the night.
+
+    This supports the operations that are performed on the scores of a group for a night: indexing and slicing
+    (which return dense values), max, argmax, sum, multiplication by a number or an array, and conversion to an
+    array through np.asarray, which is used by any other numpy operation. The spans give the non-zero intervals of
+    the scores directly (see GreedyMaxOptimizer.non_zero_intervals).
+
+    Instances are immutable.
+    """
+    __slots__ = ('length', 'spans', 'values', '_offsets')
+
+    def __init__(self, length: int, spans: npt.NDArray[int], values: npt.NDArray[float]):
+        self.length = length
+        self.spans = np.asarray(spans, dtype=int).reshape(-1, 2)
+        self.values = np.asarray(values, dtype=float)
+
+        # _offsets[i] is the index in values of the first score of span i.
+        self._offsets = np.concatenate(([0], np.cumsum(self.spans[:, 1] - self.spans[:, 0])))
+        self.spans.flags.writeable = False
+        self.values.flags.writeable = False
+
+    @staticmethod
+    def from_dense(scores: NightTimeslotScores) -> 'SparseNightScores':
+        scores = np.asarray(scores, dtype=float)
+        non_zero = scores != 0
+        return SparseNightScores(len(scores), SlotMask.from_bool(non_zero).runs(), scores[non_zero])
+
+    def _time_slots(self) -> npt.NDArray[int]:
+        """
+        The time slots of the scores in values.
+        """
+        span_lengths = np.diff(self._offsets)
+        return np.arange(len(self.values)) + np.repeat(self.spans[:, 0] - self._offsets[:-1], span_lengths)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __array__(self, dtype=None, copy=None) -> NightTimeslotScores:
+        dense = np.zeros(self.length, dtype=float if dtype is None else dtype)
+        dense[self._time_slots()] = self.values
+        return dense
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[float, NightTimeslotScores]:
+        """
+        The score at a time slot, or the dense scores over a slice of time slots.
+        """
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step != 1:
+                return np.asarray(self)[key]
+
+            # Copy the parts of the spans that overlap the slice, as in ScoreIndex.non_zero_intervals.
+            dense = np.zeros(max(stop - start, 0))
+            first = np.searchsorted(self.spans[:, 1], start, side='right')
+            last = np.searchsorted(self.spans[:, 0], stop, side='left')
+            for (span_start, span_stop), offset in zip(self.spans[first:last], self._offsets[first:last]):
+                a, b = max(span_start, start), min(span_stop, stop)
+                dense[a - start:b - start] = self.values[offset + a - span_start:offset + b - span_start]
+            return dense
+
+        time_slot = int(key)
+        if time_slot < 0:
+            time_slot += self.length
+        if not 0 <= time_slot < self.length:
+            raise IndexError(f'Time slot {key} is out of bounds for a night of {self.length} time slots.')
+        span = np.searchsorted(self.spans[:, 1], time_slot, side='right')
+        if span == len(self.spans) or self.spans[span, 0] > time_slot:
+            return 0.0
+        return float(self.values[self._offsets[span] + time_slot - self.spans[span, 0]])
+
+    def non_zero_intervals(self) -> npt.NDArray[int]:
+        """
+        The spans of non-zero scores, as per GreedyMaxOptimizer.non_zero_intervals.
+        """
+        return self.spans
+
+    # The signatures of max, argmax, and sum match those of the ndarray methods, so that np.max, np.argmax, and
+    # np.sum can be applied to the scores. Only the reductions over the whole night are supported.
+    def max(self, axis: Optional[int] = None, out: None = None, **kwargs) -> float:
+        if not len(self.values):
+            return 0.0
+        values_max = float(self.values.max())
+        return values_max if len(self.values) == self.length else max(values_max, 0.0)
+
+    def argmax(self, axis: Optional[int] = None, out: None = None, **kwargs) -> int:
+        # The scores in values are in the order of their time slots, so the first maximum is the first in values
+        # unless the maximum is a zero outside the spans.
+        if len(self.values) and self.values.max() > 0.0:
+            return int(self._time_slots()[self.values.argmax()])
+        return int(np.argmax(np.asarray(self)))
+
+    def sum(self, axis: Optional[int] = None, dtype=None, out: None = None, **kwargs) -> float:
+        return float(self.values.sum())
+
+    def __mul__(self, other: Union[float, NightTimeslotScores]) -> 'SparseNightScores':
+        if np.ndim(other) == 0:
+            if other == 0:
+                return SparseNightScores(self.length, np.empty((0, 2), dtype=int), np.empty(0))
+            return SparseNightScores(self.length, self.spans, self.values * other)
+        time_slots = self._time_slots()
+        values = self.values * np.asarray(other, dtype=float)[time_slots]
+        non_zero = np.zeros(self.length, dtype=bool)
+        non_zero[time_slots[values != 0]] = True
+        return SparseNightScores(self.length, SlotMask.from_bool(non_zero).runs(), values[values != 0])
+
+    __rmul__ = __mul__
+
+    @property
+    def nbytes(self) -> int:
+        return self.spans.nbytes + self.values.nbytes + self._offsets.nbytes
+
+
+@final
+class ScoreMatrix:
+    """
+    Columnar layout of the scores of a collection of groups for a site and night: a contiguous
+    (n_groups x n_slots) array with one row per group, looked up by UniqueGroupID.
+
+    The rows are handed out as views, so updating the scores of a group in place is visible both through the
+    matrix and through the row held by the group.
+    """
+
+    def __init__(self,
+                 site: Site,
+                 night_idx: NightIndex,
+                 unique_group_ids: Iterable[UniqueGroupID],
+                 night_scores: Iterable[NightTimeslotScores]):
+        self.site = site
+        self.night_idx = night_idx
+        self.unique_group_ids: List[UniqueGroupID] = list(unique_group_ids)
+        self.row_index: Dict[UniqueGroupID, int] = {unique_group_id: row
+                                                    for row, unique_group_id in enumerate(self.unique_group_ids)}
+        rows = [np.asarray(scores, dtype=float) for scores in night_scores]
+        n_slots = len(rows[0]) if rows else 0
+        self.scores: npt.NDArray[float] = np.zeros((len(rows), n_slots))
+        for row, scores in enumerate(rows):
+            self.scores[row] = scores
+
+    def __contains__(self, unique_group_id: UniqueGroupID) -> bool:
+        return unique_group_id in self.row_index
+
+    def __len__(self) -> int:
+        return len(self.unique_group_ids)
+
+    def row(self, unique_group_id: UniqueGroupID) -> NightTimeslotScores:
+        """
+        The scores of a group as a view into the matrix.
+        """
+        return self.scores[self.row_index[unique_group_id]]
+
+    def update(self, unique_group_id: UniqueGroupID, scores: NightTimeslotScores) -> None:
+        """
+        Overwrite the scores of a group in place.
+        """
+        self.scores[self.row_index[unique_group_id]] = scores
+
+    def interval_max(self, start: int, stop: int) -> npt.NDArray[float]:
+        """
+        The maximum score of every group over the time slots from start (inclusive) to stop (exclusive).
+        A matrix with no groups has no time slots either, so this is checked before slicing.
+        """
+        if stop <= start or not self.unique_group_ids:
+            return np.zeros(len(self.unique_group_ids))
+        return self.scores[:, start:stop].max(axis=1)
+
+
+def stack_scores(scores: Sequence[Dict[NightIndex, npt.NDArray[float]]],
+                 night_indices: NightIndices) -> Tuple[npt.NDArray[float], npt.NDArray[int]]:
+    """
+    Stack the arrays per night of several groups (e.g. their scores or conditions scores) into an array of shape
+    (#groups, #timeslots across the nights), with the nights concatenated in the order of night_indices, so that
+    they can be combined across the groups for all the nights with one operation.
+
+    Return the stacked array and the offsets of the nights in it, to be passed to unstack_scores.
+    """
+    stacked = np.array([np.concatenate([group_scores[night_idx] for night_idx in night_indices])
+                        for group_scores in scores], dtype=float)
+    night_lengths = [len(scores[0][night_idx]) for night_idx in night_indices] if scores else []
+    offsets = np.concatenate(([0], np.cumsum(night_lengths, dtype=int)))
+    return stacked, offsets
+
+
+def unstack_scores(stacked: npt.NDArray[float],
+                   night_indices: NightIndices,
+                   offsets: npt.NDArray[int]) -> Dict[NightIndex, npt.NDArray[float]]:
+    """
+    Split an array with the nights concatenated as per stack_scores (e.g. the combination of a stacked array
+    across the groups) back into an array per night.
+    """
+    return {night_idx: stacked[..., offsets[idx]:offsets[idx + 1]] for idx, night_idx in enumerate(night_indices)}
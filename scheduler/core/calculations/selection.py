@@ -1,18 +1,21 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import timedelta
-from typing import final, Callable, FrozenSet, Mapping, Optional, Dict
+from typing import final, Callable, FrozenSet, Mapping, Optional, Dict, Tuple
 
 from lucupy.helpers import flatten
-from lucupy.minimodel import Group, NightIndices, Program, ProgramID, Site, UniqueGroupID, VariantSnapshot
+from lucupy.minimodel import (Group, NightIndex, NightIndices, Program, ProgramID, Site, UniqueGroupID,
+                              VariantSnapshot)
 
 from scheduler.core.components.ranker import Ranker
 from scheduler.core.types import StartingTimeslots
 from scheduler.core.calculations.nightevents import NightEvents
 from scheduler.core.calculations.programinfo import ProgramCalculations, ProgramInfo
 from scheduler.core.calculations.groupinfo import GroupData
+from scheduler.core.calculations.scores import Scores, ScoreMatrix
+from scheduler.core.calculations.timeaccounting import TimeAccounting
 
 
 __all__ = [
@@ -30,6 +33,15 @@ class Selection:
     Note that the _program_scorer is a configured method to re-score a Program. It carries a lot of data with it,
     and as a result, it is not pickled, so any unpickling of a Selection object will have:
     _program_scorer = None.
+    The same holds for the _program_rescorer, which re-scores a Program incrementally from its ProgramInfo after
+    time has been charged to it.
+
+    The scores of the schedulable groups can optionally be laid out as one ScoreMatrix per site and night
+    (see build_score_matrices), in which case the GroupInfo.scores of the schedulable groups are views into the
+    matrices and should be changed through update_scores.
+
+    The programs in the selection are shared with the Collector: the time charged by the Optimizer and the changes it
+    makes to the status of observations are recorded in time_accounting, which the re-scorers read through.
     """
     program_info: Mapping[ProgramID, ProgramInfo]
     schedulable_groups: Mapping[UniqueGroupID, GroupData]
@@ -39,15 +51,27 @@ class Selection:
     time_slot_length: timedelta
     starting_time_slots: StartingTimeslots
     ranker: Ranker
+    time_accounting: TimeAccounting = field(default_factory=TimeAccounting)
 
     # Used to re-score programs.
     _program_scorer: Optional[Callable[[Program,
                                         FrozenSet[Site],
                                         NightIndices,
                                         StartingTimeslots,
-                                        Ranker],
+                                        Ranker,
+                                        TimeAccounting],
                               Optional[ProgramCalculations]]] = None
 
+    # Used to re-score programs incrementally after time has been charged to them.
+    _program_rescorer: Optional[Callable[[Program,
+                                          Optional[ProgramInfo],
+                                          FrozenSet[Site],
+                                          NightIndices,
+                                          StartingTimeslots,
+                                          Ranker,
+                                          TimeAccounting],
+                                Optional[ProgramCalculations]]] = None
+
     def __reduce__(self):
         """
         Pickle everything but the _program_scorer.
@@ -69,7 +93,70 @@ class Selection:
             raise ValueError('Selection.score_program cannot be called as the selection has a value of None. '
                              'This could happen if the instance was unpickled.')
 
-        return self._program_scorer(program, self.sites, self.night_indices, self.starting_time_slots, self.ranker)
+        return self._program_scorer(program,
+                                    self.sites,
+                                    self.night_indices,
+                                    self.starting_time_slots,
+                                    self.ranker,
+                                    self.time_accounting)
+
+    def rescore_program(self, program: Program) -> Optional[ProgramCalculations]:
+        """
+        Re-score a program after time has been charged to it. This calls Selector.rescore_program, which reuses the
+        scores of the program in this selection and only updates the parts that depend on the program completion.
+
+        If no incremental re-scorer is available, this is the same as score_program.
+        """
+        if self._program_rescorer is None:
+            return self.score_program(program)
+
+        return self._program_rescorer(program,
+                                      self.program_info.get(program.id),
+                                      self.sites,
+                                      self.night_indices,
+                                      self.starting_time_slots,
+                                      self.ranker,
+                                      self.time_accounting)
+
+    def build_score_matrices(self) -> Dict[Tuple[Site, NightIndex], ScoreMatrix]:
+        """
+        Lay out the scores of the schedulable groups as a ScoreMatrix per site and night, and replace the
+        GroupInfo.scores of each schedulable group by views of its rows. This is only done once.
+        """
+        if self.score_matrices:
+            return self.score_matrices
+
+        for site in self.sites:
+            site_groups = [group_data for group_data in self.schedulable_groups.values()
+                           if group_data.group.observations()[0].site == site]
+            unique_group_ids = [group_data.group.unique_id for group_data in site_groups]
+            for night_idx in self.night_indices:
+                self.score_matrices[(site, night_idx)] = ScoreMatrix(
+                    site,
+                    night_idx,
+                    unique_group_ids,
+                    (group_data.group_info.scores[night_idx] for group_data in site_groups)
+                )
+            for group_data in site_groups:
+                unique_group_id = group_data.group.unique_id
+                group_data.group_info.scores = {
+                    night_idx: self.score_matrices[(site, night_idx)].row(unique_group_id)
+                    for night_idx in self.night_indices
+                }
+        return self.score_matrices
+
+    def update_scores(self, unique_group_id: UniqueGroupID, scores: Scores) -> None:
+        """
+        Replace the scores of a schedulable group, writing them into the score matrices if they are in use.
+        """
+        group_data = self.schedulable_groups[unique_group_id]
+        if not self.score_matrices:
+            group_data.group_info.scores = scores
+            return
+
+        site = group_data.group.observations()[0].site
+        for night_idx in self.night_indices:
+            self.score_matrices[(site, night_idx)].update(unique_group_id, scores[night_idx])
 
     @property
     def sites(self) -> FrozenSet[Site]:
@@ -98,3 +185,6 @@ class Selection:
         ))
         object.__setattr__(self, 'obs_group_ids', obs_group_ids)
         object.__setattr__(self, 'obs_group_id_list', list(sorted(obs_group_ids)))
+
+        # Filled in by build_score_matrices if the columnar layout of the scores is requested.
+        object.__setattr__(self, 'score_matrices', {})
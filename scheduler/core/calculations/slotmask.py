@@ -0,0 +1,151 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+from dataclasses import dataclass
+from typing import final, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+
+__all__ = [
+    'SlotMask',
+]
+
+
+# The number of bits set in each byte value.
+_BITS_SET = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+@final
+@dataclass(frozen=True, eq=False)
+class SlotMask:
+    """
+    A set of time slots in a night, stored as a packed bit array with one bit per time slot
+    (see numpy.packbits), i.e. 1/64 of the memory of an array of int64 time slot indices.
+
+    length is the number of time slots covered by the bits: time slots at or past it are never in the set.
+    Masks of different lengths can be combined, in which case the shorter mask is treated as padded with
+    time slots that are not in the set, and the result has the greater length. As a night may not be known
+    when a mask is created (e.g. when it is read from the visibility tables), methods that convert a mask to
+    an array take the number of time slots in the night.
+
+    The bits should not be modified.
+    """
+    bits: npt.NDArray[np.uint8]
+    length: int
+
+    @staticmethod
+    def empty(length: int = 0) -> 'SlotMask':
+        return SlotMask(bits=np.zeros((length + 7) // 8, dtype=np.uint8), length=length)
+
+    @staticmethod
+    def from_bool(flags: npt.NDArray[bool]) -> 'SlotMask':
+        """
+        Create a mask from an array of bool indexed by time slot.
+        """
+        flags = np.asarray(flags, dtype=bool)
+        return SlotMask(bits=np.packbits(flags), length=len(flags))
+
+    @staticmethod
+    def from_indices(indices: npt.NDArray[int], length: Optional[int] = None) -> 'SlotMask':
+        """
+        Create a mask from an array of time slot indices.
+        If length is not specified, the mask ends at the last time slot index.
+        """
+        indices = np.asarray(indices, dtype=int)
+        if length is None:
+            length = int(indices.max()) + 1 if indices.size else 0
+        flags = np.zeros(length, dtype=bool)
+        flags[indices] = True
+        return SlotMask.from_bool(flags)
+
+    @staticmethod
+    def from_runs(runs: npt.NDArray[int], length: Optional[int] = None) -> 'SlotMask':
+        """
+        Create a mask from an array of runs of time slots with entries [a, b], where the run goes from
+        a (inclusive) to b (exclusive). Runs may overlap.
+        If length is not specified, the mask ends at the end of the last run.
+        """
+        runs = np.asarray(runs, dtype=int).reshape(-1, 2)
+        if length is None:
+            length = int(runs[:, 1].max()) if runs.size else 0
+        runs = np.clip(runs, 0, length)
+        runs = runs[runs[:, 0] < runs[:, 1]]
+
+        # Mark the start and end of each run and count the runs covering each time slot.
+        boundaries = np.zeros(length + 1, dtype=int)
+        np.add.at(boundaries, runs[:, 0], 1)
+        np.add.at(boundaries, runs[:, 1], -1)
+        return SlotMask.from_bool(np.cumsum(boundaries[:-1]) > 0)
+
+    def _padded_bits(self, length: int) -> npt.NDArray[np.uint8]:
+        num_bytes = (length + 7) // 8
+        if len(self.bits) == num_bytes:
+            return self.bits
+        return np.pad(self.bits, (0, num_bytes - len(self.bits)))
+
+    def __or__(self, other: 'SlotMask') -> 'SlotMask':
+        """
+        The union of the time slots in the masks.
+        """
+        length = max(self.length, other.length)
+        return SlotMask(bits=self._padded_bits(length) | other._padded_bits(length), length=length)
+
+    def __and__(self, other: 'SlotMask') -> 'SlotMask':
+        """
+        The intersection of the time slots in the masks.
+        """
+        length = max(self.length, other.length)
+        return SlotMask(bits=self._padded_bits(length) & other._padded_bits(length), length=length)
+
+    def __sub__(self, other: 'SlotMask') -> 'SlotMask':
+        """
+        The time slots in this mask that are not in the other mask.
+        """
+        length = max(self.length, other.length)
+        return SlotMask(bits=self._padded_bits(length) & ~other._padded_bits(length), length=length)
+
+    def __eq__(self, other: object) -> bool:
+        """
+        Masks are equal if they contain the same time slots, regardless of their lengths.
+        """
+        if not isinstance(other, SlotMask):
+            return NotImplemented
+        length = max(self.length, other.length)
+        return bool(np.array_equal(self._padded_bits(length), other._padded_bits(length)))
+
+    __hash__ = None
+
+    def __bool__(self) -> bool:
+        """
+        True if the mask contains any time slots.
+        """
+        return bool(self.bits.any())
+
+    def count(self) -> int:
+        """
+        The number of time slots in the mask.
+        """
+        return int(_BITS_SET[self.bits].sum(dtype=int))
+
+    def to_bool(self, length: Optional[int] = None) -> npt.NDArray[bool]:
+        """
+        Return an array of bool indexed by time slot, padded or truncated to length if specified.
+        """
+        return np.unpackbits(self.bits, count=self.length if length is None else length).view(bool)
+
+    def indices(self) -> npt.NDArray[int]:
+        """
+        Return the sorted time slot indices in the mask.
+        """
+        return np.flatnonzero(self.to_bool())
+
+    def runs(self) -> npt.NDArray[int]:
+        """
+        Return the runs of consecutive time slots in the mask, as an array with entries of the form [a, b]
+        where the run goes from a (inclusive) to b (exclusive).
+        """
+        # Pad each end with an extra 0 so that every run has a start and an end.
+        flags = np.concatenate((np.array([False]), self.to_bool(), np.array([False])))
+        return np.flatnonzero(flags[1:] != flags[:-1]).reshape(-1, 2)
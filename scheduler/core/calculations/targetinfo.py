@@ -2,16 +2,21 @@
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
 from dataclasses import dataclass
-from typing import final, Dict, TypeAlias, Tuple
+from typing import final, Callable, Dict, Iterator, Mapping, TypeAlias, Tuple
 
+import astropy.units as u
+import numpy as np
 import numpy.typing as npt
 from astropy.coordinates import Angle, SkyCoord
 from astropy.time import TimeDelta
 from lucupy.decorators import immutable
 from lucupy.minimodel import NightIndex, ObservationID, SkyBackground, TargetName
 
+from .slotmask import SlotMask
+
 
 __all__ = [
+    'LazyTargetInfoNightIndexMap',
     'TargetInfo',
     'TargetInfoMap',
     'TargetInfoNightIndexMap',
@@ -27,38 +32,85 @@ class TargetInfo:
     * For a NonsiderealTarget, we have to account for ephemeris data, which is handled in
       the mini-model and is simply brought over by reference.
 
-    All the values here except:
-    * visibility_time
-    * rem_visibility_time
-    * rem_visibility_frac
-    are numpy arrays for each time step at the site for the night.
+    The values are kept as plain float64 numpy arrays in fixed units so that they can be read without astropy:
+    * ra_deg, dec_deg, alt_deg, az_deg, and par_ang_deg are in degrees.
+    * hourangle_hours is in hours, wrapped to [-12, 12).
+    All of these and airmass and sky_brightness have an entry for each time step at the site for the night.
+    The arrays may be views of the rows of arrays shared with other targets, and must not be modified.
+    coord, alt, az, par_ang, and hourangle create the astropy equivalents of the arrays when needed.
 
-    Note that visibilities consists of the indices into the night split into time_slot_lengths
+    Note that visibility_slots consists of the time slots of the night
     where the necessary conditions for visibility are met, i.e.
     1. The sky brightness constraints are met.
     2. The sun altitude is below -12 degrees.
     3. The elevation constraints are met.
     4. There is an available timing window.
 
-    visibility_time is the time_slot_length multiplied by the size of the visibilities array,
+    visibility_time is the time_slot_length multiplied by the number of time slots in visibility_slots,
     giving the amount of time during the night that the target is visible for the observation.
 
     rem_visibility_time is the remaining visibility time for the target for the observation across
     the rest of the time period.
     """
-    coord: SkyCoord
-    alt: Angle
-    az: Angle
-    par_ang: Angle
-    hourangle: Angle
-    airmass: npt.NDArray[float]
+    ra_deg: npt.NDArray[np.float64]
+    dec_deg: npt.NDArray[np.float64]
+    alt_deg: npt.NDArray[np.float64]
+    az_deg: npt.NDArray[np.float64]
+    par_ang_deg: npt.NDArray[np.float64]
+    hourangle_hours: npt.NDArray[np.float64]
+    airmass: npt.NDArray[np.float64]
     sky_brightness: npt.NDArray[SkyBackground]
-    visibility_slot_idx: npt.NDArray[int]
+    visibility_slots: SlotMask
     visibility_time: TimeDelta
     rem_visibility_time: TimeDelta
     rem_visibility_frac: float
 
+    @property
+    def coord(self) -> SkyCoord:
+        return SkyCoord(ra=self.ra_deg * u.deg, dec=self.dec_deg * u.deg, frame='icrs')
+
+    @property
+    def alt(self) -> Angle:
+        return Angle(self.alt_deg, unit=u.deg)
+
+    @property
+    def az(self) -> Angle:
+        return Angle(self.az_deg, unit=u.deg)
+
+    @property
+    def par_ang(self) -> Angle:
+        return Angle(self.par_ang_deg, unit=u.deg)
+
+    @property
+    def hourangle(self) -> Angle:
+        return Angle(self.hourangle_hours, unit=u.hourangle)
+
+
+@final
+class LazyTargetInfoNightIndexMap(Mapping[NightIndex, TargetInfo]):
+    """
+    A map from NightIndex to TargetInfo for the nights 0 to num_nights - 1, where the TargetInfo of a night is
+    only calculated by calculate_night when it is accessed. calculate_night may keep the TargetInfo it calculates,
+    e.g. for a bounded number of nights as in Collector.get_target_info.
+    """
+    __slots__ = ('_num_nights', '_calculate_night')
+
+    def __init__(self, num_nights: int, calculate_night: Callable[[NightIndex], TargetInfo]):
+        self._num_nights = num_nights
+        self._calculate_night = calculate_night
+
+    def __getitem__(self, night_idx: NightIndex) -> TargetInfo:
+        if not 0 <= night_idx < self._num_nights:
+            raise KeyError(night_idx)
+        return self._calculate_night(NightIndex(night_idx))
+
+    def __iter__(self) -> Iterator[NightIndex]:
+        return map(NightIndex, range(self._num_nights))
+
+    def __len__(self) -> int:
+        return self._num_nights
+
 
 # Type aliases for TargetInfo information.
-TargetInfoNightIndexMap: TypeAlias = Dict[NightIndex, TargetInfo]
+TargetInfoNightIndexMap: TypeAlias = Mapping[NightIndex, TargetInfo]
 TargetInfoMap: TypeAlias = Dict[Tuple[TargetName, ObservationID], TargetInfoNightIndexMap]
@@ -0,0 +1,100 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+from datetime import timedelta
+from typing import final, Dict, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from lucupy.minimodel import Group, Observation, ObservationID, ObservationStatus, Program, ProgramID
+from lucupy.types import ZeroTime
+
+
+__all__ = [
+    'TimeAccounting',
+]
+
+
+# The program and partner time used.
+_UsedTime = Tuple[timedelta, timedelta]
+
+
+@final
+class TimeAccounting:
+    """
+    Pseudo time accounting on top of the programs in a Selection.
+
+    The programs in a Selection are shared with the Collector and must not be changed, so the time charged to the
+    atoms of observations by the Optimizer and the changes it makes to the status of observations are recorded here
+    instead. The time used by observations, groups, and programs, the status of observations, and the cumulative
+    execution times of the unobserved atoms should be read through this object, which adds the recorded changes to
+    the values in the programs. With no changes recorded, it reads the programs as they are.
+
+    Charged atoms are considered observed.
+    """
+
+    def __init__(self):
+        # The time used by the charged atoms, indexed by observation ID and atom index.
+        self._atoms: Dict[Tuple[ObservationID, int], _UsedTime] = {}
+        self._statuses: Dict[ObservationID, ObservationStatus] = {}
+
+        # The changes to the time used by observations and programs, kept as running totals.
+        self._obs_deltas: Dict[ObservationID, _UsedTime] = {}
+        self._program_deltas: Dict[ProgramID, _UsedTime] = {}
+
+    def status(self, obs: Observation) -> ObservationStatus:
+        return self._statuses.get(obs.id, obs.status)
+
+    def set_status(self, obs: Observation, status: ObservationStatus) -> None:
+        self._statuses[obs.id] = status
+
+    def observed(self, obs: Observation, atom_idx: int) -> bool:
+        return (obs.id, atom_idx) in self._atoms or obs.sequence[atom_idx].observed
+
+    def charge_atom(self, obs: Observation, atom_idx: int, program_used: timedelta, partner_used: timedelta) -> None:
+        """
+        Set the program and partner time used by an atom of an observation, marking it observed.
+        """
+        atom = obs.sequence[atom_idx]
+        old_program_used, old_partner_used = self._atoms.get((obs.id, atom_idx),
+                                                             (atom.program_used, atom.partner_used))
+        self._atoms[(obs.id, atom_idx)] = program_used, partner_used
+
+        program_delta = program_used - old_program_used
+        partner_delta = partner_used - old_partner_used
+        for deltas, key in ((self._obs_deltas, obs.id), (self._program_deltas, obs.id.program_id())):
+            old_program_delta, old_partner_delta = deltas.get(key, (ZeroTime, ZeroTime))
+            deltas[key] = old_program_delta + program_delta, old_partner_delta + partner_delta
+
+    def obs_program_used(self, obs: Observation) -> timedelta:
+        return obs.program_used() + self._obs_deltas.get(obs.id, (ZeroTime, ZeroTime))[0]
+
+    def obs_partner_used(self, obs: Observation) -> timedelta:
+        return obs.partner_used() + self._obs_deltas.get(obs.id, (ZeroTime, ZeroTime))[1]
+
+    def obs_total_used(self, obs: Observation) -> timedelta:
+        return self.obs_program_used(obs) + self.obs_partner_used(obs)
+
+    def group_total_used(self, group: Group) -> timedelta:
+        total_used = group.total_used()
+        for obs in group.observations():
+            program_delta, partner_delta = self._obs_deltas.get(obs.id, (ZeroTime, ZeroTime))
+            total_used += program_delta + partner_delta
+        return total_used
+
+    def program_used(self, program: Program) -> timedelta:
+        return program.program_used() + self._program_deltas.get(program.id, (ZeroTime, ZeroTime))[0]
+
+    def program_total_used(self, program: Program) -> timedelta:
+        program_delta, partner_delta = self._program_deltas.get(program.id, (ZeroTime, ZeroTime))
+        return program.total_used() + program_delta + partner_delta
+
+    def cumulative_exec_times(self, obs: Observation) -> npt.NDArray[timedelta]:
+        """
+        Cumulative series of execution times for the unobserved atoms in the sequence of an observation,
+        excluding acquisition time, as in Observation.cumulative_exec_times.
+        """
+        if obs.id not in self._obs_deltas:
+            return obs.cumulative_exec_times()
+        return np.cumsum([ZeroTime if self.observed(obs, atom_idx) else atom.exec_time
+                          for atom_idx, atom in enumerate(obs.sequence)])
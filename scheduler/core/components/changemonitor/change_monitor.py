@@ -180,7 +180,7 @@ class ChangeMonitor(SchedulerComponent):
                 # TODO: case, it is for a single night instead of all nights.
                 target_info = Collector.get_target_info(obs.id)
                 if obs.obs_class in [ObservationClass.SCIENCE, ObservationClass.PROGCAL]:
-                    neg_ha = target_info[night_idx].hourangle[0].value < 0
+                    neg_ha = target_info[night_idx].hourangle_hours[0] < 0
                 else:
                     neg_ha = False
                 too_type = obs.too_type
@@ -1,13 +1,17 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
+import os
 import time
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import partial
 from inspect import isclass
-from typing import ClassVar, Dict, FrozenSet, Iterable, List, Optional, Tuple, Type, final
+from typing import ClassVar, Dict, FrozenSet, Iterable, List, Optional, Tuple, Type, Union, final
 
 import astropy.units as u
 import numpy as np
+import numpy.typing as npt
 
 from astropy.time import Time, TimeDelta
 
@@ -20,7 +24,8 @@ from lucupy.types import Day, ZeroTime
 from lucupy import sky
 
 from scheduler.core.calculations.nightevents import NightEvents
-from scheduler.core.calculations.targetinfo import TargetInfo, TargetInfoMap, TargetInfoNightIndexMap
+from scheduler.core.calculations.targetinfo import (LazyTargetInfoNightIndexMap, TargetInfo, TargetInfoMap,
+                                                    TargetInfoNightIndexMap)
 from scheduler.core.components.base import SchedulerComponent
 from scheduler.core.components.nighteventsmanager import NightEventsManager
 from scheduler.core.plans import Plans, Visit
@@ -31,7 +36,10 @@ from scheduler.services.ephemeris import EphemerisCalculator
 from scheduler.services.proper_motion import ProperMotionCalculator
 from scheduler.services.resource import NightConfiguration
 from scheduler.services.resource import ResourceService
-from scheduler.services.visibility.calculator import calculate_target_snapshot, visibility_calculator
+from scheduler.services.visibility.calculator import (calculate_sidereal_target_tracks, calculate_target_snapshot,
+                                                      visibility_calculator, TargetVisibility)
+from scheduler.services.visibility.snapshot import TargetTrack, TargetTrackKey
+from scheduler.services.visibility.track_cache import TargetTrackCache
 
 __all__ = [
     'Collector',
@@ -61,6 +69,22 @@ class GroupVisits:
         return self.visits[-1].start_time_slot + self.visits[-1].time_slots - 1
 
 
+# TODO: This is just used internally to the Collector and thus we do not export it outside of this package.
+@final
+@dataclass
+class ProgramNightFilters:
+    """
+    The results of the program filters of the night configurations of a site, as matrices indexed by program and
+    night index: eligible is the program_filter and priority is the program_priority_filter_any.
+    The rows for a program are filled in the first time they are requested, as indicated by evaluated.
+    """
+    load_generation: int
+    program_indices: Dict[ProgramID, int]
+    evaluated: npt.NDArray[bool]
+    eligible: npt.NDArray[bool]
+    priority: npt.NDArray[bool]
+
+
 @final
 @dataclass
 class Collector(SchedulerComponent):
@@ -75,6 +99,13 @@ class Collector(SchedulerComponent):
 
     Here, we just perform the necessary calculations, and are not concerned with the number of nights to be
     scheduled.
+
+    The target information of a night is calculated when it is first accessed. If max_target_info_nights is set,
+    the target information is only kept for that many nights, which are dropped in order of least recent use.
+
+    If track_cache_dir is set, the tracks of the sidereal targets are kept per target in an on-disk cache in that
+    directory (see TargetTrackCache), which is consulted before calculating them, so that only the tracks of targets
+    not in it are calculated.
     """
     start_vis_time: Time
     end_vis_time: Time
@@ -86,6 +117,29 @@ class Collector(SchedulerComponent):
     time_slot_length: TimeDelta
     program_types: FrozenSet[ProgramTypes]
     obs_classes: FrozenSet[ObservationClass]
+    max_target_info_nights: Optional[int] = None
+    track_cache_dir: Optional[Union[str, os.PathLike]] = None
+
+    # The NightConfiguration of every night by site, indexed by night index, and the results of their program
+    # filters by site. These are calculated on demand: see night_configurations and program_night_filters.
+    _night_configuration_tables: Dict[Site, npt.NDArray[NightConfiguration]] = field(init=False, default_factory=dict)
+    _program_night_filters: Dict[Site, ProgramNightFilters] = field(init=False, default_factory=dict)
+
+    # The tracks of the sidereal targets by site and night, shared by the observations of the targets with the same
+    # coordinates, proper motion, and epoch. Only the tracks of the targets of the programs last loaded are kept.
+    _target_tracks: Dict[Tuple[Site, NightIndex], Dict[TargetTrackKey, TargetTrack]] = field(init=False,
+                                                                                             default_factory=dict)
+    _track_cache: Optional[TargetTrackCache] = field(init=False, default=None)
+
+    # The observations with a base target at each site and the visibility of their targets, read when the programs
+    # are loaded, and the TargetInfo of the observations by site for the nights calculated so far, in order of last
+    # use. These are calculated on demand: see get_target_info.
+    _site_observations: Dict[Site, List[Tuple[Observation, Target]]] = field(init=False, default_factory=dict)
+    _target_visibilities: Dict[ObservationID, Dict[NightIndex, TargetVisibility]] = field(init=False,
+                                                                                          default_factory=dict)
+    _night_target_info: OrderedDict[Tuple[Site, NightIndex], Dict[ObservationID, TargetInfo]] = field(
+        init=False, default_factory=OrderedDict
+    )
 
     # Manage the NightEvents with a NightEventsManager to avoid unnecessary recalculations.
     _night_events_manager: ClassVar[NightEventsManager] = NightEventsManager()
@@ -115,6 +169,16 @@ class Collector(SchedulerComponent):
     # the target info is observation-specific due to the constraints and site.
     _target_info: ClassVar[TargetInfoMap] = {}
 
+    # Incremented every time programs are loaded, so that data derived from the programs and their target information
+    # can be cached until the next load.
+    _load_generation: ClassVar[int] = 0
+
+    # Incremented every time time accounting is performed, with the value at the last time accounting that charged
+    # each program recorded for it, so that calculations for the programs that have not been charged since can be
+    # reused.
+    _accounting_generation: ClassVar[int] = 0
+    _program_accounting_generations: ClassVar[Dict[ProgramID, int]] = {}
+
     # The default timeslot length currently used.
     DEFAULT_TIMESLOT_LENGTH: ClassVar[Time] = 1.0 * u.min
 
@@ -139,6 +203,11 @@ class Collector(SchedulerComponent):
         if self.start_vis_time > self.end_vis_time:
             msg = f'Start time ({self.start_vis_time}) cannot occur later than end time ({self.end_vis_time}).'
             raise ValueError(msg)
+        if self.max_target_info_nights is not None and self.max_target_info_nights < 1:
+            msg = f'Illegal maximum number of nights of target information: {self.max_target_info_nights}.'
+            raise ValueError(msg)
+        if self.track_cache_dir is not None:
+            self._track_cache = TargetTrackCache(self.track_cache_dir)
 
         # Set up the time grid for the period under consideration in calculations: this is an astropy Time
         # object from start_time to end_time inclusive, with one entry per day.
@@ -164,6 +233,29 @@ class Collector(SchedulerComponent):
                                                                 self.time_slot_length,
                                                                 site)
 
+    @staticmethod
+    def get_load_generation() -> int:
+        """
+        Return the number of times programs have been loaded into the Collector.
+        """
+        return Collector._load_generation
+
+    @staticmethod
+    def get_accounting_generation() -> int:
+        """
+        Return the number of times time accounting has been performed by the Collector.
+        """
+        return Collector._accounting_generation
+
+    @staticmethod
+    def get_programs_charged_since(accounting_generation: int) -> FrozenSet[ProgramID]:
+        """
+        Return the IDs of the programs that have been charged by time accounting since the accounting generation.
+        """
+        return frozenset(program_id
+                         for program_id, program_generation in Collector._program_accounting_generations.items()
+                         if program_generation > accounting_generation)
+
     @staticmethod
     def get_program_ids() -> Iterable[ProgramID]:
         """
@@ -226,6 +318,7 @@ class Collector(SchedulerComponent):
         """
         Given an ObservationID, if the observation exists and there is a target for the
         observation, return the target information as a map from NightIndex to TargetInfo.
+        The TargetInfo for a night is calculated when it is first accessed.
         """
         info = Collector.get_observation_and_base_target(obs_id)
         if info is None:
@@ -265,56 +358,103 @@ class Collector(SchedulerComponent):
 
         return windows
 
-    def _calculate_target_info(self,
-                               obs: Observation,
-                               target: Target,
-                               timing_windows: List[Time]) -> TargetInfoNightIndexMap:
-        """
-        For a given site, calculate the information for a target for all the nights in
-        the time grid and store this in the _target_information.
-
-        Some of this information may be repetitive as, e.g. the RA and dec of a target should not
-        depend on the site, so sites whose twilights overlap with have this information repeated.
-
-        Finally, this method can calculate the total amount of time that, for the observation,
-        the target is visible, and the visibility fraction for the target as a ratio of the amount of
-        time remaining for the observation to the total visibility time for the target from a night through
-        to the end of the period.
-        """
-        # Get the night events.
-        if obs.site not in self.night_events:
-            raise ValueError(f'Requested obs {obs.id.id} target info for site {obs.site}, which is not included.')
-        night_events = self.night_events[obs.site]
-
-        target_vis = visibility_calculator.get_target_visibility(obs, self.time_grid, self.semesters)
-
-        target_info: TargetInfoNightIndexMap = {}
-
-        for i in range(self.num_nights_calculated):
-            night_idx = NightIndex(i)
-            target_snapshot = calculate_target_snapshot(night_idx,
-                                                        obs,
-                                                        target,
-                                                        night_events,
-                                                        self.time_grid[night_idx],
-                                                        self.time_slot_length)
-            ts = target_vis[night_idx]
-
-            ti = TargetInfo(coord=target_snapshot.coord,
-                            alt=target_snapshot.alt,
-                            az=target_snapshot.az,
-                            par_ang=target_snapshot.par_ang,
-                            hourangle=target_snapshot.hourangle,
-                            airmass=target_snapshot.airmass,
-                            sky_brightness=target_snapshot.sky_brightness,
-                            visibility_slot_idx=ts.visibility_slot_idx,
-                            visibility_time=ts.visibility_time,
-                            rem_visibility_time=ts.rem_visibility_time,
-                            rem_visibility_frac=ts.rem_visibility_frac)
-
-            target_info[NightIndex(night_idx)] = ti
-        # Return all the target info for the base target in the Observation across the nights of interest.
-        return target_info
+    def _get_night_target_info(self, site: Site, obs_id: ObservationID, night_idx: NightIndex) -> TargetInfo:
+        """
+        Return the TargetInfo for a night of an observation at a site, calculating it for all the observations at the
+        site for the night if they have not been calculated yet.
+        """
+        return self._get_site_night_target_info(site, night_idx)[obs_id]
+
+    def _get_site_night_target_info(self, site: Site, night_idx: NightIndex) -> Dict[ObservationID, TargetInfo]:
+        """
+        Return the TargetInfo of all the observations at a site for a night, calculating them if needed.
+
+        If max_target_info_nights is set, only that many nights are kept, and the one used least recently is dropped
+        along with its target tracks when another night is calculated.
+        """
+        key = site, night_idx
+        night_target_info = self._night_target_info.get(key)
+        if night_target_info is None:
+            night_target_info = self._calculate_night_target_info(site, night_idx)
+            self._night_target_info[key] = night_target_info
+            if self.max_target_info_nights is not None:
+                while len(self._night_target_info) > self.max_target_info_nights:
+                    dropped_key, _ = self._night_target_info.popitem(last=False)
+                    self._target_tracks.pop(dropped_key, None)
+        else:
+            self._night_target_info.move_to_end(key)
+        return night_target_info
+
+    def _calculate_night_target_info(self, site: Site, night_idx: NightIndex) -> Dict[ObservationID, TargetInfo]:
+        """
+        For a given site and night, calculate the information for the targets of all the observations at the site.
+
+        The tracks of the sidereal targets are calculated together by calculate_sidereal_target_tracks, sharing the
+        tracks of the targets with the same coordinates, proper motion, and epoch, while those of the nonsidereal
+        targets are calculated per target from their ephemerides. The TargetInfo of each target holds the arrays of
+        its track.
+
+        The visibility of each target, i.e. the total amount of time that, for the observation, the target is visible,
+        and the visibility fraction for the target as a ratio of the amount of time remaining for the observation to
+        the total visibility time for the target from a night through to the end of the period, is taken from the
+        visibility table when the programs are loaded.
+        """
+        night_events = self.night_events[site]
+        observations = self._site_observations.get(site, [])
+
+        sidereal_observations = [(obs, target) for obs, target in observations if isinstance(target, SiderealTarget)]
+        time_grid_night = self.time_grid[night_idx]
+
+        # The tracks calculated so far for the night, and those of the other targets that are in the track cache.
+        tracks = self._target_tracks.setdefault((site, night_idx), {})
+        if self._track_cache is not None:
+            sidereal_keys = {TargetTrack.key(target) for _, target in sidereal_observations}
+            tracks.update(self._track_cache.load(night_idx,
+                                                 sidereal_keys - tracks.keys(),
+                                                 night_events,
+                                                 time_grid_night,
+                                                 self.time_slot_length))
+        known_keys = set(tracks)
+
+        sidereal_tracks = calculate_sidereal_target_tracks(night_idx,
+                                                           sidereal_observations,
+                                                           night_events,
+                                                           time_grid_night,
+                                                           self.time_slot_length,
+                                                           tracks)
+        if self._track_cache is not None and len(tracks) > len(known_keys):
+            self._track_cache.save(night_idx,
+                                   {key: track for key, track in tracks.items() if key not in known_keys},
+                                   night_events,
+                                   time_grid_night,
+                                   self.time_slot_length)
+        target_tracks = {obs.id: track for (obs, _), track in zip(sidereal_observations, sidereal_tracks)}
+
+        night_target_info: Dict[ObservationID, TargetInfo] = {}
+        for obs, target in observations:
+            track = target_tracks.get(obs.id)
+            if track is None:
+                track = TargetTrack.from_snapshot(calculate_target_snapshot(night_idx,
+                                                                            obs,
+                                                                            target,
+                                                                            night_events,
+                                                                            time_grid_night,
+                                                                            self.time_slot_length))
+            ts = self._target_visibilities[obs.id][night_idx]
+
+            night_target_info[obs.id] = TargetInfo(ra_deg=track.ra_deg,
+                                                   dec_deg=track.dec_deg,
+                                                   alt_deg=track.alt_deg,
+                                                   az_deg=track.az_deg,
+                                                   par_ang_deg=track.par_ang_deg,
+                                                   hourangle_hours=track.hourangle_hours,
+                                                   airmass=track.airmass,
+                                                   sky_brightness=track.sky_brightness,
+                                                   visibility_slots=ts.visibility_slots,
+                                                   visibility_time=ts.visibility_time,
+                                                   rem_visibility_time=ts.rem_visibility_time,
+                                                   rem_visibility_frac=ts.rem_visibility_frac)
+        return night_target_info
 
     def load_programs(self, program_provider_class: Type[ProgramProvider], data: Iterable[dict]) -> None:
         """
@@ -337,6 +477,8 @@ class Collector(SchedulerComponent):
 
         # Purge the old programs and observations.
         Collector._programs = {}
+        Collector._load_generation += 1
+        Collector._program_accounting_generations = {}
 
         # Keep a list of the observations for parallel processing.
         parsed_observations: List[Tuple[ProgramID, Observation]] = []
@@ -400,8 +542,10 @@ class Collector(SchedulerComponent):
         if bad_program_count:
             logger.error(f'Could not parse {bad_program_count} programs.')
 
-        # TODO STEP 1: This is the code that needs parallelization.
-        # TODO STEP 2: Try to read the values from the redis_client cache. If they do not exist, calculate and write.
+        # The target information is calculated per night when it is first accessed: see get_target_info.
+        self._site_observations = {}
+        self._target_visibilities = {}
+        self._night_target_info.clear()
         for program_id, obs in parsed_observations:
             # Check for a base target in the observation: if there is none, we cannot process.
             # For ToOs, this may be the case.
@@ -414,14 +558,43 @@ class Collector(SchedulerComponent):
             if program is None:
                 raise RuntimeError(f'Could not find program {program_id.id} for observation {obs.id.id}.')
 
-            # Record the observation and target for this obs id.
+            # Record the observation and target for this obs id, and read the visibility of the target, which
+            # gives the remaining visibility across the nights.
             Collector._observations[obs.id] = obs, base
-
-            # Compute the timing window expansion for the observation.
-            # Then, calculate the target information, which performs the visibility calculations.
-            tw = self._process_timing_windows(program, obs)
-            ti = self._calculate_target_info(obs, base, tw)
-            Collector._target_info[base.name, obs.id] = ti
+            self._site_observations.setdefault(obs.site, []).append((obs, base))
+            self._target_visibilities[obs.id] = visibility_calculator.get_target_visibility(obs,
+                                                                                            self.time_grid,
+                                                                                            self.semesters)
+            Collector._target_info[base.name, obs.id] = LazyTargetInfoNightIndexMap(
+                self.num_nights_calculated,
+                partial(self._get_night_target_info, obs.site, obs.id)
+            )
+
+        # Only keep the target tracks of the targets of the programs loaded.
+        track_keys = {site: {TargetTrack.key(target) for _, target in observations
+                             if isinstance(target, SiderealTarget)}
+                      for site, observations in self._site_observations.items()}
+        self._target_tracks = {(site, night_idx): {key: track for key, track in tracks.items()
+                                                   if key in track_keys.get(site, ())}
+                               for (site, night_idx), tracks in self._target_tracks.items()}
+
+    def night_configuration_table(self, site: Site) -> npt.NDArray[NightConfiguration]:
+        """
+        Return an array of the NightConfiguration for the site for every night, indexed by night index.
+        The array is calculated once and should not be modified.
+        """
+        table = self._night_configuration_tables.get(site)
+        if table is None:
+            time_grid = self.get_night_events(site).time_grid
+            table = np.empty(self.num_nights_calculated, dtype=object)
+            for night_idx in range(self.num_nights_calculated):
+                table[night_idx] = Collector._resource_service.get_night_configuration(
+                    site,
+                    time_grid[night_idx].datetime.date() - Day
+                )
+            table.flags.writeable = False
+            self._night_configuration_tables[site] = table
+        return table
 
     def night_configurations(self,
                              site: Site,
@@ -429,10 +602,54 @@ class Collector(SchedulerComponent):
         """
         Return the list of NightConfiguration for the site and nights under configuration.
         """
-        return {night_idx: Collector._resource_service.get_night_configuration(
-            site,
-            self.get_night_events(site).time_grid[night_idx].datetime.date() - Day
-        ) for night_idx in night_indices}
+        table = self.night_configuration_table(site)
+        return {night_idx: table[night_idx] for night_idx in night_indices}
+
+    def program_night_filters(self, site: Site, program_id: ProgramID) -> Tuple[npt.NDArray[bool], npt.NDArray[bool]]:
+        """
+        For a program, return arrays indexed by night index indicating:
+        1. If the program can be scheduled on the night at the site, i.e. it passes the program_filter.
+        2. If the program is prioritized on the night at the site, i.e. it passes the program_priority_filter_any.
+
+        The filters are evaluated for a program the first time it is requested after the programs are loaded,
+        and the arrays should not be modified.
+        """
+        night_filters = self._program_night_filters.get(site)
+        if night_filters is None or night_filters.load_generation != Collector._load_generation:
+            program_indices = {pid: idx for idx, pid in enumerate(Collector._programs)}
+            shape = len(program_indices), self.num_nights_calculated
+            night_filters = ProgramNightFilters(load_generation=Collector._load_generation,
+                                                program_indices=program_indices,
+                                                evaluated=np.zeros(len(program_indices), dtype=bool),
+                                                eligible=np.zeros(shape, dtype=bool),
+                                                priority=np.zeros(shape, dtype=bool))
+            self._program_night_filters[site] = night_filters
+
+        program_idx = night_filters.program_indices.get(program_id)
+        if program_idx is None:
+            raise ValueError(f'Requested night filters for program {program_id.id}, which is not loaded.')
+
+        if not night_filters.evaluated[program_idx]:
+            program = Collector._programs[program_id]
+            for night_idx, nc in enumerate(self.night_configuration_table(site)):
+                night_filters.eligible[program_idx, night_idx] = nc.filter.program_filter(program)
+                night_filters.priority[program_idx, night_idx] = nc.filter.program_priority_filter_any(program)
+            night_filters.evaluated[program_idx] = True
+
+        return night_filters.eligible[program_idx], night_filters.priority[program_idx]
+
+    def precalculate(self, sites: FrozenSet[Site], night_indices: NightIndices) -> None:
+        """
+        Calculate the data that is otherwise calculated on demand for the sites and nights: the night configurations,
+        the program night filters, and the target information. This is done before forking worker processes, which
+        then share the data instead of each calculating it and discarding it when they exit.
+        """
+        for site in sites:
+            self.night_configuration_table(site)
+            for program_id in Collector._programs:
+                self.program_night_filters(site, program_id)
+            for night_idx in night_indices:
+                self._get_site_night_target_info(site, night_idx)
 
     def _get_group(self, obs: Observation) -> Group:
         """Return the group that an observation is a member of."""
@@ -456,6 +673,18 @@ class Collector(SchedulerComponent):
         # This should never happen: cannot find observation in program.
         raise RuntimeError(f'Could not find observation {obs.id.id} in program {program.id.id}.')
 
+    @staticmethod
+    def _record_charged_programs(grpvisit: GroupVisits, charged: bool) -> None:
+        """
+        Record that the programs of the visits of a group are charged by the current time accounting,
+        if time was charged for the group, either to the programs or as not charged.
+        """
+        if not charged:
+            return
+        for visit in grpvisit.visits:
+            program_id = visit.obs_id.program_id()
+            Collector._program_accounting_generations[program_id] = Collector._accounting_generation
+
     def time_accounting(self,
                         plans: Plans,
                         sites: FrozenSet[Site] = ALL_SITES,
@@ -473,6 +702,7 @@ class Collector(SchedulerComponent):
         """
         # Avoids repeated conversions in loop.
         time_slot_length = self.time_slot_length.to_datetime()
+        Collector._accounting_generation += 1
 
         for plan in plans:
             if plan.site not in sites:
@@ -513,6 +743,8 @@ class Collector(SchedulerComponent):
                 # what was observed and make a new copy of the telluric
                 not_charged = (grpvisit.group.is_scheduling_group() and
                                grpvisit.start_time_slot() <= end_timeslot_charge <= grpvisit.end_time_slot())
+
+                Collector._record_charged_programs(grpvisit, charge_group or not_charged)
                 # print(f'charge_group = {charge_group}, charge_unused = {not_charged}')
 
                 # print(f'\tGroup observations')
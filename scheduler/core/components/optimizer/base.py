@@ -4,8 +4,10 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import timedelta
-from typing import final, List
+from time import monotonic
+from typing import final, Dict, List, Optional
 
+from lucupy.minimodel import NightIndex
 from lucupy.types import Interval
 
 from scheduler.core.calculations.groupinfo import GroupData
@@ -44,12 +46,39 @@ class BaseOptimizer(ABC):
     add: method that adds a group to a plan
     _run: main driver for the algorithm
 
+    The optimizer can be given a time budget, either as its time_budget or per call to schedule. The budget covers
+    the whole call to schedule: optimizers that support it check _deadline_reached as they run and stop when it
+    returns True, leaving the plans built so far.
+
+    The plans previously made for the nights can also be passed to schedule: optimizers that support warm starts
+    look them up in _previous_plans to keep the visits that are still valid instead of planning from scratch.
     """
+    def __init__(self, time_budget: Optional[timedelta] = None):
+        self.time_budget = time_budget
+
+        # The monotonic clock time at which the current call to schedule must stop, if it has a time budget.
+        self._deadline: Optional[float] = None
 
-    def schedule(self, nights: List[Plans]):
+        # The plans previously made for the nights of the current call to schedule, by night index.
+        self._previous_plans: Dict[NightIndex, Plans] = {}
+
+    def schedule(self,
+                 nights: List[Plans],
+                 time_budget: Optional[timedelta] = None,
+                 previous_nights: Optional[List[Plans]] = None):
+        if time_budget is None:
+            time_budget = self.time_budget
+        self._deadline = None if time_budget is None else monotonic() + time_budget.total_seconds()
+        self._previous_plans = {plans.night_idx: plans for plans in previous_nights or []}
         for plans in nights:
             self._run(plans)
 
+    def _deadline_reached(self) -> bool:
+        """
+        Determine if the time budget of the current call to schedule, if any, has run out.
+        """
+        return self._deadline is not None and monotonic() >= self._deadline
+
     @abstractmethod
     def _run(self, plans: Plans):
         ...
@@ -33,6 +33,8 @@ class DummyOptimizer(BaseOptimizer):
     seed: InitVar[int] = field(default=42, init=False, repr=False)
 
     def __post_init__(self, seed: int) -> None:
+        super().__init__()
+
         # Set seed for replication
         random.seed(seed)
 
@@ -3,24 +3,27 @@
 
 from __future__ import annotations
 
+import heapq
+import itertools
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import final, Dict, FrozenSet, List, Optional, Tuple
+from typing import final, Dict, FrozenSet, List, Optional, Set, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
 import numpy.typing as npt
 from lucupy.minimodel import (Group, NightIndex, Observation, ObservationClass, ObservationID, ObservationStatus,
-                              Program, QAState, Site, UniqueGroupID, Wavelengths, ObservationMode)
+                              Program, Site, UniqueGroupID, Wavelengths, ObservationMode)
 
 from lucupy.observatory.abstract import ObservatoryProperties
 from lucupy.timeutils import time2slots
 from lucupy.types import Interval, ListOrNDArray, ZeroTime
 
-from scheduler.core.calculations import GroupData, NightTimeslotScores
+from scheduler.core.calculations import GroupData, NightTimeslotScores, SlotMask, SparseNightScores
 from scheduler.core.calculations.selection import Selection
+from scheduler.core.components.optimizer.scoreindex import ScoreIndex
 from scheduler.core.components.optimizer.timeline import Timelines
-from scheduler.core.plans import Plans
+from scheduler.core.plans import Plans, Visit
 from scheduler.services import logger_factory
 from .base import BaseOptimizer, MaxGroup
 
@@ -33,6 +36,14 @@ __all__ = [
 logger = logger_factory.create_logger(__name__)
 
 
+# An open interval of a timeline, identified by its site and its first (inclusive) and last (exclusive) time slots.
+_Gap = Tuple[Site, int, int]
+
+# An entry in the candidate queue: the negated key, a sequence number to break ties and identify the entry,
+# the group, the open interval, and the evaluated MaxGroup (None if the entry has not been evaluated yet).
+_CandidateEntry = Tuple[float, int, UniqueGroupID, Site, int, int, Optional[MaxGroup]]
+
+
 @final
 @dataclass(frozen=True)
 class ObsPlanData:
@@ -52,20 +63,53 @@ class ObsPlanData:
 class GreedyMaxOptimizer(BaseOptimizer):
     """
     GreedyMax is an optimizer that schedules the visits for the rest of the night in a greedy fashion.
+
+    If dense_scores is set, the scores in the selection are laid out as one score matrix per site and night
+    (see Selection.build_score_matrices), so that the candidate queue for a night is filled with vectorized
+    operations over all the groups of a site.
+
+    If a time budget is given (here or to schedule), the optimizer runs in anytime mode: the groups are only queued
+    on the earliest open interval of each site that still has candidates, so that the night is filled best-first from
+    its beginning, and when the budget runs out, the plans built so far are returned. The number of placements made
+    for each night is kept in placements.
+
+    If the plans previously made for a night are given to schedule, the optimizer starts from them: the groups whose
+    visits at or after the starting time slot are still valid under the new selection are placed again as they were
+    (see _warm_start), and only the rest of the night is filled.
     """
 
     def __init__(self,
                  min_visit_len: timedelta = timedelta(minutes=30),
-                 show_plots: bool = False):
+                 show_plots: bool = False,
+                 dense_scores: bool = False,
+                 time_budget: Optional[timedelta] = None):
+        super().__init__(time_budget)
         self.selection: Optional[Selection] = None
-        self.group_data_list: List[GroupData] = []
+        self.group_data_map: Dict[UniqueGroupID, GroupData] = {}
         self.group_ids: List[UniqueGroupID] = []
         self.obs_group_ids: List[UniqueGroupID] = []
         self.timelines: Dict[NightIndex, Timelines] = {}
         self.sites: FrozenSet[Site] = frozenset()
         self.obs_in_plan: Dict = {}
+        self.score_index: Dict[NightIndex, Dict[UniqueGroupID, ScoreIndex]] = {}
+
+        # The remaining time of each group as returned by _min_slots_remaining, and the group of each observation.
+        self._slots_remaining: Dict[UniqueGroupID, Tuple[int, int, int, timedelta]] = {}
+        self._obs_group_map: Dict[ObservationID, UniqueGroupID] = {}
+
+        # The candidate queue of each site for the night being scheduled: see _find_max_group.
+        self._candidates: Dict[Site, List[_CandidateEntry]] = {}
+        self._live_candidates: Dict[Tuple[UniqueGroupID, Site, int, int], int] = {}
+        self._penalized_gaps: Dict[Site, Dict[Tuple[int, int], Set[UniqueGroupID]]] = {}
+        self._candidate_counter = itertools.count()
+
+        # In anytime mode, the open interval of each site on which the groups were last queued: see _advance_gap.
+        self._current_gaps: Dict[Site, Optional[Tuple[int, int]]] = {}
+        self.placements: Dict[NightIndex, int] = {}
+
         self.min_visit_len = min_visit_len
         self.show_plots = show_plots
+        self.dense_scores = dense_scores
         self.time_slot_length: Optional[timedelta] = None
 
     def setup(self, selection: Selection) -> GreedyMaxOptimizer:
@@ -74,8 +118,7 @@ class GreedyMaxOptimizer(BaseOptimizer):
         """
         self.selection = selection
         self.group_ids = list(selection.schedulable_groups)
-        self.group_data_list = list(selection.schedulable_groups.values())
-        # self._process_group_data(self.group_data_list)
+        self.group_data_map = dict(selection.schedulable_groups)
         self.obs_group_ids = list(selection.obs_group_ids) # noqa
         self.timelines = {night_idx: Timelines(selection.night_events, night_idx)
                           for night_idx in selection.night_indices}
@@ -83,8 +126,32 @@ class GreedyMaxOptimizer(BaseOptimizer):
         self.time_slot_length = selection.time_slot_length
         for site in self.sites:
             self.obs_in_plan[site] = {}
+        self.placements = {}
+
+        if self.dense_scores:
+            selection.build_score_matrices()
+
+        # Range-max index over the scores of each group for each night, rebuilt when a group is rescored.
+        self.score_index = {night_idx: {} for night_idx in selection.night_indices}
+        for group_data in self.group_data_map.values():
+            self._index_scores(group_data)
+
+        # Remaining time of each group, invalidated when time is charged to its observations or it is rescored.
+        self._obs_group_map = {obs.id: unique_group_id
+                               for unique_group_id, group_data in self.group_data_map.items()
+                               for obs in group_data.group.observations()}
+        self._slots_remaining = {unique_group_id: self._calculate_min_slots_remaining(group_data.group)
+                                 for unique_group_id, group_data in self.group_data_map.items()}
         return self
 
+    def _index_scores(self, group_data: GroupData) -> None:
+        """
+        Build the range-max index of the scores of a group for every night being scheduled.
+        """
+        unique_group_id = group_data.group.unique_id
+        for night_idx, night_index in self.score_index.items():
+            night_index[unique_group_id] = ScoreIndex(group_data.group_info.scores[night_idx])
+
     @staticmethod
     def non_zero_intervals(scores: NightTimeslotScores) -> npt.NDArray[int]:
         """
@@ -96,12 +163,12 @@ class GreedyMaxOptimizer(BaseOptimizer):
         The array returned here contains multiple Intervals and thus we leave the return type
         instead of using Interval.
         """
-        # Create an array that is 1 where the score is greater than 0, and pad each end with an extra 0.
-        not_zero = np.concatenate((np.array([0]), np.greater(scores, 0), np.array([0])))
-        abs_diff = np.abs(np.diff(not_zero))
+        # Sparse scores are stored as their non-zero intervals.
+        if isinstance(scores, SparseNightScores):
+            return scores.non_zero_intervals()
 
-        # Return the ranges for each nonzero interval.
-        return np.where(abs_diff == 1)[0].reshape(-1, 2)
+        # The nonzero intervals are the runs of the time slots where the score is greater than 0.
+        return SlotMask.from_bool(np.greater(scores, 0)).runs()
 
     @staticmethod
     def _first_nonzero_time_idx(inlist: ListOrNDArray[timedelta]) -> int:
@@ -164,7 +231,7 @@ class GreedyMaxOptimizer(BaseOptimizer):
 
         for obs in group.observations():
             # Unobserved remaining time, cumulative sequence of atoms
-            cumul_seq = obs.cumulative_exec_times()
+            cumul_seq = self.selection.time_accounting.cumulative_exec_times(obs)
             if verbose:
                 print(f"\t Obs: {obs.id.id} {obs.exec_time()} {obs.obs_class.name} {obs.site.name} "
                       f"{next(iter(obs.wavelengths()))} {cumul_seq[-1]}")
@@ -235,7 +302,19 @@ class GreedyMaxOptimizer(BaseOptimizer):
 
     def _min_slots_remaining(self, group: Group) -> Tuple[int, int, int, timedelta]:
         """
-        Returns the minimum number of time slots for the remaining time.
+        Returns the minimum number of time slots for the remaining time, the number of time slots remaining,
+        the number of NIR standards, and the remaining NIR science time.
+        These are cached per group until time is charged to the group or it is rescored.
+        """
+        slots_remaining = self._slots_remaining.get(group.unique_id)
+        if slots_remaining is None:
+            slots_remaining = self._calculate_min_slots_remaining(group)
+            self._slots_remaining[group.unique_id] = slots_remaining
+        return slots_remaining
+
+    def _calculate_min_slots_remaining(self, group: Group) -> Tuple[int, int, int, timedelta]:
+        """
+        Calculate the minimum number of time slots for the remaining time.
         """
 
         # the number of time slots in the minimum visit length
@@ -262,142 +341,335 @@ class GreedyMaxOptimizer(BaseOptimizer):
 
         return n_min, n_slots_remaining, n_std, exec_sci_nir
 
-    def _find_max_group(self, plans: Plans) -> Optional[MaxGroup]:
+    def _evaluate_group(self,
+                        group_data: GroupData,
+                        score_index: ScoreIndex,
+                        gap_start: int,
+                        gap_stop: int) -> Tuple[Optional[MaxGroup], bool]:
         """
-        Find the group with the max score in an open interval
-        Returns None if there is no such group.
-        Otherwise, returns a MaxGroup class containing information on the selected group.
+        Find the best sub-interval for a group in the open interval from gap_start (inclusive) to gap_stop
+        (exclusive), considering the gaps in its score (e.g. timing windows) and its remaining time.
+        Returns the MaxGroup for the best sub-interval, or None if the group does not fit in the open interval,
+        and whether the score of any sub-interval was penalized for leaving a small piece of the group behind.
         """
+        # Check if the interval is long enough to be useful (longer than min visit length).
+        # Remaining time for the group.
+        # Also, should see if it can be split.
+        n_min, num_time_slots_remaining, n_std, exec_time_nir = self._min_slots_remaining(group_data.group)
+        n_slots_min_visit = time2slots(self.time_slot_length, self.min_visit_len)
 
-        # If true just analyze the only first open interval, like original GM, eventually make a parameter or setting
-        only_first_interval = False
-
-        # Get the unscheduled, available intervals (time slots)
-        open_intervals = {site: self.timelines[plans.night_idx][site].get_available_intervals(only_first_interval)
-                          for site in self.sites}
-
-        max_scores = []
-        groups = []
-        intervals = []
-        n_slots_remaining = []
-        n_min_list = []
-        n_std_list = []
-        exec_nir_list = []
-
-        # Make a list of scores in the remaining groups
-        for group_data in self.group_data_list:
-            site = group_data.group.observations()[0].site
-            if not self.timelines[plans.night_idx][site].is_full:
-                for interval_idx, interval in enumerate(open_intervals[site]):
-                    # print(f'Interval: {iint}')
-                    # scores = group_data.group_info.scores[plans.night]
-
-                    # Get the maximum score over the interval.
-                    smax = np.max(group_data.group_info.scores[plans.night_idx][interval])
-                    if smax > 0.0:
-                        # Check if the interval is long enough to be useful (longer than min visit length).
-                        # Remaining time for the group.
-                        # Also, should see if it can be split.
-                        n_min, num_time_slots_remaining, n_std, exec_time_nir = \
-                            self._min_slots_remaining(group_data.group)
-
-                        # Evaluate sub-intervals (e.g. timing windows, gaps in the score).
-                        # Find time slot locations where the score > 0.
-                        # interval is a numpy array that indexes into the scores for the night to return a sub-array.
-                        check_interval = group_data.group_info.scores[plans.night_idx][interval]
-                        group_intervals = self.non_zero_intervals(check_interval)
-
-                        max_score_on_interval = 0.0
-                        max_interval = None
-                        for group_interval in group_intervals:
-                            grp_interval_length = group_interval[1] - group_interval[0]
-
-                            max_score = np.max(group_data.group_info.scores[plans.night_idx]
-                                               [interval[group_interval[0]:group_interval[1]]])
-
-                            # Add a penalty if the length of the group is slightly more than the interval
-                            # (within n_slots_min_visit), to discourage leaving small pieces behind
-                            n_slots_min_visit = time2slots(self.time_slot_length, self.min_visit_len)
-                            if 0 < num_time_slots_remaining - grp_interval_length < n_slots_min_visit:
-                                max_score *= 0.5
-
-                            # Find the max_score in the group intervals with non-zero scores
-                            # The length of the non-zero interval must be at least as large as
-                            # the minimum length
-                            if max_score > max_score_on_interval and grp_interval_length >= n_min:
-                                max_score_on_interval = max_score
-                                max_interval = group_interval
-
-                        if max_interval is not None:
-                            max_scores.append(max_score_on_interval)
-                            groups.append(group_data)
-                            intervals.append(interval[max_interval[0]:max_interval[1]])
-                            n_slots_remaining.append(num_time_slots_remaining)
-                            n_min_list.append(n_min)
-                            n_std_list.append(n_std)
-                            exec_nir_list.append(exec_time_nir)
-
-        max_score: Optional[float] = None
-        max_group: Optional[GroupData] = None
-        max_interval: Optional[Interval] = None
-        max_n_min = None
-        max_slots_remaining = None
-        max_n_std = None
-        max_exec_nir = ZeroTime
-
-        if len(max_scores) > 0:
-            # sort scores from high to low
-            iscore_sort = np.flip(np.argsort(max_scores))
-            ii = 0
-
-            max_score = max_scores[iscore_sort[ii]]  # maximum score in time interval
-            # consider groups with max scores within frac_score_limit of max_score
-            # Only highest score: frac_score_limit = 0.0
-            # Top 10%: frac_score_limit = 0.1
-            # Consider everything: frac_score_limit = 1.0
-            frac_score_limit = 0.1
-            score_limit = max_score * (1.0 - frac_score_limit)
-            max_group = groups[iscore_sort[ii]]
-            max_interval = intervals[iscore_sort[ii]]
-            max_n_min = n_min_list[iscore_sort[ii]]
-            max_slots_remaining = n_slots_remaining[iscore_sort[ii]]
-            max_n_std = n_std_list[iscore_sort[ii]]
-            max_exec_nir = exec_nir_list[iscore_sort[ii]]
-
-            # Prefer a group in the allowed score range if it does not require splitting,
-            # otherwise take the top scorer
-            selected = False
-            while not selected and ii < len(iscore_sort):
-                if (max_scores[iscore_sort[ii]] >= score_limit and
-                        n_slots_remaining[iscore_sort[ii]] <= len(intervals[iscore_sort[ii]])):
-                    # imax = ii
-                    max_score = max_scores[iscore_sort[ii]]
-                    max_group = groups[iscore_sort[ii]]
-                    max_interval = intervals[iscore_sort[ii]]
-                    max_n_min = n_min_list[iscore_sort[ii]]
-                    max_slots_remaining = n_slots_remaining[iscore_sort[ii]]
-                    max_n_std = n_std_list[iscore_sort[ii]]
-                    max_exec_nir = exec_nir_list[iscore_sort[ii]]
-                    selected = True
-                ii += 1
-
-        if max_score is None or max_group is None or max_interval is None:
-            return None
+        # Evaluate sub-intervals (e.g. timing windows, gaps in the score).
+        # Find time slot locations where the score > 0, relative to the start of the interval.
+        group_intervals = score_index.non_zero_intervals(gap_start, gap_stop)
+
+        max_score_on_interval = 0.0
+        max_interval = None
+        penalized = False
+        for group_interval in group_intervals:
+            grp_interval_length = group_interval[1] - group_interval[0]
+
+            max_score = score_index.max(gap_start + group_interval[0], gap_start + group_interval[1])
+
+            # Add a penalty if the length of the group is slightly more than the interval
+            # (within n_slots_min_visit), to discourage leaving small pieces behind
+            if 0 < num_time_slots_remaining - grp_interval_length < n_slots_min_visit:
+                max_score *= 0.5
+                penalized = True
+
+            # Find the max_score in the group intervals with non-zero scores
+            # The length of the non-zero interval must be at least as large as
+            # the minimum length
+            if max_score > max_score_on_interval and grp_interval_length >= n_min:
+                max_score_on_interval = max_score
+                max_interval = group_interval
+
+        if max_interval is None:
+            return None, penalized
 
         max_group_info = MaxGroup(
-            group_data=max_group,
-            max_score=max_score,
-            interval=max_interval,
-            n_min=max_n_min,
-            n_slots_remaining=max_slots_remaining,
-            n_std=max_n_std,
-            exec_sci_nir=max_exec_nir
+            group_data=group_data,
+            max_score=max_score_on_interval,
+            interval=np.arange(gap_start + max_interval[0], gap_start + max_interval[1]),
+            n_min=n_min,
+            n_slots_remaining=num_time_slots_remaining,
+            n_std=n_std,
+            exec_sci_nir=exec_time_nir
         )
+        return max_group_info, penalized
+
+    def _push_candidate(self,
+                        key: float,
+                        unique_group_id: UniqueGroupID,
+                        site: Site,
+                        gap_start: int,
+                        gap_stop: int,
+                        max_group_info: Optional[MaxGroup] = None) -> None:
+        """
+        Push an entry for a group on an open interval to the candidate queue, superseding any other entry
+        for the same group and open interval.
+        """
+        seq = next(self._candidate_counter)
+        self._live_candidates[(unique_group_id, site, gap_start, gap_stop)] = seq
+        heapq.heappush(self._candidates[site],
+                       (-key, seq, unique_group_id, site, gap_start, gap_stop, max_group_info))
+
+    def _push_candidates(self,
+                         night_idx: NightIndex,
+                         group_data: GroupData,
+                         gaps: Optional[List[Tuple[int, int]]] = None,
+                         replace: bool = True) -> None:
+        """
+        Push unevaluated entries for a group on the given open intervals of its site (by default, all of them).
+        Each entry is keyed by the maximum score of the group over the open interval, which is an upper bound
+        for the score of the group once it is evaluated on that interval.
+        If replace is False, open intervals that already have an entry for the group are skipped.
+        """
+        unique_group_id = group_data.group.unique_id
+        if unique_group_id not in self.group_data_map:
+            return
+
+        site = group_data.group.observations()[0].site
+        timeline = self.timelines[night_idx][site]
+        score_index = self.score_index[night_idx][unique_group_id]
+        if timeline.is_full or score_index.night_max() <= 0.0:
+            return
+
+        if gaps is None:
+            gaps = self._open_gaps(night_idx, site)
+        elif site in self._current_gaps:
+            open_gaps = self._open_gaps(night_idx, site)
+            gaps = [gap for gap in gaps if gap in open_gaps]
+        for gap_start, gap_stop in gaps:
+            if not replace and (unique_group_id, site, gap_start, gap_stop) in self._live_candidates:
+                continue
+            bound = score_index.max(gap_start, gap_stop)
+            if bound > 0.0:
+                self._push_candidate(bound, unique_group_id, site, gap_start, gap_stop)
+
+    def _open_gaps(self, night_idx: NightIndex, site: Site) -> List[Tuple[int, int]]:
+        """
+        The open intervals of the timeline for the site on which groups are queued. In anytime mode, this is the
+        earliest part of the current gap of the site that is still open, if any; otherwise, it is all the open
+        intervals.
+        """
+        timeline = self.timelines[night_idx][site]
+        if site not in self._current_gaps:
+            return timeline.free_intervals()
+        current_gap = self._current_gaps[site]
+        if current_gap is None:
+            return []
+        return timeline.free_intervals(*current_gap)[:1]
+
+    def _queue_gaps(self, night_idx: NightIndex, site: Site, gaps: List[Tuple[int, int]]) -> None:
+        """
+        Push an unevaluated entry for every remaining group of the site on each of the given open intervals.
+        """
+        timeline = self.timelines[night_idx][site]
+        if timeline.is_full:
+            return
+
+        score_matrix = self.selection.score_matrices.get((site, night_idx))
+        if score_matrix is None:
+            for group_data in list(self.group_data_map.values()):
+                if group_data.group.observations()[0].site == site:
+                    self._push_candidates(night_idx, group_data, gaps)
+            return
+
+        # Compute the maximum score over each open interval for all the groups of the site at once.
+        for gap_start, gap_stop in gaps:
+            bounds = score_matrix.interval_max(gap_start, gap_stop)
+            for row in np.flatnonzero(bounds > 0.0):
+                unique_group_id = score_matrix.unique_group_ids[row]
+                if unique_group_id in self.group_data_map:
+                    self._push_candidate(bounds[row], unique_group_id, site, gap_start, gap_stop)
+
+    def _init_candidates(self, night_idx: NightIndex) -> None:
+        """
+        Fill the candidate queue for a night with an unevaluated entry for every remaining group on every
+        open interval of its site.
 
-        return max_group_info
+        In anytime mode, no open interval is queued at first: the earliest one is queued by _advance_gap when
+        the first candidate is requested.
+        """
+        self._candidates = {site: [] for site in self.sites}
+        self._live_candidates = {}
+        self._penalized_gaps = {site: {} for site in self.sites}
+        self._current_gaps = {site: None for site in self.sites} if self._deadline is not None else {}
 
-    @staticmethod
-    def _integrate_score(night_idx: NightIndex,
+        for site in self.sites:
+            self._queue_gaps(night_idx, site, self._open_gaps(night_idx, site))
+
+    def _advance_gap(self, night_idx: NightIndex, site: Site) -> bool:
+        """
+        In anytime mode, once the open part of the current gap of the site has no candidates left, make the next
+        open interval after it the current gap and queue the groups on it.
+        Returns False if not in anytime mode or there is no such open interval.
+        """
+        if site not in self._current_gaps:
+            return False
+
+        timeline = self.timelines[night_idx][site]
+        open_gaps = self._open_gaps(night_idx, site)
+        if open_gaps:
+            start = open_gaps[0][1]
+        else:
+            current_gap = self._current_gaps[site]
+            start = 0 if current_gap is None else current_gap[0]
+        later_gaps = timeline.free_intervals(start)
+        if timeline.is_full or not later_gaps:
+            return False
+
+        self._current_gaps[site] = later_gaps[0]
+        self._queue_gaps(night_idx, site, later_gaps[:1])
+        return True
+
+    def _pop_candidate(self,
+                       night_idx: NightIndex,
+                       site: Site,
+                       min_score: float = 0.0) -> Optional[Tuple[MaxGroup, _Gap]]:
+        """
+        Pop the evaluated candidate with the highest score from the queue of the site, provided its score is at least
+        min_score. Returns the candidate and its open interval, or None if there is no such candidate.
+
+        Entries are only checked when they reach the top of the queue. Entries that were superseded or whose group
+        was scheduled are dropped; entries whose open interval was split by a placement are replaced by entries for
+        the open intervals that remain; unevaluated entries are evaluated and pushed back with their score as key.
+        Since every key is an upper bound on the score of its entry, an evaluated entry at the top of the queue
+        is the best candidate.
+        """
+        candidates = self._candidates[site]
+        while len(candidates) > 0 and -candidates[0][0] >= min_score:
+            _, seq, unique_group_id, _, gap_start, gap_stop, max_group_info = heapq.heappop(candidates)
+            live_key = (unique_group_id, site, gap_start, gap_stop)
+            if self._live_candidates.get(live_key) != seq:
+                continue
+            del self._live_candidates[live_key]
+
+            group_data = self.group_data_map.get(unique_group_id)
+            timeline = self.timelines[night_idx][site]
+            if group_data is None or timeline.is_full:
+                continue
+
+            if not timeline.is_free_interval(gap_start, gap_stop):
+                # A placement overlapped the open interval.
+                self._push_candidates(night_idx, group_data, timeline.free_intervals(gap_start, gap_stop),
+                                      replace=False)
+                continue
+
+            if max_group_info is None:
+                score_index = self.score_index[night_idx][unique_group_id]
+                max_group_info, penalized = self._evaluate_group(group_data, score_index, gap_start, gap_stop)
+                if penalized:
+                    # Splitting the open interval may lift the penalty, so the group must be re-evaluated then.
+                    self._penalized_gaps[site].setdefault((gap_start, gap_stop), set()).add(unique_group_id)
+                if max_group_info is not None:
+                    self._push_candidate(max_group_info.max_score, unique_group_id, site, gap_start, gap_stop,
+                                         max_group_info)
+                continue
+
+            return max_group_info, (site, gap_start, gap_stop)
+
+        return None
+
+    def _split_gap(self, night_idx: NightIndex, site: Site, time_slot: int) -> None:
+        """
+        A placement was made at the given time slot of the timeline for the site: push new entries for the groups
+        whose score was penalized on the open interval containing it, as the penalty may no longer apply.
+        """
+        timeline = self.timelines[night_idx][site]
+        penalized_gaps = self._penalized_gaps[site]
+        split_gaps = [gap for gap in penalized_gaps if gap[0] <= time_slot < gap[1]]
+        for gap in split_gaps:
+            gaps = timeline.free_intervals(*gap)
+            for unique_group_id in penalized_gaps.pop(gap):
+                group_data = self.group_data_map.get(unique_group_id)
+                if group_data is not None:
+                    self._push_candidates(night_idx, group_data, gaps)
+
+    def _site_heads(self, night_idx: NightIndex) -> Dict[Site, Tuple[MaxGroup, _Gap]]:
+        """
+        Pop the best remaining candidate of each site, moving on to the next open interval of a site in anytime mode
+        when its current one has no candidates left.
+        """
+        heads = {}
+        for site in self.sites:
+            head = self._pop_candidate(night_idx, site)
+            while head is None and self._advance_gap(night_idx, site):
+                head = self._pop_candidate(night_idx, site)
+            if head is not None:
+                heads[site] = head
+        return heads
+
+    def _next_candidate(self,
+                        night_idx: NightIndex,
+                        heads: Dict[Site, Tuple[MaxGroup, _Gap]],
+                        min_score: float) -> Optional[Tuple[MaxGroup, _Gap]]:
+        """
+        Take the best candidate over all sites from heads if its score is at least min_score, replacing it by the
+        next candidate at its site.
+        """
+        if not heads:
+            return None
+        best_site = max(heads, key=lambda s: heads[s][0].max_score)
+        best = heads.pop(best_site)
+        if best[0].max_score < min_score:
+            heads[best_site] = best
+            return None
+        head = self._pop_candidate(night_idx, best_site, min_score)
+        if head is not None:
+            heads[best_site] = head
+        return best
+
+    def _find_max_group(self, plans: Plans) -> Optional[MaxGroup]:
+        """
+        Find the group with the max score in an open interval
+        Returns None if there is no such group.
+        Otherwise, returns a MaxGroup class containing information on the selected group.
+
+        The candidates are taken from the queues filled by _init_candidates, which are kept up to date as groups are
+        placed and rescored. The queues of the sites are merged so that candidates are considered in order of score.
+        """
+        # The best remaining candidate of each site.
+        heads = self._site_heads(plans.night_idx)
+        if not heads:
+            return None
+
+        top = self._next_candidate(plans.night_idx, heads, 0.0)
+
+        # consider groups with max scores within frac_score_limit of max_score
+        # Only highest score: frac_score_limit = 0.0
+        # Top 10%: frac_score_limit = 0.1
+        # Consider everything: frac_score_limit = 1.0
+        frac_score_limit = 0.1
+        score_limit = top[0].max_score * (1.0 - frac_score_limit)
+
+        # Prefer a group in the allowed score range if it does not require splitting,
+        # otherwise take the top scorer
+        considered = [top]
+        selected = None
+        if top[0].n_slots_remaining <= len(top[0].interval):
+            selected = top
+        while selected is None:
+            candidate = self._next_candidate(plans.night_idx, heads, score_limit)
+            if candidate is None:
+                break
+            considered.append(candidate)
+            if candidate[0].n_slots_remaining <= len(candidate[0].interval):
+                selected = candidate
+        if selected is None:
+            selected = top
+
+        # Return the candidates that were not selected to the queues.
+        considered.extend(heads.values())
+        for max_group_info, (site, gap_start, gap_stop) in considered:
+            if max_group_info is not selected[0]:
+                self._push_candidate(max_group_info.max_score, max_group_info.group_data.group.unique_id,
+                                     site, gap_start, gap_stop, max_group_info)
+
+        return selected[0]
+
+    def _integrate_score(self,
+                         night_idx: NightIndex,
                          max_group_info: MaxGroup) -> Interval:
         """
         Use the score array to find the best location in the timeline
@@ -405,18 +677,20 @@ class GreedyMaxOptimizer(BaseOptimizer):
         start = max_group_info.interval[0]
         end = max_group_info.interval[-1]
         scores = max_group_info.group_data.group_info.scores[night_idx]
+        score_index = self.score_index[night_idx][max_group_info.group_data.group.unique_id]
         max_integral_score = scores[0]
 
         if len(max_group_info.interval) > 1:
             # Slide across the interval, integrating the score over the group length
-            for idx in range(max_group_info.interval[0],
-                             max_group_info.interval[-1] - max_group_info.n_slots_remaining + 2):
-
-                integral_score = sum(scores[idx:idx + max_group_info.n_slots_remaining + 1])
-
-                if integral_score > max_integral_score:
-                    max_integral_score = integral_score
-                    start = idx
+            starts = np.arange(max_group_info.interval[0],
+                               max_group_info.interval[-1] - max_group_info.n_slots_remaining + 2)
+            if len(starts) > 0:
+                integral_scores = score_index.window_sums(starts, max_group_info.n_slots_remaining + 1)
+                # The first window with the highest integrated score.
+                best = np.argmax(integral_scores)
+                if integral_scores[best] > max_integral_score:
+                    max_integral_score = integral_scores[best]
+                    start = starts[best]
                     end = start + max_group_info.n_slots_remaining - 1
 
         # Shift to window boundary if within minimum block time of edge.
@@ -453,8 +727,7 @@ class GreedyMaxOptimizer(BaseOptimizer):
 
         return best_interval
 
-    @staticmethod
-    def _find_group_position(night_idx: NightIndex, max_group_info: MaxGroup) -> Interval:
+    def _find_group_position(self, night_idx: NightIndex, max_group_info: MaxGroup) -> Interval:
         """Find the best location in the timeline"""
         best_interval = max_group_info.interval
 
@@ -466,7 +739,7 @@ class GreedyMaxOptimizer(BaseOptimizer):
         if max_group_info.n_slots_remaining < len(max_group_info.interval):
             # Determine position based on max integrated score
             # If we don't end up here, then the group will have to be split later
-            best_interval = GreedyMaxOptimizer._integrate_score(night_idx, max_group_info)
+            best_interval = self._integrate_score(night_idx, max_group_info)
 
         return best_interval
 
@@ -482,7 +755,7 @@ class GreedyMaxOptimizer(BaseOptimizer):
         obs_id_nir = None
         for obs in science_obs:
             obs_id = obs.id
-            cumul_seq = obs.cumulative_exec_times()
+            cumul_seq = self.selection.time_accounting.cumulative_exec_times(obs)
             atom_start = self._first_nonzero_time_idx(cumul_seq)
             atom_end = atom_start
 
@@ -644,11 +917,14 @@ class GreedyMaxOptimizer(BaseOptimizer):
 
         return standards, placement
     
-    @staticmethod
-    def _charge_time(observation: Observation, atom_start: int = 0, atom_end: int = -1) -> None:
+    def _charge_time(self, observation: Observation, atom_start: int = 0, atom_end: int = -1) -> None:
         """Pseudo (internal to GM) time accounting, or charging.
            GM must assume that each scheduled observation is executed and then adjust the completeness fraction
-           and scoring accordingly. This does not update the database or Collector"""
+           and scoring accordingly. This does not update the database or Collector: the charges are recorded
+           in the TimeAccounting of the selection, which marks the charged atoms as observed.
+           The cached remaining time of the group of the observation is dropped."""
+        time_accounting = self.selection.time_accounting
+        self._slots_remaining.pop(self._obs_group_map.get(observation.id), None)
         seq_length = len(observation.sequence)
 
         if atom_end < 0:
@@ -656,26 +932,24 @@ class GreedyMaxOptimizer(BaseOptimizer):
 
         # Update observation status
         if atom_end == seq_length - 1:
-            observation.status = ObservationStatus.OBSERVED
+            time_accounting.set_status(observation, ObservationStatus.OBSERVED)
         else:
-            observation.status = ObservationStatus.ONGOING
+            time_accounting.set_status(observation, ObservationStatus.ONGOING)
 
         for n_atom in range(atom_start, atom_end + 1):
             # "Charge" the expected program and partner times for the atoms:
-            observation.sequence[n_atom].program_used = observation.sequence[n_atom].prog_time
-            observation.sequence[n_atom].partner_used = observation.sequence[n_atom].part_time
+            program_used = observation.sequence[n_atom].prog_time
+            partner_used = observation.sequence[n_atom].part_time
 
             # Charge the acq to the first atom based on observation class
             if n_atom == atom_start:
                 if observation.obs_class == ObservationClass.PARTNERCAL:
-                    observation.sequence[n_atom].partner_used += observation.acq_overhead
+                    partner_used += observation.acq_overhead
                 elif observation.obs_class == ObservationClass.SCIENCE or \
                         observation.obs_class == ObservationClass.PROGCAL:
-                    observation.sequence[n_atom].program_used += observation.acq_overhead
+                    program_used += observation.acq_overhead
 
-            # For completeness
-            observation.sequence[n_atom].observed = True
-            observation.sequence[n_atom].qa_state = QAState.PASS
+            time_accounting.charge_atom(observation, n_atom, program_used, partner_used)
 
     def plot_airmass(self,
                      obs_id: ObservationID,
@@ -739,7 +1013,7 @@ class GreedyMaxOptimizer(BaseOptimizer):
                     scores = self.selection.program_info[program_id].group_data_map[unique_group_id]. \
                         group_info.scores[night_idx]
                     if alt:
-                        y = self.selection.program_info[program_id].target_info[obs_id][night_idx].alt.degree
+                        y = self.selection.program_info[program_id].target_info[obs_id][night_idx].alt_deg
                     else:
                         y = self.selection.program_info[program_id].target_info[obs_id][night_idx].airmass
                     x = np.array([i for i in range(len(y))], dtype=int)
@@ -776,8 +1050,8 @@ class GreedyMaxOptimizer(BaseOptimizer):
     def _update_score(self, program: Program, night_idx: NightIndex) -> None:
         """Update the scores of the incomplete groups in the scheduled program"""
 
-        # print("Running score_program")
-        program_calculations = self.selection.score_program(program)
+        # print("Running rescore_program")
+        program_calculations = self.selection.rescore_program(program)
         if program_calculations is None:
             return None
 
@@ -786,51 +1060,161 @@ class GreedyMaxOptimizer(BaseOptimizer):
             group_data = program_calculations.group_data_map[unique_group_id]
             group, group_info = group_data
             schedulable_group = self.selection.schedulable_groups[unique_group_id]
+            self._slots_remaining.pop(unique_group_id, None)
             # print(f"{unique_group_id} {schedulable_group.group.exec_time()} {schedulable_group.group.total_used()}")
             # print(f"\tOld max score: {np.max(schedulable_group.group_info.scores[night_idx]):7.2f} new max score[0]: "
             #       f"{np.max(group_info.scores[night_idx]):7.2f}")
             # update scores in schedulable_groups if the group is not completely observed
-            if schedulable_group.group.exec_time() >= schedulable_group.group.total_used():
-                schedulable_group.group_info.scores = group_info.scores
+            if (schedulable_group.group.exec_time() >=
+                    self.selection.time_accounting.group_total_used(schedulable_group.group)):
+                self.selection.update_scores(unique_group_id, group_info.scores)
+                schedulable_group.group_info.metric_factor = group_info.metric_factor
+                self._index_scores(schedulable_group)
+                self._push_candidates(night_idx, schedulable_group)
                 # schedulable_group.group_info.scores[:] = group_info.scores[:]
             # print(f"\tUpdated max score: {np.max(schedulable_group.group_info.scores[night_idx]):7.2f}")
 
     def _run(self, plans: Plans) -> None:
 
         # Fill plans for all sites on one night
-        while not self.timelines[plans.night_idx].all_done() and len(self.group_data_list) > 0:
-
-            # print(f"\nNight {plans.night_idx + 1}")
+        self._init_candidates(plans.night_idx)
+        kept_groups = self._warm_start(plans.night_idx)
+        if kept_groups > 0:
+            logger.info(f'Night {plans.night_idx}: kept {kept_groups} groups from the previous plans.')
+        placements = 0
+        while not self.timelines[plans.night_idx].all_done() and len(self.group_data_map) > 0:
+            if self._deadline_reached():
+                logger.warning(f'Time budget reached for night {plans.night_idx} after {placements} placements.')
+                break
 
             # Find the group with the max score in an open interval
             max_group_info = self._find_max_group(plans)
 
             # If something found, add it to the timeline and plan
             if max_group_info is not None:
-                # max_score, max_group, max_interval = max_group_info
                 added = self.add(plans.night_idx, max_group_info)
                 if added:
-                    # print(f"Group {max_group_info.group_data.group.unique_id.id} with "
-                    #      f"max score {max_group_info.max_score} added.")
-                    # Remove group from list if completely observed
-                    # if max_group_info.group_data.group.program_used() >= max_group_info.group_data.group.prog_time():
+                    placements += 1
                     # remove any added group to avoid multiple visits on the same night
-                    self.group_data_list.remove(max_group_info.group_data)
+                    del self.group_data_map[max_group_info.group_data.group.unique_id]
+                    site = max_group_info.group_data.group.observations()[0].site
+                    self._split_gap(plans.night_idx, site, max_group_info.interval[0])
             else:
                 # Nothing remaining can be scheduled
-                # for plan in plans:
-                #     plan.is_full = True
                 # TODO NOTE: Does this really mean the timeline is full?
                 for timeline in self.timelines[plans.night_idx]:
                     logger.warning(f'Setting timelines corresponding to {plans.night_idx} to full (no max_group_info).')
                     timeline.is_full = True
 
+        self.placements[plans.night_idx] = placements
+        if self._deadline is not None:
+            logger.info(f'Night {plans.night_idx}: {placements} placements made within the time budget.')
+
         if self.show_plots:
             self.plot_timelines(plans.night_idx)
 
         # Write observations from the timelines to the output plan
         self.output_plans(plans)
 
+    def _warm_start(self, night_idx: NightIndex) -> int:
+        """
+        Place the groups of the previous plans for the night again, if there are previous plans.
+        Only the visits that start at or after the starting time slot of the selection are considered, and a group
+        is only placed if all its visits are still valid (see _valid_visits), in which case it is placed and charged
+        as it would be by add.
+        Returns the number of groups placed.
+        """
+        previous_plans = self._previous_plans.get(night_idx)
+        if previous_plans is None:
+            return 0
+
+        visits_by_group: Dict[UniqueGroupID, List[Visit]] = {}
+        for site in self.sites:
+            if site not in previous_plans.plans:
+                continue
+            starting_time_slot = self.selection.starting_time_slots[site][night_idx]
+            for visit in previous_plans[site].visits:
+                unique_group_id = self._obs_group_map.get(visit.obs_id)
+                if visit.start_time_slot >= starting_time_slot and unique_group_id is not None:
+                    visits_by_group.setdefault(unique_group_id, []).append(visit)
+
+        kept_groups = 0
+        for unique_group_id, visits in visits_by_group.items():
+            group_data = self.group_data_map.get(unique_group_id)
+            if group_data is not None and self._valid_visits(night_idx, group_data, visits):
+                self._place_visits(night_idx, group_data, visits)
+                kept_groups += 1
+        return kept_groups
+
+    def _valid_visits(self, night_idx: NightIndex, group_data: GroupData, visits: List[Visit]) -> bool:
+        """
+        Determine if the visits of a group from the previous plans can be placed again, i.e. for each visit:
+        1. The observation is still active and its first unobserved atom is the first atom of the visit.
+        2. The time slots of the visit are still open.
+        3. The score of the group is positive over the time slots of the visit.
+        """
+        site = group_data.group.observations()[0].site
+        timeline = self.timelines[night_idx][site]
+        scores = group_data.group_info.scores[night_idx]
+        observations = {obs.id: obs for obs in group_data.group.observations()}
+        time_accounting = self.selection.time_accounting
+
+        for visit in visits:
+            obs = observations.get(visit.obs_id)
+            if obs is None or time_accounting.status(obs) not in {ObservationStatus.READY, ObservationStatus.ONGOING}:
+                return False
+            if (self._first_nonzero_time_idx(time_accounting.cumulative_exec_times(obs)) != visit.atom_start_idx or
+                    visit.atom_end_idx >= len(obs.sequence)):
+                return False
+            visit_stop = visit.start_time_slot + visit.time_slots
+            if timeline.free_intervals(visit.start_time_slot, visit_stop) != [(visit.start_time_slot, visit_stop)]:
+                return False
+            if not np.all(scores[visit.start_time_slot:visit_stop] > 0.0):
+                return False
+        return True
+
+    def _place_visits(self, night_idx: NightIndex, group_data: GroupData, visits: List[Visit]) -> None:
+        """
+        Place the visits of a group from the previous plans in the timeline at their time slots, and charge the time
+        and re-score the program as add does.
+        """
+        group = group_data.group
+        site = group.observations()[0].site
+        timeline = self.timelines[night_idx][site]
+        score_index = self.score_index[night_idx][group.unique_id]
+        observations = {obs.id: obs for obs in group.observations()}
+
+        for visit in visits:
+            obs = observations[visit.obs_id]
+            visit_stop = visit.start_time_slot + visit.time_slots
+            iobs = self.obs_group_ids.index(obs.to_unique_group_id)
+            start_time_slot, start = timeline.add(iobs, visit.time_slots, np.arange(visit.start_time_slot, visit_stop))
+            self.obs_in_plan[site][start_time_slot] = ObsPlanData(
+                obs=obs,
+                obs_start=start,
+                obs_len=visit.time_slots,
+                atom_start=visit.atom_start_idx,
+                atom_end=visit.atom_end_idx,
+                visit_score=score_index.sum(start_time_slot, visit_stop),
+                peak_score=score_index.max(start_time_slot, visit_stop)
+            )
+            self._charge_time(obs, atom_start=visit.atom_start_idx, atom_end=visit.atom_end_idx)
+
+        # Inactivate any standards not used
+        visit_obs_ids = {visit.obs_id for visit in visits}
+        for obs in group.partner_observations():
+            if obs.id not in visit_obs_ids:
+                self.selection.time_accounting.set_status(obs, ObservationStatus.INACTIVE)
+
+        del self.group_data_map[group.unique_id]
+        self._update_score(self.selection.program_info[group.program_id].program, night_idx=night_idx)
+        for visit in visits:
+            self._split_gap(night_idx, site, visit.start_time_slot)
+
+        if timeline.slots_unscheduled() <= 0:
+            logger.warning(f'Timeline for {night_idx} is full: no slots remain unscheduled.')
+            timeline.is_full = True
+
     def _length_visit(self, n_acq, n_seq):
         return n_acq + time2slots(self.time_slot_length, n_seq)
 
@@ -850,7 +1234,7 @@ class GreedyMaxOptimizer(BaseOptimizer):
         # program = self.selection.program_info[max_group_info.group_data.group.program_id].program
 
         iobs = self.obs_group_ids.index(obs.to_unique_group_id)
-        cumul_seq = obs.cumulative_exec_times()
+        cumul_seq = self.selection.time_accounting.cumulative_exec_times(obs)
 
         atom_start = self._first_nonzero_time_idx(cumul_seq)
         atom_end = atom_start
@@ -876,8 +1260,9 @@ class GreedyMaxOptimizer(BaseOptimizer):
 
         # Get visit score and store information for the output plans
         end_time_slot = start_time_slot + visit_length - 1
-        visit_score = sum(max_group_info.group_data.group_info.scores[night_idx][start_time_slot:end_time_slot + 1])
-        peak_score = max(max_group_info.group_data.group_info.scores[night_idx][start_time_slot:end_time_slot + 1])
+        score_index = self.score_index[night_idx][max_group_info.group_data.group.unique_id]
+        visit_score = score_index.sum(start_time_slot, end_time_slot + 1)
+        peak_score = score_index.max(start_time_slot, end_time_slot + 1)
 
         self.obs_in_plan[site][start_time_slot] = ObsPlanData(
             obs=obs,
@@ -985,7 +1370,7 @@ class GreedyMaxOptimizer(BaseOptimizer):
             # Inactivate any standards not used
             for obs in part_obs:
                 if obs not in standards:
-                    obs.status = ObservationStatus.INACTIVE
+                    self.selection.time_accounting.set_status(obs, ObservationStatus.INACTIVE)
 
             # TODO: Shift to remove any gaps in the plan?
 
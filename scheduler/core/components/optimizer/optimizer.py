@@ -1,7 +1,8 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
-from typing import List
+from datetime import timedelta
+from typing import List, Optional
 
 from scheduler.core.calculations.selection import Selection
 from scheduler.core.components.optimizer.base import BaseOptimizer
@@ -32,10 +33,17 @@ class Optimizer:
         self.period = None
         self.night_events = None
 
-    def schedule(self, selection: Selection) -> List[Plans]:
+    def schedule(self,
+                 selection: Selection,
+                 time_budget: Optional[timedelta] = None,
+                 previous_nights: Optional[List[Plans]] = None) -> List[Plans]:
         """
         The night_indices are guaranteed to be a contiguous, sorted set by Selector.select.
         If they are not, this method will cause problems.
+
+        If a time budget is given, the algorithm stops when it runs out if it supports it (see BaseOptimizer),
+        and the plans built so far are returned.
+        If the plans previously made for the nights are given, the algorithm may start from them if it supports it.
         """
         self.selection = selection
         self.algorithm.setup(selection)
@@ -45,17 +53,21 @@ class Optimizer:
         nights = [Plans(self.night_events,
                         selection.night_conditions,
                         night_idx) for night_idx in self.selection.night_indices]
-        self.algorithm.schedule(nights)
+        self.algorithm.schedule(nights, time_budget, previous_nights)
         return nights
 
     def _update_score(self, program: Program) -> None:
         """Update the scores of the incomplete groups in the scheduled program"""
-        program_calculations = self.selection.score_program(program)
+        program_calculations = self.selection.rescore_program(program)
+        if program_calculations is None:
+            return
 
         for unique_group_id in program_calculations.top_level_groups:
             group_data = program_calculations.group_data_map[unique_group_id]
             group, group_info = group_data
             schedulable_group = self.selection.schedulable_groups[unique_group_id]
             # update scores in schedulable_groups if the group is not completely observed
-            if schedulable_group.group.exec_time() >= schedulable_group.group.total_used():
-                schedulable_group.group_info.scores = group_info.scores
+            if (schedulable_group.group.exec_time() >=
+                    self.selection.time_accounting.group_total_used(schedulable_group.group)):
+                self.selection.update_scores(unique_group_id, group_info.scores)
+                schedulable_group.group_info.metric_factor = group_info.metric_factor
@@ -0,0 +1,114 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+from typing import final, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from scheduler.core.calculations import NightTimeslotScores, SlotMask, SparseNightScores
+
+
+__all__ = [
+    'ScoreIndex',
+]
+
+
+@final
+class ScoreIndex:
+    """
+    Range-maximum and prefix-sum index over the scores of a group for a single night.
+
+    The scores are stored in an array-based segment tree so that the maximum over any range of time slots
+    is found in O(log n), and the runs of non-zero scores are precomputed so that the non-zero sub-intervals
+    of any range are found by binary search instead of a scan over the range.
+    The cumulative sum of the scores gives the sum over any range of time slots in O(1), and the sums over
+    all the windows of a given width in an interval with one vectorized operation.
+
+    The index is immutable: when a group is rescored, a new index must be built from the new scores.
+    """
+
+    def __init__(self, scores: Union[NightTimeslotScores, SparseNightScores]):
+        # The runs [a, b) of non-zero scores, see GreedyMaxOptimizer.non_zero_intervals.
+        if isinstance(scores, SparseNightScores):
+            self._runs = scores.non_zero_intervals()
+            scores = np.asarray(scores)
+        else:
+            scores = np.asarray(scores, dtype=float)
+            self._runs = SlotMask.from_bool(np.greater(scores, 0)).runs()
+        self._length = len(scores)
+
+        # The leaves start at index size; unused leaves are padded with zeros as scores are never negative.
+        size = 1
+        while size < max(self._length, 1):
+            size *= 2
+        self._size = size
+        tree = np.zeros(2 * size)
+        tree[size:size + self._length] = scores
+
+        # Build the tree a level at a time, from the parents of the leaves up to the root at index 1.
+        level = size // 2
+        while level >= 1:
+            tree[level:2 * level] = np.maximum(tree[2 * level:4 * level:2], tree[2 * level + 1:4 * level:2])
+            level //= 2
+        self._tree = tree
+
+        # _cumsum[i] is the sum of the scores over the time slots before i.
+        self._cumsum = np.concatenate((np.array([0.]), np.cumsum(scores)))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def night_max(self) -> float:
+        """
+        The maximum score over the whole night.
+        """
+        return float(self._tree[1])
+
+    def max(self, start: int, stop: int) -> float:
+        """
+        The maximum score over the time slots from start (inclusive) to stop (exclusive).
+        An empty range has a maximum of 0.
+        """
+        start = max(start, 0) + self._size
+        stop = min(stop, self._length) + self._size
+        result = 0.0
+        while start < stop:
+            if start & 1:
+                result = max(result, self._tree[start])
+                start += 1
+            if stop & 1:
+                stop -= 1
+                result = max(result, self._tree[stop])
+            start //= 2
+            stop //= 2
+        return float(result)
+
+    def non_zero_intervals(self, start: int, stop: int) -> npt.NDArray[int]:
+        """
+        The non-zero intervals of the scores over the time slots from start (inclusive) to stop (exclusive).
+        As with GreedyMaxOptimizer.non_zero_intervals applied to scores[start:stop], this consists of an array
+        with entries [a, b] relative to start, where the non-zero interval runs from a (inclusive) to b (exclusive).
+        """
+        # Runs that end after start and begin before stop overlap the range.
+        first = np.searchsorted(self._runs[:, 1], start, side='right')
+        last = np.searchsorted(self._runs[:, 0], stop, side='left')
+        return np.clip(self._runs[first:last], start, stop) - start
+
+    def sum(self, start: int, stop: int) -> float:
+        """
+        The sum of the scores over the time slots from start (inclusive) to stop (exclusive).
+        As with slicing, the range is clipped to the night.
+        """
+        start = min(max(start, 0), self._length)
+        stop = min(max(stop, start), self._length)
+        return float(self._cumsum[stop] - self._cumsum[start])
+
+    def window_sums(self, starts: npt.NDArray[int], width: int) -> npt.NDArray[float]:
+        """
+        The sums of the scores over the windows of the given width beginning at each of the starting time slots.
+        As with slicing, windows that extend past the end of the night are clipped to it.
+        """
+        starts = np.clip(starts, 0, self._length)
+        stops = np.minimum(starts + width, self._length)
+        return self._cumsum[stops] - self._cumsum[starts]
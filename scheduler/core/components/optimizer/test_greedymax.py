@@ -1,6 +1,8 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
+from datetime import timedelta
+
 import numpy as np
 from .greedymax import GreedyMaxOptimizer
 
@@ -12,3 +14,16 @@ def test_non_zero_intervals():
     print(intervals)
     assert (expected == intervals).all()
 
+
+def test_time_budget_deadline():
+    optimizer = GreedyMaxOptimizer(time_budget=timedelta(0))
+    optimizer.schedule([])
+    assert optimizer._deadline_reached()
+
+    # A budget passed to schedule overrides the one of the optimizer.
+    optimizer.schedule([], timedelta(hours=1))
+    assert not optimizer._deadline_reached()
+
+    optimizer = GreedyMaxOptimizer()
+    optimizer.schedule([])
+    assert not optimizer._deadline_reached()
@@ -0,0 +1,34 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import numpy as np
+from .greedymax import GreedyMaxOptimizer
+from .scoreindex import ScoreIndex
+
+
+def test_score_index_max():
+    scores = np.array([0., 1., 3., 4., 0., 0., 2., 9., 0.])
+    index = ScoreIndex(scores)
+    assert index.night_max() == 9.
+    for start in range(len(scores)):
+        for stop in range(start + 1, len(scores) + 1):
+            assert index.max(start, stop) == np.max(scores[start:stop])
+
+
+def test_score_index_non_zero_intervals():
+    scores = np.array([0., 1., 3., 4., 0., 0., 2., 9., 0.])
+    index = ScoreIndex(scores)
+    for start in range(len(scores)):
+        for stop in range(start + 1, len(scores) + 1):
+            expected = GreedyMaxOptimizer.non_zero_intervals(scores[start:stop])
+            assert (index.non_zero_intervals(start, stop) == expected).all()
+
+
+def test_score_index_sums():
+    scores = np.array([0., 1., 3., 4., 0., 0., 2., 9., 0.])
+    index = ScoreIndex(scores)
+    assert index.sum(1, 4) == 8.
+    assert index.sum(6, 20) == 11.
+    starts = np.arange(0, 8)
+    expected = np.array([sum(scores[idx:idx + 3]) for idx in starts])
+    assert np.allclose(index.window_sums(starts, 3), expected)
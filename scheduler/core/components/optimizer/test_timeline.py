@@ -0,0 +1,31 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from lucupy.minimodel import Site
+
+from .timeline import Timeline
+
+
+def test_timeline_free_intervals():
+    timeline = Timeline(datetime(2024, 1, 1), datetime(2024, 1, 2), timedelta(minutes=1), Site.GS, 20)
+    assert timeline.free_intervals() == [(0, 20)]
+
+    timeline.add(0, 5, np.arange(3, 12))
+    timeline.add(1, 2, np.arange(15, 20))
+    assert timeline.free_intervals() == [(0, 3), (8, 15), (17, 20)]
+    assert timeline.free_intervals(2, 16) == [(2, 3), (8, 15)]
+    assert timeline.is_free_interval(8, 15)
+    assert not timeline.is_free_interval(8, 14)
+    assert timeline.slots_unscheduled() == np.count_nonzero(timeline.time_slots == Timeline.EMPTY)
+
+    # Adding to an interval that starts on filled time slots uses its first open slot.
+    start_time_slot, _ = timeline.add(2, 3, np.arange(4, 15))
+    assert start_time_slot == 8
+    assert timeline.free_intervals() == [(0, 3), (11, 15), (17, 20)]
+    assert [list(interval) for interval in timeline.get_available_intervals()] == [[0, 1, 2], [11, 12, 13, 14],
+                                                                                   [17, 18, 19]]
+    assert list(timeline.get_earliest_available_interval()) == [0, 1, 2]
+    assert timeline.slots_unscheduled() == 10
@@ -1,6 +1,7 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
+import bisect
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import final, ClassVar, List, Mapping, Optional, Sequence, Tuple
@@ -25,6 +26,9 @@ class Timeline:
     Nightly plan for a specific Site for the GreedyMax optimizer. Each plan is a time_slots array with one
     entry for each time slot for the night. Each value needs to be an index to the observation
     scheduled in that slot.
+
+    The open intervals of empty time slots are kept as a sorted list of [start, stop) pairs that is split as
+    observations are added, so that queries on them do not need to scan the time_slots array.
     """
     start: datetime
     end: datetime
@@ -39,19 +43,43 @@ class Timeline:
         self.time_slots = np.full(self.total_time_slots, Timeline.EMPTY)
         self.is_full = False
 
+        # Sorted open intervals: _free_starts[i] and _free_stops[i] are the first (inclusive) and last (exclusive)
+        # time slots of the i-th open interval.
+        self._free_starts: List[int] = [0] if self.total_time_slots > 0 else []
+        self._free_stops: List[int] = [self.total_time_slots] if self.total_time_slots > 0 else []
+        self._unscheduled = self.total_time_slots
+
     def __contains__(self, obs: Observation) -> bool:
         return obs.id in self.time_slots
 
+    def free_intervals(self, start: int = 0, stop: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Get the open intervals as [a, b) pairs of time slots, clipped to the time slots from start (inclusive)
+        to stop (exclusive).
+        """
+        if stop is None:
+            stop = self.total_time_slots
+        # The first open interval that ends after start, and the open intervals that begin before stop.
+        first = bisect.bisect_right(self._free_stops, start)
+        last = bisect.bisect_left(self._free_starts, stop)
+        return [(max(a, start), min(b, stop)) for a, b in zip(self._free_starts[first:last],
+                                                              self._free_stops[first:last])]
+
+    def is_free_interval(self, start: int, stop: int) -> bool:
+        """
+        Determine if the time slots from start (inclusive) to stop (exclusive) are exactly an open interval.
+        """
+        idx = bisect.bisect_left(self._free_starts, start)
+        return idx < len(self._free_starts) and self._free_starts[idx] == start and self._free_stops[idx] == stop
+
     def get_available_intervals(self, first: bool = False) -> Interval | List[Interval]:
         """
         Get the set of time_slot Intervals that can be scheduled. If desired, return only the first.
         If there are no Intervals, return an empty array.
         """
-        # Get the list of empty time slots and split into Intervals of consecutive time slots.
-        empty_slots = np.where(self.time_slots == Timeline.EMPTY)[0]
-
-        # intervals is a Python list.
-        intervals = np.split(empty_slots, np.where(np.diff(empty_slots) != 1)[0] + 1)
+        if not self._free_starts:
+            return [np.array([], dtype=int)]
+        intervals = [np.arange(a, b) for a, b in zip(self._free_starts, self._free_stops)]
         return intervals[0] if first and len(intervals) > 1 else intervals
 
     def get_earliest_available_interval(self) -> Optional[Interval]:
@@ -59,13 +87,36 @@ class Timeline:
         Get the earliest available space in the schedule that can allocate an observation if one exists.
         If there are no such intervals, return None.
         """
-        intervals = self.get_available_intervals()
-        return intervals[0] if len(intervals) > 0 else None
+        if not self._free_starts:
+            return None
+        return np.arange(self._free_starts[0], self._free_stops[0])
 
     def slots_unscheduled(self) -> int:
         """Return the number of unscheduled, but schedulable, time slots"""
-        unscheduled = np.where(self.time_slots == Timeline.EMPTY)[0]
-        return len(unscheduled)
+        return self._unscheduled
+
+    def _fill(self, start: int, stop: int) -> None:
+        """
+        Remove the time slots from start (inclusive) to stop (exclusive) from the open intervals,
+        splitting the open intervals that they overlap.
+        """
+        first = bisect.bisect_right(self._free_stops, start)
+        last = bisect.bisect_left(self._free_starts, stop)
+        if first >= last:
+            return
+
+        remaining_starts = []
+        remaining_stops = []
+        for a, b in zip(self._free_starts[first:last], self._free_stops[first:last]):
+            self._unscheduled -= min(b, stop) - max(a, start)
+            if a < start:
+                remaining_starts.append(a)
+                remaining_stops.append(start)
+            if stop < b:
+                remaining_starts.append(stop)
+                remaining_stops.append(b)
+        self._free_starts[first:last] = remaining_starts
+        self._free_stops[first:last] = remaining_stops
 
     def add(self, obs_idx: int, required_time_slots: int, interval: Interval) -> Tuple[int, datetime]:
         """
@@ -79,12 +130,24 @@ class Timeline:
         start = ZeroTime
 
         # Get first non-zero slot in given interval.
-        interval_empty_slots = np.where(self.time_slots[interval] == Timeline.EMPTY)[0]
+        if len(interval) > 0 and interval[-1] - interval[0] + 1 == len(interval):
+            # The interval is consecutive, so the first open slot is the start of the first open interval in it.
+            open_intervals = self.free_intervals(interval[0], interval[-1] + 1)
+            interval_empty_slots = [open_intervals[0][0] - interval[0]] if open_intervals else []
+        else:
+            interval_empty_slots = np.where(self.time_slots[interval] == Timeline.EMPTY)[0]
+
         if len(interval_empty_slots) > 0:
             first_open_slot = interval_empty_slots[0]
 
             # and if so, set values of time_slots to the observation index.
-            self.time_slots[interval[first_open_slot:first_open_slot + required_time_slots]] = obs_idx
+            filled_slots = interval[first_open_slot:first_open_slot + required_time_slots]
+            self.time_slots[filled_slots] = obs_idx
+
+            # Remove each run of consecutive filled time slots from the open intervals.
+            for run in np.split(filled_slots, np.where(np.diff(filled_slots) != 1)[0] + 1):
+                if len(run) > 0:
+                    self._fill(int(run[0]), int(run[-1]) + 1)
 
             # First time slot
             start_time_slot = interval[first_open_slot]
@@ -1,5 +1,7 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
-from .default import RankerParameters, RankerBandParameters, DefaultRanker
+# Ranker must be bound before importing the DefaultRanker, which imports scheduler.core.calculations,
+# which in turn imports Ranker.
 from .base import Ranker
+from .default import RankerParameters, RankerBandParameters, DefaultRanker
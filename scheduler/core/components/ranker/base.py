@@ -2,11 +2,11 @@
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
 from abc import abstractmethod, ABC
-from typing import Dict, FrozenSet
+from typing import Dict, FrozenSet, Iterable, Optional, Sequence
 
 import numpy as np
 import numpy.typing as npt
-from lucupy.minimodel import ALL_SITES, Group, NightIndex, NightIndices, Observation, Program, Site
+from lucupy.minimodel import ALL_SITES, Group, NightIndex, NightIndices, Observation, ObservationID, Program, Site
 
 # from scheduler.core.calculations import Scores, GroupDataMap
 
@@ -63,12 +63,51 @@ class Ranker(ABC):
             raise ValueError('Ranker group scoring can only score groups.')
 
     @abstractmethod
-    def score_observation(self, program: Program, obs: Observation):
+    def score_observation(self, program: Program, obs: Observation, time_accounting=None):
         """
         Calculate the scores for an observation for each night for each time slot index.
         These are returned as a list indexed by night index as per the night_indices supplied,
         and the list items are numpy arrays of float for each time slot during the specified night.
+
+        If a TimeAccounting is given, the time used by the program and observation is read through it.
+        """
+
+    def score_observations(self,
+                           program: Program,
+                           observations: Sequence[Observation],
+                           time_accounting=None) -> Dict[ObservationID, Dict[NightIndex, npt.NDArray[float]]]:
+        """
+        Calculate the scores for several observations of a program at once, indexed by observation ID.
+        Rankers that can score observations more efficiently together should override this.
+        """
+        return {obs.id: self.score_observation(program, obs, time_accounting) for obs in observations}
+
+    def metric_factor(self, program: Program, obs: Observation, time_accounting=None) -> Optional[float]:
+        """
+        Calculate the factor of the observation scores that depends on the completion of the program, i.e. the
+        only part of the scores that changes when time is charged to the program.
+
+        The scores calculated by score_observation must be proportional to this factor so that they can be rescaled
+        when it changes instead of being recalculated. Rankers whose scores cannot be decomposed this way return None,
+        in which case programs are always re-scored in full.
+
+        If a TimeAccounting is given, the time used by the program and observation is read through it.
+        """
+        return None
+
+    def cached_factors(self, obs_ids: Iterable[ObservationID]) -> Optional[Dict]:
+        """
+        Return the factors of the scores of the observations that the Ranker has cached, if any, so that the Ranker
+        of another process can add them to its cache with add_cached_factors.
+        Rankers that do not cache factors return None.
+        """
+        return None
+
+    def add_cached_factors(self, cached_factors: Optional[Dict]) -> None:
+        """
+        Add the factors of the observation scores returned by cached_factors in another process to the cache.
         """
+        pass
 
     @abstractmethod
     def _score_and_group(self, group: Group, group_data_map):
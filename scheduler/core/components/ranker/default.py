@@ -1,18 +1,19 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
-from copy import deepcopy
 from dataclasses import dataclass, field
-from typing import Callable, Dict, FrozenSet, Mapping, Tuple, final
+from typing import Callable, ClassVar, Dict, FrozenSet, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple, final
 
 import astropy.units as u
 from astropy.coordinates import Angle
 import numpy as np
 import numpy.typing as npt
-from lucupy.minimodel import ALL_SITES, Group, Band, NightIndices, Observation, Program, Site, Priority
+from lucupy.minimodel import (ALL_SITES, Group, Band, NightIndex, NightIndices, Observation, ObservationID, Program,
+                              Site, Priority)
 from lucupy.types import ListOrNDArray, MinMax
 
 # from scheduler.core.calculations import Scores, GroupDataMap
+from scheduler.core.calculations.scores import stack_scores, unstack_scores
 from .base import Ranker
 
 __all__ = [
@@ -30,6 +31,13 @@ def _default_score_combiner(x: npt.NDArray[float]) -> npt.NDArray[float]:
     return np.array([np.max(x)]) if 0 not in x else np.array([0.])
 
 
+def _combine_scores_default(stacked: npt.NDArray[float]) -> npt.NDArray[float]:
+    """
+    Apply _default_score_combiner to all the columns of an array of shape (#subgroups, #timeslots) at once.
+    """
+    return np.where(np.any(stacked == 0, axis=0), 0., np.max(stacked, axis=0))
+
+
 # Default telescope altitude limits
 # _def_alt_limits_site: Dict[Site, Dict[MinMax, Angle]] = {
 #     Site.GS: {MinMax.MIN: Angle(18.0 * u.deg), MinMax.MAX: Angle(88.0 * u.deg)},
@@ -160,8 +168,20 @@ class DefaultRanker(Ranker):
     to Groups. It calculates first all the scores for the observations for
     the given night indices and then stores this information here and uses
     it to agglomerate the scores for a specified Group.
+
+    The score of an observation is the product of its metric factor, which changes as time is charged to its
+    program, and of static factors that do not: the hour angle weighting, altitude limits, remaining visibility,
+    pre-imaging boost, user priority, and program priority. The static factors are cached per observation and night
+    across rankers until programs are reloaded into the Collector or the ranker parameters change, so that
+    rescoring an observation only costs a multiplication by its metric factor. The cache can be cleared explicitly
+    with clear_static_factors.
     """
 
+    # The static factors of the observation scores by observation ID and night index, which are read-only,
+    # and the key they were calculated for: see _static_factors_key.
+    _static_factors: ClassVar[Dict[Tuple[ObservationID, NightIndex], npt.NDArray[float]]] = {}
+    _static_factors_valid_key: ClassVar[Optional[Hashable]] = None
+
     def __init__(self,
                  collector,  # Creates a circular input if we typehint this.
                  night_indices: NightIndices,
@@ -177,6 +197,54 @@ class DefaultRanker(Ranker):
         self.params = params
         super().__init__(collector, night_indices, sites)
 
+    @classmethod
+    def clear_static_factors(cls) -> None:
+        """
+        Clear the cache of the static factors of the observation scores.
+        """
+        cls._static_factors.clear()
+        cls._static_factors_valid_key = None
+
+    def cached_factors(self,
+                       obs_ids: Iterable[ObservationID]) -> Dict[Tuple[ObservationID, NightIndex], npt.NDArray[float]]:
+        """
+        Return the cached static factors of the scores of the observations for the night indices.
+        """
+        return {(obs_id, night_idx): DefaultRanker._static_factors[(obs_id, night_idx)]
+                for obs_id in obs_ids for night_idx in self.night_indices
+                if (obs_id, night_idx) in DefaultRanker._static_factors}
+
+    def add_cached_factors(self,
+                           cached_factors: Optional[Dict[Tuple[ObservationID, NightIndex], npt.NDArray[float]]]) -> None:
+        """
+        Add static factors returned by cached_factors in another process, which are valid for the same Collector load
+        and ranker parameters, to the cache.
+        """
+        if not cached_factors:
+            return
+        key = self._static_factors_key()
+        if DefaultRanker._static_factors_valid_key != key:
+            DefaultRanker.clear_static_factors()
+            DefaultRanker._static_factors_valid_key = key
+        for factors in cached_factors.values():
+            factors.flags.writeable = False
+        DefaultRanker._static_factors.update(cached_factors)
+
+    def _static_factors_key(self) -> Hashable:
+        """
+        The Collector load and the ranker parameters that the static factors of the observation scores depend on.
+        """
+        return (self.collector.get_load_generation(),
+                self.params.vis_power,
+                self.params.wha_power,
+                self.params.program_priority,
+                self.params.priority_factor,
+                self.params.preimaging_factor,
+                tuple(self.params.dec_diff_less_40),
+                tuple(self.params.dec_diff),
+                tuple((site, tuple(limit.to_value(u.deg) for limit in limits.values()))
+                      for site, limits in self.params.altitude_limits.items()))
+
     def _metric_slope(self,
                       completion: ListOrNDArray[float],
                       band: ListOrNDArray[Band],
@@ -198,140 +266,190 @@ class DefaultRanker(Ranker):
                              f'{band} and completion {completion} arrays')
 
         eps = 1.e-7
-        completion = np.asarray(completion)
-        nn = len(completion)
-        metric = np.zeros(nn)
-        metric_slope = np.zeros(nn)
-
-        for idx, curr_band in enumerate(band):
-            # If Band 3, then the Band 3 min fraction is used for xb
-            if curr_band == Band.BAND3:
-                xb = b3min[idx]
-                # b2 = xb * (params[curr_band].m1 - params[curr_band].m2) + params[curr_band].xb0
-            else:
-                xb = self.band_params[curr_band].xb
-                # b2 = params[curr_band].b2
-
-            # Determine the intercept for the second piece (b2) so that the functions are continuous
-            b2 = 0.0
-            if self.params.power == 1:
-                b2 = (xb * (self.band_params[curr_band].m1 - self.band_params[curr_band].m2) +
-                      self.band_params[curr_band].xb0 + self.band_params[curr_band].b1)
-            elif self.params.power == 2:
-                b2 = self.band_params[curr_band].b2 + self.band_params[curr_band].xb0 + self.band_params[curr_band].b1
-
-            # Finally, calculate piecewise the metric and slope.
-            if completion[idx] <= eps:
-                metric[idx] = 0.0
-                metric_slope[idx] = 0.0
-            elif completion[idx] < xb:
-                metric[idx] = (self.band_params[curr_band].m1 * completion[idx] ** self.params.power
-                               + self.band_params[curr_band].b1)
-                metric_slope[idx] = (self.params.power * self.band_params[curr_band].m1
-                                     * completion[idx] ** (self.params.power - 1.0))
-            elif completion[idx] < 1.0:
-                metric[idx] = self.band_params[curr_band].m2 * completion[idx] + b2
-                metric_slope[idx] = self.band_params[curr_band].m2
-            else:
-                metric[idx] = self.band_params[curr_band].m2 * 1.0 + b2 + self.band_params[curr_band].xc0
-                metric_slope[idx] = self.band_params[curr_band].m2
+        completion = np.asarray(completion, dtype=float)
+        band_params = [self.band_params[Band(curr_band)] for curr_band in band]
+        m1 = np.array([bp.m1 for bp in band_params])
+        b1 = np.array([bp.b1 for bp in band_params])
+        m2 = np.array([bp.m2 for bp in band_params])
+
+        # If Band 3, then the Band 3 min fraction is used for xb.
+        xb = np.where(np.asarray(band) == Band.BAND3,
+                      np.asarray(b3min, dtype=float),
+                      np.array([bp.xb for bp in band_params]))
+
+        # Determine the intercept for the second piece (b2) so that the functions are continuous.
+        xb0 = np.array([bp.xb0 for bp in band_params])
+        if self.params.power == 1:
+            b2 = xb * (m1 - m2) + xb0 + b1
+        elif self.params.power == 2:
+            b2 = np.array([bp.b2 for bp in band_params]) + xb0 + b1
+        else:
+            b2 = np.zeros(len(completion))
+
+        # Finally, calculate piecewise the metric and slope.
+        # Errors are ignored as the power of the completion is evaluated for all pieces, including those where
+        # the completion is 0.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            conditions = [completion <= eps, completion < xb, completion < 1.0]
+            metric = np.select(conditions,
+                               [0.0,
+                                m1 * completion ** self.params.power + b1,
+                                m2 * completion + b2],
+                               m2 * 1.0 + b2 + np.array([bp.xc0 for bp in band_params]))
+            metric_slope = np.select(conditions,
+                                     [0.0,
+                                      self.params.power * m1 * completion ** (self.params.power - 1.0),
+                                      m2],
+                                     m2)
 
         if thesis:
             metric += self.params.thesis_factor
 
         return metric, metric_slope
 
-    def score_observation(self, program: Program, obs: Observation):
+    def metric_factor(self, program: Program, obs: Observation, time_accounting=None) -> float:
+        """
+        Calculate the metric of the program completion, including the remaining time of the observation,
+        raised to the metric power. This is the only factor of the observation scores that changes as time
+        is charged to the program.
+
+        If a TimeAccounting is given, the time used by the program and observation is read through it.
+        """
+        return float(self._metric_factors(program, [obs], time_accounting)[0])
+
+    def _metric_factors(self,
+                        program: Program,
+                        observations: Sequence[Observation],
+                        time_accounting=None) -> npt.NDArray[float]:
+        """
+        Calculate the metric factors of several observations of a program at once: see metric_factor.
+        """
+        if time_accounting is None:
+            program_used = program.total_used()
+            remaining = [obs.exec_time() - obs.total_used() for obs in observations]
+        else:
+            program_used = time_accounting.program_total_used(program)
+            remaining = [obs.exec_time() - time_accounting.obs_total_used(obs) for obs in observations]
+        total_awarded = program.total_awarded()
+        cplt = np.array([(program_used + obs_remaining) / total_awarded for obs_remaining in remaining])
+
+        metric, metric_s = self._metric_slope(cplt,
+                                              np.array([obs.band.value for obs in observations]),
+                                              np.full(len(observations), 0.8),
+                                              program.thesis)
+        return metric ** self.params.met_power
+
+    def score_observation(self, program: Program, obs: Observation, time_accounting=None):
         """
         Calculate the scores for an observation for each night for each time slot index.
         These are returned as a list indexed by night index as per the night_indices supplied,
         and the list items are numpy arrays of float for each time slot during the specified night.
         """
-        # Scores are indexed by night_idx and contain scores for each time slot.
-        # We initialize to all zeros.
-        scores = deepcopy(self._empty_obs_scores[obs.site])
+        return self.score_observations(program, [obs], time_accounting)[obs.id]
 
-        # target_info is a map from night index to TargetInfo.
-        # We require it to proceed for hour angle / elevation information and coordinates.
-        # If it is missing, just return scores of 0.
-        target_info = self.collector.get_target_info(obs.id)
-        if target_info is None:
+    def score_observations(self,
+                           program: Program,
+                           observations: Sequence[Observation],
+                           time_accounting=None) -> Dict[ObservationID, Dict[NightIndex, npt.NDArray[float]]]:
+        """
+        Calculate the scores for several observations of a program at once, as score_observation does for each.
+        The scores are the static factors of the observations, which are calculated together for those that are not
+        cached (see _calculate_static_factors), multiplied by their metric factors.
+        """
+        scores: Dict[ObservationID, Dict[NightIndex, npt.NDArray[float]]] = {}
+        if not observations:
             return scores
 
-        remaining = obs.exec_time() - obs.total_used()
-        cplt = (program.total_used() + remaining) / program.total_awarded()
-
-        metric, metric_s = self._metric_slope(np.array([cplt]),
-                                              np.array([obs.band.value]),
-                                              np.array([0.8]),
-                                              program.thesis)
+        key = self._static_factors_key()
+        if DefaultRanker._static_factors_valid_key != key:
+            DefaultRanker.clear_static_factors()
+            DefaultRanker._static_factors_valid_key = key
 
-        # Declination for the base target per night.
-        dec = {night_idx: target_info[night_idx].coord.dec for night_idx in self.night_indices}
+        uncached = [obs for obs in observations
+                    if any((obs.id, night_idx) not in DefaultRanker._static_factors for night_idx in self.night_indices)]
+        if uncached:
+            self._calculate_static_factors(program, uncached)
 
-        # Hour angle / airmass
-        ha = {night_idx: target_info[night_idx].hourangle for night_idx in self.night_indices}
+        metric_factors = self._metric_factors(program, observations, time_accounting)
+        for obs, metric_factor in zip(observations, metric_factors):
+            scores[obs.id] = {night_idx: DefaultRanker._static_factors[(obs.id, night_idx)] * metric_factor
+                              for night_idx in self.night_indices}
+        return scores
 
-        # Get the latitude associated with the site.
-        site_latitude = obs.site.location.lat
-        if site_latitude < 0. * u.deg:
-            dec_diff = {night_idx: np.abs(site_latitude - np.max(dec[night_idx])) for night_idx in self.night_indices}
-        else:
-            dec_diff = {night_idx: np.abs(np.min(dec[night_idx]) - site_latitude) for night_idx in self.night_indices}
-
-        c = {night_idx: self.params.dec_diff_less_40 if angle < 40. * u.deg else self.params.dec_diff
-             for night_idx, angle in dec_diff.items()}
-        # c = np.array([self.params.dec_diff_less_40 if angle < 40. * u.deg
-        #               else self.params.dec_diff for angle in dec_diff])
-
-        wha = {night_idx: c[night_idx][0] + c[night_idx][1] * ha[night_idx] / u.hourangle
-               + (c[night_idx][2] / u.hourangle ** 2) * ha[night_idx] ** 2
-               for night_idx in self.night_indices}
-        kk = {night_idx: np.where(wha[night_idx] <= 0.)[0] for night_idx in self.night_indices}
-        for night_idx in self.night_indices:
-            wha[night_idx][kk[night_idx]] = 0.
-        # print(f'   max wha: {np.max(wha[0]):.2f}  visfrac: {target_info[0].rem_visibility_frac:.5f}')
-
-        # Telescope altitude restrictions - set score to 0 if the altitude is outside the limits
-        targ_alt = {night_idx: target_info[night_idx].alt for night_idx in self.night_indices}
-        alt_include = {night_idx: np.ones(len(targ_alt[night_idx])) for night_idx in self.night_indices}
-        jj = {night_idx: np.where(np.logical_or(targ_alt[night_idx] < self.params.altitude_limits[obs.site][MinMax.MIN],
-                                                 targ_alt[night_idx] > self.params.altitude_limits[obs.site][MinMax.MAX]))[0]
-              for night_idx in self.night_indices}
-        for night_idx in self.night_indices:
-            alt_include[night_idx][jj[night_idx]] = 0.0
-
-        # MOS pre-imaging boost?
-        if obs.preimaging:
-            preimaging = self.params.preimaging_factor
-        else:
-            preimaging = 1.0
+    def _calculate_static_factors(self, program: Program, observations: Sequence[Observation]) -> None:
+        """
+        Calculate and cache the static factors of the scores of several observations of a program.
 
+        The observations are processed site by site and night by night: the hour angles, altitudes, and visibilities
+        of the observations are stacked into arrays of shape (#observations, #timeslots in night), and the
+        hour angle weighting, altitude limits, and the factors for each observation are applied to them with
+        numpy broadcasting.
+        """
         # Effective user priority
         # Normalized to 1, use priority_factor to scale
-        user_priority = 1. + (obs.priority.value - program.mean_priority())/self.params.priority_factor
-
-        # Program priority (from calendar)
-        nc = self.collector.night_configurations(obs.site, np.arange(self.collector.num_nights_calculated))
-        program = self.collector.get_program(obs.id.program_id())
-        prog_priority = {night_idx: self.params.program_priority if nc[night_idx].filter.program_priority_filter_any(program)
-                         else 1.0 for night_idx in self.night_indices}
-        # print(obs.unique_id, night_idx, prog_priority)
-
-        # p = {night_idx: (metric[0] ** self.params.met_power) *
-        p = {night_idx: (preimaging * user_priority * prog_priority[night_idx]) * (metric[0] ** self.params.met_power) *
-                        (target_info[night_idx].rem_visibility_frac ** self.params.vis_power) *
-                        (wha[night_idx] ** self.params.wha_power) * alt_include[night_idx]
-             for night_idx in self.night_indices}
-
-        # Assign scores in p to all indices where visibility constraints are met.
-        # They will otherwise be 0 as originally defined.
-        for night_idx in self.night_indices:
-            slot_indices = target_info[night_idx].visibility_slot_idx
-            scores[night_idx].put(slot_indices, p[night_idx][slot_indices])
-            # print(f'   max score on night {night_idx}: {np.max(scores[night_idx])}')
+        mean_priority = program.mean_priority()
 
-        return scores
+        # Observations without target info keep scores of 0.
+        # We require it to proceed for hour angle / elevation information and coordinates.
+        observations_by_site: Dict[Site, List[Tuple[Observation, Dict]]] = {}
+        for obs in observations:
+            target_info = self.collector.get_target_info(obs.id)
+            if target_info is None:
+                for night_idx in self.night_indices:
+                    zeros = np.zeros(len(self._empty_obs_scores[obs.site][night_idx]))
+                    zeros.flags.writeable = False
+                    DefaultRanker._static_factors[(obs.id, night_idx)] = zeros
+            else:
+                observations_by_site.setdefault(obs.site, []).append((obs, target_info))
+
+        for site, site_observations in observations_by_site.items():
+            # Program priority (from calendar)
+            _, program_priority_nights = self.collector.program_night_filters(site, program.id)
+            site_latitude = site.location.lat.to_value(u.deg)
+            alt_min = self.params.altitude_limits[site][MinMax.MIN].to_value(u.deg)
+            alt_max = self.params.altitude_limits[site][MinMax.MAX].to_value(u.deg)
+
+            # The factors of each observation that do not depend on the night.
+            # MOS pre-imaging boost and effective user priority.
+            factors = np.array([
+                (self.params.preimaging_factor if obs.preimaging else 1.0) *
+                (1. + (obs.priority.value - mean_priority) / self.params.priority_factor)
+                for obs, _ in site_observations
+            ])
+
+            for night_idx in self.night_indices:
+                target_infos = [target_info[night_idx] for _, target_info in site_observations]
+
+                # Hour angle weighting, with the coefficients determined by the declination of the base target.
+                if site_latitude < 0.:
+                    dec_diff = np.array([np.abs(site_latitude - np.max(ti.dec_deg))
+                                         for ti in target_infos])
+                else:
+                    dec_diff = np.array([np.abs(np.min(ti.dec_deg) - site_latitude)
+                                         for ti in target_infos])
+                c = np.where((dec_diff < 40.)[:, np.newaxis], self.params.dec_diff_less_40, self.params.dec_diff)
+                ha = np.stack([ti.hourangle_hours for ti in target_infos])
+                wha = c[:, 0:1] + c[:, 1:2] * ha + c[:, 2:3] * ha ** 2
+                wha[wha <= 0.] = 0.
+
+                # Telescope altitude restrictions - set score to 0 if the altitude is outside the limits
+                alt = np.stack([ti.alt_deg for ti in target_infos])
+                alt_include = ~np.logical_or(alt < alt_min, alt > alt_max)
+
+                prog_priority = self.params.program_priority if program_priority_nights[night_idx] else 1.0
+                rem_visibility_frac = np.array([ti.rem_visibility_frac for ti in target_infos])
+                night_factors = prog_priority * factors * rem_visibility_frac ** self.params.vis_power
+
+                p = night_factors[:, np.newaxis] * wha ** self.params.wha_power * alt_include
+
+                # Assign scores in p to all indices where visibility constraints are met.
+                # They will otherwise be 0.
+                visible = np.stack([ti.visibility_slots.to_bool(p.shape[1]) for ti in target_infos])
+                p[~visible] = 0.
+                p.flags.writeable = False
+
+                for row, (obs, _) in enumerate(site_observations):
+                    DefaultRanker._static_factors[(obs.id, night_idx)] = p[row]
 
     # TODO: Should we be considering the scores of the subgroups or the scores of the
     # TODO: observations when calculating the score of this group?
@@ -344,26 +462,21 @@ class DefaultRanker(Ranker):
         if len(group.sites()) != 1:
             raise ValueError(f'AND group {group.group_name} has too many sites: {len(group.sites())}')
 
-        # Determine the length of the nights and create an empty score array for each night.
-        site = list(group.sites())[0]
-        scores = deepcopy(self._empty_group_scores[site])
-
-        # For each night, calculate the score for the group over its subgroups.
+        # Calculate the score for the group over its subgroups for all the nights at once.
         # This may not be the same as using the observation scoring, since for groups, the score has been adjusted in
         # the Selector for things like wind, conditions matching, etc.
-        for night_idx in self.night_indices:
-            # What we want for the night is a numpy array of size (#obs, #timeslots in night)
-            # where the rows are the observation scores. Then we will combine them.
-            for unique_group_id in (g.unique_id for g in group.children):
-                # To get this, we turn the scores of the children into a (1, #timeslots in night) array to append
-                # to the numpy array for the night.
-                subgroup_scores = np.array([group_data_map[unique_group_id].group_info.scores[night_idx]])
-                scores[night_idx] = np.append(scores[night_idx], subgroup_scores, axis=0)
+        # What we want is a numpy array of size (#subgroups, #timeslots across the nights)
+        # where the rows are the subgroup scores. Then we will combine them.
+        stacked, offsets = stack_scores([group_data_map[g.unique_id].group_info.scores for g in group.children],
+                                        self.night_indices)
 
         # Combine the scores as per the score_combiner and return.
-        # apply_along_axis results in a (1, #timeslots in night) array, so we have to take index 0.
-        return {night_idx: np.apply_along_axis(self.params.score_combiner, 0, scores[night_idx])[0]
-                for night_idx in self.night_indices}
+        if self.params.score_combiner is _default_score_combiner:
+            combined = _combine_scores_default(stacked)
+        else:
+            # apply_along_axis results in a (1, #timeslots) array, so we have to take index 0.
+            combined = np.apply_along_axis(self.params.score_combiner, 0, stacked)[0]
+        return unstack_scores(combined, self.night_indices, offsets)
 
     def _score_or_group(self, group: Group, group_data_map):
         raise NotImplementedError
@@ -1,9 +1,12 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
-from copy import deepcopy
-from dataclasses import dataclass, field
-from typing import final, ClassVar, Dict, FrozenSet, Optional, TypeAlias
+import multiprocessing
+import operator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import reduce
+from typing import final, ClassVar, Dict, FrozenSet, List, Optional, Tuple, TypeAlias
 
 import astropy.units as u
 import numpy as np
@@ -11,13 +14,15 @@ import numpy.typing as npt
 from astropy.coordinates import Angle
 from astropy.units import Quantity
 from lucupy.helpers import is_contiguous
-from lucupy.minimodel import (Group, Conditions, Group, Observation, ObservationClass, ObservationStatus, Program,
-                              ProgramID, ROOT_GROUP_ID, Site, TooType, NightIndex, NightIndices, TimeslotIndex,
+from lucupy.minimodel import (Group, Conditions, Group, Observation, ObservationClass, ObservationID, ObservationStatus,
+                              Program, ProgramID, ROOT_GROUP_ID, Site, TooType, NightIndex, NightIndices,
                               UniqueGroupID, Variant, VariantSnapshot)
 from lucupy.minimodel import CloudCover, ImageQuality
 from lucupy.timeutils import time2slots
 
-from scheduler.core.calculations import GroupData, GroupDataMap, GroupInfo, ProgramCalculations, ProgramInfo, Selection
+from scheduler.core.calculations import (GroupData, GroupDataMap, GroupInfo, ProgramCalculations, ProgramInfo, Scores,
+                                         Selection, SlotMask, SparseNightScores, TimeAccounting, stack_scores,
+                                         unstack_scores)
 from scheduler.core.components.base import SchedulerComponent
 from scheduler.core.components.collector import Collector
 from scheduler.core.components.ranker import DefaultRanker, Ranker
@@ -41,6 +46,50 @@ NightConfigurationData: TypeAlias = Dict[Site, NightConfigurations]
 logger = logger_factory.create_logger(__name__)
 
 
+# The arguments of score_program for the programs of a selection scored in worker processes, which inherit them when
+# they are forked instead of having them pickled, along with the read-only state of the Collector.
+_fork_scoring_args: Optional[Tuple['Selector', FrozenSet[Site], NightIndices, StartingTimeslots, Ranker]] = None
+
+
+def _score_program_in_process(program_id: ProgramID) -> Tuple[Optional[Dict[UniqueGroupID, GroupInfo]], Optional[Dict]]:
+    """
+    Score a program in a forked worker process. Only the GroupInfo of the unfiltered group data map is sent back:
+    the parent process has the program, and rebuilds the ProgramCalculations from its own groups.
+    The factors of the observation scores cached by the ranker for the program are sent back too, so that the parent
+    process does not have to calculate them again (see Ranker.cached_factors).
+    """
+    selector, sites, night_indices, starting_time_slots, ranker = _fork_scoring_args
+    program = Collector.get_program(program_id)
+    if program is None:
+        return None, None
+    program_calculations = selector.score_program(program, sites, night_indices, starting_time_slots, ranker)
+    cached_factors = ranker.cached_factors(obs.id for obs in program.observations())
+    if program_calculations is None:
+        return None, cached_factors
+    return ({unique_group_id: group_data.group_info
+             for unique_group_id, group_data in program_calculations.unfiltered_group_data_map.items()},
+            cached_factors)
+
+
+# TODO: This is just used internally to the Selector and thus we do not export it outside of this module.
+@final
+@dataclass(frozen=True)
+class SelectionState:
+    """
+    What the Selector needs to derive a selection from the last one: the parameters it was made with, the load and
+    accounting generations of the Collector when it was made, and the calculations for the programs, which are not
+    handed to the Optimizer and thus not changed by it. The calculations are None for programs that were skipped.
+    """
+    sites: FrozenSet[Site]
+    night_indices: NightIndices
+    starting_time_slots: StartingTimeslots
+    ranker: Ranker
+    default_ranker: bool
+    load_generation: int
+    accounting_generation: int
+    program_calculations: Dict[ProgramID, Optional[ProgramCalculations]]
+
+
 @final
 @dataclass
 class Selector(SchedulerComponent):
@@ -51,16 +100,53 @@ class Selector(SchedulerComponent):
 
     The collector is the data repository that contains all the data and calculations necessary for scheduling.
     The num_nights indicates the number of nights for which we wish to schedule.
+
+    If num_processes is greater than 1, the programs are scored in parallel by a pool of that many processes.
+    The workers are forked so that they inherit the Collector instead of having it pickled, so this is only done on
+    platforms that support forking: otherwise, the programs are scored sequentially, which is the default.
+    A forked process only has a copy of the thread that forked it, so any lock held by another thread at the time,
+    e.g. by a running asyncio event loop or a logging handler, stays locked in the workers. Only use more than one
+    process when the Selector runs in a process with no other threads, such as a batch script, and not in the service.
+    Before forking, the data that the Collector calculates on demand is calculated for the selection (see
+    Collector.precalculate) so that the workers share it, and the factors cached by the ranker in the workers are sent
+    back with the scores.
+
+    If incremental is True, a selection that only differs from the last one by later starting time slots, as when
+    replanning later in the same night, is derived from the last one: see _select_incrementally. This is off by
+    default: only changes to the variants, the programs loaded into the Collector, and the time charged to them are
+    detected, so any other change to the inputs of the scores, e.g. to the night configurations, resources, faults,
+    or engineering tasks, is not reflected in a derived selection.
+
+    If sparse_scores is True, the scores of the groups are stored as SparseNightScores, which only keep the spans of
+    time slots with a non-zero score. This greatly reduces the memory held by selections over many nights.
     """
     collector: Collector
     num_nights_to_schedule: int
     time_buffer: TimeBuffer
+    num_processes: int = 1
+    incremental: bool = False
+    sparse_scores: bool = False
 
     # Store the current VariantSnapshot at each site.
     # TODO: We will use wind dir and speed later, and perhaps also WV.
     # These start off empty, but will reset at the beginning of each night by the event loop.
     _variant_snapshot_per_site: Dict[Site, VariantSnapshot] = field(init=False, default_factory=dict)
 
+    # Memos of the conditions and wind scores for the current selection, which only take a handful of distinct values
+    # across all the observations. The conditions scores are indexed by the variant snapshot IQ and CC, the required
+    # IQ and CC, the rising flag, the ToO type, and the length and starting time slot of the night. The wind scores are
+    # indexed by the variant snapshot wind direction and speed and the azimuth track in degrees, which is kept with its score so
+    # that its id stays valid. The arrays are shared and read-only.
+    _conditions_scores: Dict[Tuple, npt.NDArray[float]] = field(init=False, default_factory=dict)
+    _wind_scores: Dict[Tuple, Tuple[npt.NDArray[float], npt.NDArray[float]]] = field(init=False, default_factory=dict)
+
+    # The scores of the active observations of the program being scored, calculated together by the Ranker.
+    _obs_scores: Dict[ObservationID, Scores] = field(init=False, default_factory=dict)
+
+    # The last selection for each set of sites, if incremental, for the next one to be derived from.
+    # These are reset when the variants of their sites change.
+    _last_selections: Dict[FrozenSet[Site], SelectionState] = field(init=False, default_factory=dict)
+
     _wind_sep: ClassVar[Angle] = 20. * u.deg
     _wind_spd_bound: ClassVar[Quantity] = 10. * u.m / u.s
 
@@ -110,7 +196,7 @@ class Selector(SchedulerComponent):
 
         return starting_time_slots
 
-    def _calculate_blocked_timeslots(self) -> Dict[Site, Dict[NightIndex, npt.NDArray[TimeslotIndex]]]:
+    def _calculate_blocked_timeslots(self) -> Dict[Site, Dict[NightIndex, SlotMask]]:
         """
         For each site, calculate the blocked timeslots for each night.
         This information comes from the Engineering Tasks, but it may be expanded in the future to contain more
@@ -138,8 +224,7 @@ class Selector(SchedulerComponent):
                 earliest_time = night_events.local_times[night_idx][0]
                 latest_time = night_events.local_times[night_idx][-1]
 
-                # Ideally, dtype would be TimeslotIndex, but numpy borks on this.
-                blocked_timeslot_indices = np.array([], dtype=int)
+                blocked_timeslots = SlotMask.empty(len(night_events.times[night_idx]))
 
                 eng_tasks = night_configurations[night_idx].eng_tasks
                 for eng_task in eng_tasks:
@@ -171,13 +256,13 @@ class Selector(SchedulerComponent):
                     # if start_night_idx != night_idx or end_night_idx != night_idx:
                     #     raise ValueError(f'Calculating blocked slots for {eng_task} spans multiple nights: '
                     #                      f'{start_night_idx} to {end_night_idx}, should be {night_idx}.')
-                    # blocked_timeslot_indices = np.union1d(blocked_timeslot_indices,
-                    #                                       np.arange(start_timeslot_idx, end_timeslot_idx))
+                    # blocked_timeslots |= SlotMask.from_runs([start_timeslot_idx, end_timeslot_idx],
+                    #                                       len(night_events.times[night_idx]))
 
                     # Continue to take the union of the time slots that are blocked off for the site for the night_idx.
-                    blocked_timeslot_indices = np.union1d(blocked_timeslot_indices,
-                                                          np.arange(start_timeslot_idx, end_timeslot_idx))
-                blocked_indices_by_night[night_idx] = blocked_timeslot_indices
+                    blocked_timeslots |= SlotMask.from_runs([start_timeslot_idx, end_timeslot_idx],
+                                                            len(night_events.times[night_idx]))
+                blocked_indices_by_night[night_idx] = blocked_timeslots
             blocked_indices_by_site[site] = blocked_indices_by_night
         return blocked_indices_by_site
 
@@ -192,6 +277,10 @@ class Selector(SchedulerComponent):
         if variant_snapshot is None:
             variant_snapshot = Selector._default_variant_snapshot
         self._variant_snapshot_per_site[site] = variant_snapshot
+        self._conditions_scores.clear()
+        self._wind_scores.clear()
+        self._last_selections = {sites: last_selection for sites, last_selection in self._last_selections.items()
+                                 if site not in sites}
 
     def select(self,
                sites: Optional[FrozenSet[Site]] = None,
@@ -216,6 +305,9 @@ class Selector(SchedulerComponent):
         Bubble this information back up to conglomerate it for the parent groups.
 
         An AND group must be able to perform all of its children.
+
+        If the Selector is incremental and the selection only differs from the last one by later starting time slots
+        and the time charged to programs since, it is derived from the last one instead.
         """
         if sites is None:
             sites = self.collector.sites
@@ -232,9 +324,33 @@ class Selector(SchedulerComponent):
         # Set the starting time slots dictionary as necessary.
         starting_time_slots = Selector._process_starting_time_slots(sites, night_indices, starting_time_slots)
 
-        # If no manual ranker was specified, create the default.
-        if ranker is None:
-            ranker = DefaultRanker(self.collector, night_indices, sites)
+        # Start the memos of the conditions and wind scores afresh for this selection.
+        self._conditions_scores.clear()
+        self._wind_scores.clear()
+
+        accounting_generation = Collector.get_accounting_generation()
+        if self._can_select_incrementally(sites, night_indices, starting_time_slots, ranker):
+            ranker = self._last_selections[sites].ranker
+            default_ranker = self._last_selections[sites].default_ranker
+            program_calculations_map = self._select_incrementally(sites, night_indices, starting_time_slots, ranker)
+        else:
+            # If no manual ranker was specified, create the default.
+            default_ranker = ranker is None
+            if ranker is None:
+                ranker = DefaultRanker(self.collector, night_indices, sites)
+            program_calculations_map = self._score_programs(sites, night_indices, starting_time_slots, ranker)
+
+        if self.incremental:
+            self._last_selections[sites] = SelectionState(
+                sites=sites,
+                night_indices=night_indices,
+                starting_time_slots={site: dict(night_slots) for site, night_slots in starting_time_slots.items()},
+                ranker=ranker,
+                default_ranker=default_ranker,
+                load_generation=Collector.get_load_generation(),
+                accounting_generation=accounting_generation,
+                program_calculations=program_calculations_map
+            )
 
         # Create the structure to hold the mapping fom program ID to its group info.
         program_info_map: Dict[ProgramID, ProgramInfo] = {}
@@ -242,27 +358,21 @@ class Selector(SchedulerComponent):
         # A flat top-level list of GroupData indexed by UniqueGroupID.
         schedulable_groups_map: Dict[UniqueGroupID, GroupData] = {}
 
-        for program_id in Collector.get_program_ids():
-            original_program = Collector.get_program(program_id)
-            if original_program is None:
-                logger.error(f'Program {program_id} was not found in the Collector.')
-                continue
-
-            # We make a deep copy of the Program to work with to not change the Program in the Collector.
-            # This will allow us to use the members of this deep copy for things like internal time accounting
-            # while leaving the information in the Collector intact.
-            program = deepcopy(original_program)
-            program_calculations = self.score_program(program, sites, night_indices, starting_time_slots, ranker)
+        for program_id, program_calculations in program_calculations_map.items():
             if program_calculations is None:
                 # Warning is already issued in scorer.
                 continue
 
+            # The Optimizer changes the GroupInfo of the selection, so it gets copies of the calculations, which
+            # are kept for the next selection.
+            program_info = Selector._copy_program_info(program_calculations.program_info)
+
             # Get the top-level groups (excluding root) in group_data_map and add to the schedulable_groups_map map.
             for unique_group_id in program_calculations.top_level_groups:
-                group_data = program_calculations.group_data_map[unique_group_id]
+                group_data = program_info.group_data_map[unique_group_id]
                 schedulable_groups_map[group_data.group.unique_id] = group_data
 
-            program_info_map[program.id] = program_calculations.program_info
+            program_info_map[program_id] = program_info
 
         # The end product is a map of ProgramID to a map of GroupID to GroupInfo, where
         return Selection(
@@ -274,15 +384,208 @@ class Selector(SchedulerComponent):
             starting_time_slots=starting_time_slots,
             time_slot_length=self.collector.time_slot_length.to_datetime(),
             ranker=ranker,
-            _program_scorer=self.score_program
+            _program_scorer=self.score_program,
+            _program_rescorer=self.rescore_program
         )
 
+    def _score_programs(self,
+                        sites: FrozenSet[Site],
+                        night_indices: NightIndices,
+                        starting_time_slots: StartingTimeslots,
+                        ranker: Ranker) -> Dict[ProgramID, Optional[ProgramCalculations]]:
+        """
+        Score all the programs in the Collector, in parallel if num_processes is greater than 1.
+        """
+        programs = []
+        for program_id in Collector.get_program_ids():
+            program = Collector.get_program(program_id)
+            if program is None:
+                logger.error(f'Program {program_id} was not found in the Collector.')
+                continue
+            programs.append(program)
+
+        # The Programs are shared with the Collector and must not be changed: the internal time accounting of the
+        # Optimizer is recorded in the TimeAccounting of the Selection instead.
+        if self.num_processes <= 1 or len(programs) <= 1:
+            return {program.id: self.score_program(program, sites, night_indices, starting_time_slots, ranker)
+                    for program in programs}
+
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            logger.warning('Selector cannot fork worker processes on this platform: scoring programs sequentially.')
+            return {program.id: self.score_program(program, sites, night_indices, starting_time_slots, ranker)
+                    for program in programs}
+
+        self.collector.precalculate(sites, night_indices)
+
+        global _fork_scoring_args
+        _fork_scoring_args = (self, sites, night_indices, starting_time_slots, ranker)
+        try:
+            # Send the programs to the workers in chunks to reduce the communication, but with enough chunks per
+            # worker to balance the load as programs differ widely in size.
+            chunksize = max(1, len(programs) // (4 * self.num_processes))
+            with ProcessPoolExecutor(max_workers=self.num_processes,
+                                     mp_context=multiprocessing.get_context('fork')) as executor:
+                results = list(executor.map(_score_program_in_process,
+                                            [program.id for program in programs],
+                                            chunksize=chunksize))
+        finally:
+            _fork_scoring_args = None
+
+        program_calculations_map = {}
+        for program, (group_info_map, cached_factors) in zip(programs, results):
+            ranker.add_cached_factors(cached_factors)
+            if group_info_map is None:
+                program_calculations_map[program.id] = None
+                continue
+            groups = Selector._groups_by_unique_id(program)
+            unfiltered_group_data_map = {unique_group_id: GroupData(groups[unique_group_id], group_info)
+                                         for unique_group_id, group_info in group_info_map.items()}
+            program_calculations_map[program.id] = self._program_calculations(program,
+                                                                              night_indices,
+                                                                              unfiltered_group_data_map)
+        return program_calculations_map
+
+    def _can_select_incrementally(self,
+                                  sites: FrozenSet[Site],
+                                  night_indices: NightIndices,
+                                  starting_time_slots: StartingTimeslots,
+                                  ranker: Optional[Ranker]) -> bool:
+        """
+        Determine if a selection can be derived from the last selection, i.e. the last selection was made for the
+        same sites, night indices, and ranker (or both use the default ranker) and programs, and the starting time
+        slots are no earlier than those of the last selection. The variants are the same since the last selection
+        is reset when they change.
+        """
+        last_selection = self._last_selections.get(sites)
+        if not self.incremental or last_selection is None:
+            return False
+        if not np.array_equal(last_selection.night_indices, night_indices):
+            return False
+        if not (ranker is last_selection.ranker or (ranker is None and last_selection.default_ranker)):
+            return False
+        if last_selection.load_generation != Collector.get_load_generation():
+            return False
+        return all(starting_time_slots[site][night_idx] >= last_selection.starting_time_slots[site][night_idx]
+                   for site in sites for night_idx in night_indices)
+
+    def _select_incrementally(self,
+                              sites: FrozenSet[Site],
+                              night_indices: NightIndices,
+                              starting_time_slots: StartingTimeslots,
+                              ranker: Ranker) -> Dict[ProgramID, Optional[ProgramCalculations]]:
+        """
+        Derive the calculations for the programs from those of the last selection (see _can_select_incrementally).
+
+        The programs charged by Collector.time_accounting since the last selection are scored again, which drops
+        the programs that are now out of time. For the other programs, nothing has changed except the starting time
+        slots: the scores, conditions scores, and schedulable slots of their groups before the new starting time
+        slots are zeroed, and the groups left with no schedulable slots are dropped, as in score_program.
+        This relies on the scores of an AND group being zero wherever the scores of all its subgroups are zero,
+        as they are with the default score combiner.
+        """
+        last_selection = self._last_selections[sites]
+        charged_program_ids = Collector.get_programs_charged_since(last_selection.accounting_generation)
+
+        program_calculations_map = {}
+        for program_id, program_calculations in last_selection.program_calculations.items():
+            if program_id in charged_program_ids:
+                program = Collector.get_program(program_id)
+                program_calculations_map[program_id] = self.score_program(program,
+                                                                          sites,
+                                                                          night_indices,
+                                                                          starting_time_slots,
+                                                                          ranker)
+            elif program_calculations is not None:
+                program_calculations_map[program_id] = self._advance_starting_time_slots(
+                    program_calculations,
+                    night_indices,
+                    last_selection.starting_time_slots,
+                    starting_time_slots
+                )
+            else:
+                program_calculations_map[program_id] = None
+        return program_calculations_map
+
+    def _advance_starting_time_slots(self,
+                                     program_calculations: ProgramCalculations,
+                                     night_indices: NightIndices,
+                                     old_starting_time_slots: StartingTimeslots,
+                                     new_starting_time_slots: StartingTimeslots) -> ProgramCalculations:
+        """
+        Zero out the time slots of the groups of a program before the new starting time slots, which are no earlier
+        than the old ones that the program was scored with.
+        """
+        group_data_map: GroupDataMap = {}
+        for unique_group_id, group_data in program_calculations.group_data_map.items():
+            group_info = group_data.group_info
+            site = next(iter(group_data.group.sites()))
+            conditions_score = dict(group_info.conditions_score)
+            scores = dict(group_info.scores)
+            schedulable_slots = dict(group_info.schedulable_slots)
+
+            for night_idx in night_indices:
+                starting_time_slot = new_starting_time_slots[site][night_idx]
+                if starting_time_slot <= old_starting_time_slots[site][night_idx]:
+                    continue
+                conditions_score[night_idx] = conditions_score[night_idx].copy()
+                conditions_score[night_idx][:starting_time_slot] = 0.0
+                scores[night_idx] = np.array(scores[night_idx], dtype=float)
+                scores[night_idx][:starting_time_slot] = 0.0
+                schedulable_slots[night_idx] = (schedulable_slots[night_idx] -
+                                                SlotMask.from_runs(np.array([0, starting_time_slot])))
+
+            group_info = replace(group_info,
+                                 conditions_score=conditions_score,
+                                 scores=self._store_scores(scores),
+                                 schedulable_slots=schedulable_slots)
+            group_data_map[unique_group_id] = GroupData(group_data.group, group_info)
+
+        return self._program_calculations(program_calculations.program_info.program, night_indices, group_data_map)
+
+    def _store_scores(self, scores: Scores) -> Scores:
+        """
+        Convert the scores of a group to the representation in which they are kept, as per sparse_scores.
+        """
+        if not self.sparse_scores:
+            return scores
+        return {night_idx: (night_scores if isinstance(night_scores, SparseNightScores)
+                            else SparseNightScores.from_dense(night_scores))
+                for night_idx, night_scores in scores.items()}
+
+    @staticmethod
+    def _copy_program_info(program_info: ProgramInfo) -> ProgramInfo:
+        """
+        Copy the GroupInfo of the groups of a program so that they can be changed, e.g. by the Optimizer when it
+        rescores a program, without changing the original. The score arrays are shared and must not be changed
+        in place.
+        """
+        group_data_map = {unique_group_id: GroupData(group_data.group,
+                                                     replace(group_data.group_info,
+                                                             scores=dict(group_data.group_info.scores)))
+                          for unique_group_id, group_data in program_info.group_data_map.items()}
+        return replace(program_info, group_data_map=group_data_map)
+
+    @staticmethod
+    def _groups_by_unique_id(program: Program) -> Dict[UniqueGroupID, Group]:
+        """
+        Map the unique IDs of the groups of a program to the groups.
+        """
+        groups = {}
+        stack = [program.root_group]
+        while stack:
+            group = stack.pop()
+            groups[group.unique_id] = group
+            if not group.is_observation_group():
+                stack.extend(group.children)
+        return groups
+
     def score_program(self,
                       program: Program,
                       sites: FrozenSet[Site],
                       night_indices: NightIndices,
                       starting_time_slots: StartingTimeslots,
-                      ranker: Ranker) -> Optional[ProgramCalculations]:
+                      ranker: Ranker,
+                      time_accounting: Optional[TimeAccounting] = None) -> Optional[ProgramCalculations]:
         """
         Given a program and an array of night indices, score the program for the specified night indices
         starting at the specified time slot.
@@ -292,11 +595,17 @@ class Selector(SchedulerComponent):
 
         The Ranker can be specified. In the case that it is not, the DefaultRanker is used.
 
+        The time used by the program and the status of its observations are read through time_accounting if given,
+        i.e. with the time charged by the Optimizer.
+
         If the sites used by the Program do not intersect the sites parameter, then None is returned.
         Otherwise, the data is bundled in a ProgramCalculations object.
         """
+        if time_accounting is None:
+            time_accounting = TimeAccounting()
+
         # Check if there is any time left for the program, allowing for the time buffer. If not, skip it.
-        if program.program_awarded() + self.time_buffer(program) <= program.program_used():
+        if program.program_awarded() + self.time_buffer(program) <= time_accounting.program_used(program):
             logger.debug(f'Program {program.id.id} out of time: skipping.')
             return None
 
@@ -313,6 +622,12 @@ class Selector(SchedulerComponent):
         # Get the night configuration for all nights.
         night_configurations = {site: self.collector.night_configurations(site, night_indices) for site in sites}
 
+        # Score the active observations of the program at the sites together.
+        observations = [obs for obs in program.observations()
+                        if obs.site in sites and
+                        time_accounting.status(obs) in {ObservationStatus.READY, ObservationStatus.ONGOING}]
+        self._obs_scores = ranker.score_observations(program, observations, time_accounting)
+
         # TODO: We have to check across nights.
         # Calculate the group info and put it in the structure if there is actually group
         # info data inside it, i.e. feasible time slots for it in the plan.
@@ -323,11 +638,21 @@ class Selector(SchedulerComponent):
                                                           night_indices,
                                                           starting_time_slots,
                                                           night_configurations,
-                                                          ranker)
-
+                                                          ranker,
+                                                          time_accounting)
+        self._obs_scores = {}
+        return self._program_calculations(program, night_indices, unfiltered_group_data_map)
+
+    def _program_calculations(self,
+                              program: Program,
+                              night_indices: NightIndices,
+                              unfiltered_group_data_map: GroupDataMap) -> ProgramCalculations:
+        """
+        Bundle the group data calculated for a program into a ProgramCalculations object.
+        """
         # We want to check if there are any time slots where a group can be scheduled: otherwise, we omit it.
         group_data_map = {gp_id: gp_data for gp_id, gp_data in unfiltered_group_data_map.items()
-                          if any(indices.size > 0 for indices in gp_data.group_info.schedulable_slot_indices.values())
+                          if any(gp_data.group_info.schedulable_slots.values())
                           and gp_data.group.id != ROOT_GROUP_ID}
 
         # In an observation group, the only child is an Observation:
@@ -351,6 +676,96 @@ class Selector(SchedulerComponent):
             unfiltered_group_data_map=unfiltered_group_data_map
         )
 
+    def rescore_program(self,
+                        program: Program,
+                        program_info: Optional[ProgramInfo],
+                        sites: FrozenSet[Site],
+                        night_indices: NightIndices,
+                        starting_time_slots: StartingTimeslots,
+                        ranker: Ranker,
+                        time_accounting: Optional[TimeAccounting] = None) -> Optional[ProgramCalculations]:
+        """
+        Re-score a program that has already been scored into program_info after time has been charged to it.
+
+        Charging time only changes the completion-dependent metric factor of the observation scores, so instead of
+        recalculating the conditions, wind, and visibility components, the scores of the observation groups are
+        rescaled by the ratio of the new metric factor to the one they were calculated with, and the AND groups are
+        recombined from them. Observations that are no longer active are dropped along with their parent groups,
+        as in score_program.
+
+        If this is not possible, e.g. the Ranker does not provide metric factors or a group needed to recombine an
+        AND group was not kept in program_info, the program is re-scored in full with score_program.
+        """
+        if time_accounting is None:
+            time_accounting = TimeAccounting()
+
+        if program_info is None:
+            return self.score_program(program, sites, night_indices, starting_time_slots, ranker, time_accounting)
+
+        if program.program_awarded() + self.time_buffer(program) <= time_accounting.program_used(program):
+            logger.debug(f'Program {program.id.id} out of time: skipping.')
+            return None
+
+        old_group_data_map = program_info.group_data_map
+        group_data_map: GroupDataMap = {}
+
+        # Process the groups in post-order so that the children of an AND group are rescored before it.
+        stack = [(program.root_group, False)]
+        while stack:
+            group, children_done = stack.pop()
+            if not children_done and not group.is_observation_group():
+                stack.append((group, True))
+                stack.extend((subgroup, False) for subgroup in reversed(group.children))
+                continue
+
+            group_data = old_group_data_map.get(group.unique_id)
+            if group_data is None:
+                continue
+            group_info = group_data.group_info
+
+            if group.is_observation_group():
+                obs = group.children
+                if time_accounting.status(obs) in {ObservationStatus.OBSERVED, ObservationStatus.INACTIVE}:
+                    continue
+                metric_factor = ranker.metric_factor(program, obs, time_accounting)
+                if metric_factor is None or not group_info.metric_factor:
+                    return self.score_program(program, sites, night_indices, starting_time_slots, ranker,
+                                              time_accounting)
+                ratio = metric_factor / group_info.metric_factor
+                scores = {night_idx: group_info.scores[night_idx] * ratio for night_idx in night_indices}
+                group_info = replace(group_info, scores=scores, metric_factor=metric_factor)
+
+            else:
+                missing = [sg for sg in group.children if sg.unique_id not in group_data_map]
+                if missing:
+                    # If the child was dropped because it is complete, the group is dropped as in score_program.
+                    # Otherwise, the child was not kept in program_info and the group must be re-scored in full.
+                    if all(sg.unique_id in old_group_data_map for sg in missing):
+                        continue
+                    return self.score_program(program, sites, night_indices, starting_time_slots, ranker,
+                                              time_accounting)
+                group_info = replace(group_info, scores=self._store_scores(ranker.score_group(group, group_data_map)))
+
+            group_data_map[group.unique_id] = GroupData(group, group_info)
+
+        observations = {obs_id: obs for obs_id, obs in program_info.observations.items()
+                        if obs.to_unique_group_id in group_data_map}
+        target_info = {obs_id: program_info.target_info[obs_id] for obs_id in observations}
+
+        program_info = ProgramInfo(
+            program=program,
+            group_data_map=group_data_map,
+            observations=observations,
+            target_info=target_info
+        )
+
+        return ProgramCalculations(
+            program_info=program_info,
+            night_indices=night_indices,
+            group_data_map=group_data_map,
+            unfiltered_group_data_map=group_data_map
+        )
+
     def _calculate_group(self,
                          program: Program,
                          group: Group,
@@ -359,30 +774,56 @@ class Selector(SchedulerComponent):
                          starting_time_slots: StartingTimeslots,
                          night_configurations: NightConfigurationData,
                          ranker: Ranker,
+                         time_accounting: TimeAccounting,
                          group_data_map: GroupDataMap = None) -> GroupDataMap:
         """
-        Delegate this group to the proper calculation method.
+        Calculate the GroupInfo for the group and all its subgroups, delegating each group to the proper
+        calculation method.
+
+        The groups are processed in post-order, so that the subgroups of a group are in the group_data_map
+        before it is calculated. This is done with an explicit stack instead of recursion.
         """
         if group_data_map is None:
             group_data_map: GroupDataMap = {}
 
-        if group.is_observation_group():
-            processor = self._calculate_observation_group
-        elif group.is_and_group():
-            processor = self._calculate_and_group
-        elif group.is_or_group():
-            processor = self._calculate_or_group
-        else:
-            raise ValueError(f'Could not process group {group.id}')
+        for subgroup in Selector._post_order(group):
+            if subgroup.is_observation_group():
+                processor = self._calculate_observation_group
+            elif subgroup.is_and_group():
+                processor = self._calculate_and_group
+            elif subgroup.is_or_group():
+                processor = self._calculate_or_group
+            else:
+                raise ValueError(f'Could not process group {subgroup.id}')
+
+            processor(program,
+                      subgroup,
+                      sites,
+                      night_indices,
+                      starting_time_slots,
+                      night_configurations,
+                      ranker,
+                      time_accounting,
+                      group_data_map)
+
+        return group_data_map
 
-        return processor(program,
-                         group,
-                         sites,
-                         night_indices,
-                         starting_time_slots,
-                         night_configurations,
-                         ranker,
-                         group_data_map)
+    @staticmethod
+    def _post_order(group: Group) -> List[Group]:
+        """
+        Return the group and all its subgroups in post-order, i.e. each group after all its subgroups,
+        with the subgroups of a group in order.
+        """
+        ordered = []
+        stack = [(group, False)]
+        while stack:
+            next_group, expanded = stack.pop()
+            if expanded or next_group.is_observation_group():
+                ordered.append(next_group)
+            else:
+                stack.append((next_group, True))
+                stack.extend((subgroup, False) for subgroup in reversed(next_group.children))
+        return ordered
 
     def _calculate_observation_group(self,
                                      program: Program,
@@ -392,6 +833,7 @@ class Selector(SchedulerComponent):
                                      starting_time_slots: StartingTimeslots,
                                      night_configurations: NightConfigurationData,
                                      ranker: Ranker,
+                                     time_accounting: TimeAccounting,
                                      group_data_map: GroupDataMap) -> GroupDataMap:
         """
         Calculate the GroupInfo for a group that contains an observation and add it to
@@ -407,12 +849,13 @@ class Selector(SchedulerComponent):
             raise ValueError(f'Non-observation group {group.id} cannot be treated as observation group.')
 
         obs = group.children
-        if obs.status in {ObservationStatus.OBSERVED, ObservationStatus.INACTIVE}:
-            logger.debug(f'Observation {obs.id.id} has a status of {obs.status.name}. Skipping.')
+        status = time_accounting.status(obs)
+        if status in {ObservationStatus.OBSERVED, ObservationStatus.INACTIVE}:
+            logger.debug(f'Observation {obs.id.id} has a status of {status.name}. Skipping.')
             return group_data_map
 
-        if obs.status not in {ObservationStatus.READY, ObservationStatus.ONGOING}:
-            raise ValueError(f'Observation {obs.id.id} has a status of {obs.status.name}.')
+        if status not in {ObservationStatus.READY, ObservationStatus.ONGOING}:
+            raise ValueError(f'Observation {obs.id.id} has a status of {status.name}.')
 
         # This should never happen.
         if obs.site not in sites:
@@ -433,21 +876,12 @@ class Selector(SchedulerComponent):
         mrc = obs.constraints.conditions
         is_splittable = len(obs.sequence) > 1
 
-        # Calculate a numpy array of bool indexed by night to determine when the group can be added to the plan
-        # based on the night configuration filtering.
-        # TODO: We also filter on program here, but this would be better done in score_program.
-        # TODO: That would require some thought as to how to do this there given the structure of a Selection.
-        night_filtering: Dict[NightIndex, bool] = {}
-        for night_idx in night_indices:
-            night_filter = night_configurations[obs.site][night_idx].filter
-            # NOTE: to only do group filtering, comment out the first line and use the second line.
-            night_filtering[night_idx] = night_filter.program_filter(program) and night_filter.group_filter(group)
-            # night_filtering[night_idx] = night_filter.group_filter(group)
+        night_filtering = self._night_filtering(program, group, night_indices, night_configurations)
 
         if obs.obs_class in [ObservationClass.SCIENCE, ObservationClass.PROGCAL]:
             # If we are science or progcal, then the check if the first HA for the night is negative,
             # indicating that the target is rising
-            rising = {night_idx: target_info[night_idx].hourangle[0].value < 0 for night_idx in night_indices}
+            rising = {night_idx: target_info[night_idx].hourangle_hours[0] < 0 for night_idx in night_indices}
         else:
             rising = {night_idx: True for night_idx in night_indices}
         too_type = obs.too_type
@@ -459,6 +893,7 @@ class Selector(SchedulerComponent):
 
         # We need the night_events for the night for timing information.
         night_events = self.collector.get_night_events(obs.site)
+        variant_snapshot = self._variant_snapshot_per_site[obs.site]
 
         for night_idx in night_indices:
             # Get the conditions for the night. We need values for every timeslot, but at the end, we will
@@ -467,35 +902,35 @@ class Selector(SchedulerComponent):
             starting_timeslot_in_night = starting_time_slots[obs.site][night_idx]
 
             # Determine how closely the matched the required conditions are to the actual conditions.
-            # This creates a Variant spanning the whole night when part of the night up to starting_timeslot_in_night
-            # has already been covered and should be ineligible for scheduling.
-            # Zero out the part of the night that was already done.
-            variant = self._variant_snapshot_per_site[obs.site].make_variant(total_timeslots_in_night)
             # print(f'Selector: Night {night_idx} for obs {obs.id.id} ({obs.internal_id}) @ {obs.site.name}')
-            # print(f'Current conditions: {max(variant.iq)} {max(variant.cc)} {max(variant.wind_dir)} {max(variant.wind_spd)}')
             # print(f'Conditions req: IQ {mrc.iq}, CC {mrc.cc}')
             # print(f'rising: {rising[night_idx]}, Too: {too_type}')
-            conditions_score[night_idx] = Selector.match_conditions(mrc, variant, rising[night_idx], too_type)
-            conditions_score[night_idx][:starting_timeslot_in_night] = 0
-            wind_score[night_idx] = Selector._wind_conditions(variant, target_info[night_idx].az)
+            conditions_score[night_idx] = self._conditions_score(variant_snapshot,
+                                                                 mrc,
+                                                                 rising[night_idx],
+                                                                 too_type,
+                                                                 total_timeslots_in_night,
+                                                                 starting_timeslot_in_night)
+            wind_score[night_idx] = self._wind_score(variant_snapshot, target_info[night_idx].az_deg)
             # print(f'conditions score: {max(conditions_score[night_idx])}, wind_score: {max(wind_score[night_idx])}')
 
-        # Calculate the schedulable slot indices.
-        # These are the indices where the observation has:
+        # Calculate the schedulable slots.
+        # These are the time slots where the observation has:
         # 1. Visibility
         # 2. Resources available
         # 3. Conditions that are met
-        schedulable_slot_indices = {}
+        schedulable_slots = {}
         for night_idx in night_indices:
-            vis_idx = target_info[night_idx].visibility_slot_idx
-            # print(f'len(vis_idx) = {len(vis_idx)}')
             if night_filtering[night_idx]:
-                schedulable_slot_indices[night_idx] = np.where(conditions_score[night_idx][vis_idx] > 0)[0]
+                schedulable_slots[night_idx] = (target_info[night_idx].visibility_slots &
+                                                SlotMask.from_bool(conditions_score[night_idx] > 0))
             else:
-                schedulable_slot_indices[night_idx] = np.array([])
-        # print(f'number schedulable slots night: {len(schedulable_slot_indices[night_idx])}')
+                schedulable_slots[night_idx] = SlotMask.empty(len(conditions_score[night_idx]))
+        # print(f'number schedulable slots night: {schedulable_slots[night_idx].count()}')
 
-        obs_scores = ranker.score_observation(program, obs)
+        obs_scores = self._obs_scores.pop(obs.id, None)
+        if obs_scores is None:
+            obs_scores = ranker.score_observation(program, obs, time_accounting)
         # print(f'obs_scores: {max(obs_scores[night_idx])}')
 
         # Calculate the scores for the observation across all night indices across all timeslots.
@@ -503,17 +938,7 @@ class Selector(SchedulerComponent):
                 np.multiply(conditions_score[night_idx], obs_scores[night_idx]),
                 wind_score[night_idx]) for night_idx in night_indices}
 
-        # Zero out the scores for the blocked timeslots.
-        blocked_timeslots = self._blocked_timeslots[obs.site]
-        for night_idx in night_indices:
-            scores[night_idx][blocked_timeslots[night_idx]] = 0.0
-
-        # Zero out the data for each night index's starting time slots prior to the value specified (if specified)
-        # and the night index was included in scoring.
-        starting_time_slots_for_site = starting_time_slots[obs.site]
-        for night_idx, time_slot_idx in starting_time_slots_for_site.items():
-            if night_idx in night_indices:
-                scores[night_idx][:time_slot_idx] = 0.0
+        self._zero_unavailable_time_slots(obs.site, scores, night_indices, starting_time_slots)
         # print(f'scores: {max(scores[night_idx])}\n')
 
         # These scores might differ from the observation score in the ranker since they have been adjusted for
@@ -524,13 +949,56 @@ class Selector(SchedulerComponent):
             night_filtering=night_filtering,
             conditions_score=conditions_score,
             wind_score=wind_score,
-            schedulable_slot_indices=schedulable_slot_indices,
-            scores=scores
+            schedulable_slots=schedulable_slots,
+            scores=self._store_scores(scores),
+            metric_factor=ranker.metric_factor(program, obs, time_accounting)
         )
 
         group_data_map[group.unique_id] = GroupData(group, group_info)
         return group_data_map
 
+    def _night_filtering(self,
+                         program: Program,
+                         group: Group,
+                         night_indices: NightIndices,
+                         night_configurations: NightConfigurationData) -> Dict[NightIndex, bool]:
+        """
+        Determine for each night if an observation group can be added to the plan based on the night configuration
+        filtering.
+        """
+        # TODO: We also filter on program here, but this would be better done in score_program.
+        # TODO: That would require some thought as to how to do this there given the structure of a Selection.
+        # The program filter has been evaluated once for the program by the Collector.
+        site = group.children.site
+        program_eligible_nights, _ = self.collector.program_night_filters(site, program.id)
+        night_filtering: Dict[NightIndex, bool] = {}
+        for night_idx in night_indices:
+            night_filter = night_configurations[site][night_idx].filter
+            # NOTE: to only do group filtering, comment out the first line and use the second line.
+            night_filtering[night_idx] = bool(program_eligible_nights[night_idx]) and night_filter.group_filter(group)
+            # night_filtering[night_idx] = night_filter.group_filter(group)
+        return night_filtering
+
+    def _zero_unavailable_time_slots(self,
+                                     site: Site,
+                                     scores: Scores,
+                                     night_indices: NightIndices,
+                                     starting_time_slots: StartingTimeslots) -> None:
+        """
+        Zero out the scores for the blocked time slots at the site and for the time slots before the starting time
+        slot of each night.
+        """
+        blocked_timeslots = self._blocked_timeslots[site]
+        for night_idx in night_indices:
+            if blocked_timeslots[night_idx]:
+                scores[night_idx][blocked_timeslots[night_idx].to_bool(len(scores[night_idx]))] = 0.0
+
+        # Zero out the data for each night index's starting time slots prior to the value specified (if specified)
+        # and the night index was included in scoring.
+        for night_idx, time_slot_idx in starting_time_slots[site].items():
+            if night_idx in night_indices:
+                scores[night_idx][:time_slot_idx] = 0.0
+
     def _calculate_and_group(self,
                              program: Program,
                              group: Group,
@@ -539,22 +1007,19 @@ class Selector(SchedulerComponent):
                              starting_time_slots: StartingTimeslots,
                              night_configurations: NightConfigurationData,
                              ranker: Ranker,
+                             time_accounting: TimeAccounting,
                              group_data_map: GroupDataMap) -> GroupDataMap:
         """
         Calculate the GroupInfo for an AND group that contains subgroups and add it to
         the group_data_map.
+
+        The subgroups have already been processed by _calculate_group.
         """
         if not isinstance(group, Group):
             raise ValueError(f'Tried to process group {group.id} as an AND group.')
         if isinstance(group.children, Observation):
             raise ValueError(f'Tried to process observation group {group.id} as an AND group.')
 
-        # Process all subgroups and then process this group directly.
-        # Ignore the return values here: they will just accumulate in group_info_map.
-        for subgroup in group.children:
-            self._calculate_group(program, subgroup, sites, night_indices, starting_time_slots, night_configurations,
-                                  ranker, group_data_map)
-
         # We can only schedule this group if its sites are all being scheduled; however, we still want to
         # score this group's children if their sites are covered: hence the check after the child scoring.
         if not group.sites().issubset(sites):
@@ -578,48 +1043,37 @@ class Selector(SchedulerComponent):
         # This group will always be splittable unless we have some bizarre nesting.
         is_splittable = len(group.observations()) > 1 or len(group.observations()[0].sequence) > 1
 
+        subgroup_infos = [group_data_map[sg.unique_id].group_info for sg in group.children]
+
         # The group is filtered in for a night_idx if all its subgroups are filtered in for that night_idx.
-        night_filtering = {night_idx: all(
-                                  group_data_map[sg.unique_id].group_info.night_filtering[night_idx]
-                                  for sg in group.children
-        ) for night_idx in night_indices}
+        subgroup_night_filtering = np.array([[group_info.night_filtering[night_idx] for night_idx in night_indices]
+                                             for group_info in subgroup_infos], dtype=bool)
+        night_filtering = {night_idx: bool(filtered)
+                           for night_idx, filtered in zip(night_indices, np.all(subgroup_night_filtering, axis=0))}
 
         # The conditions score is the product of the conditions scores for each subgroup across each night.
-        conditions_score = {}
-        for night_idx in night_indices:
-            conditions_scores_for_night = [group_data_map[sg.unique_id].group_info.conditions_score[night_idx]
-                                           for sg in group.children]
-            conditions_score[night_idx] = np.multiply.reduce(conditions_scores_for_night)
+        # The scores of the subgroups are stacked into arrays of size (#subgroups, #timeslots across the nights)
+        # so that they are combined for all the nights at once.
+        conditions_scores, offsets = stack_scores([group_info.conditions_score for group_info in subgroup_infos],
+                                                  night_indices)
+        conditions_score = unstack_scores(np.prod(conditions_scores, axis=0), night_indices, offsets)
 
         # The wind score is the product of the wind scores for each subgroup across each night.
-        wind_score = {}
-        for night_idx in night_indices:
-            wind_scores_for_night = [group_data_map[sg.unique_id].group_info.wind_score[night_idx]
-                                     for sg in group.children]
-            wind_score[night_idx] = np.multiply.reduce(wind_scores_for_night)
-
-        # The schedulable slot indices are the unions of the schedulable slot indices for each subgroup
-        # across each night.
-        # Type checker is balking here at the list of npt.NDArray[TimeslotIndex].
-        # noinspection PyTypeChecker
-        schedulable_slot_indices = {
+        wind_scores, offsets = stack_scores([group_info.wind_score for group_info in subgroup_infos], night_indices)
+        wind_score = unstack_scores(np.prod(wind_scores, axis=0), night_indices, offsets)
+
+        # The schedulable slots are the unions of the schedulable slots for each subgroup across each night.
+        schedulable_slots = {
             night_idx:
-            # For each night, take the concatenation of the schedulable time slots for all children of the group
-            # and make it unique, which also puts it in sorted order.
-            np.unique(np.concatenate([
-                group_data_map[sg.unique_id].group_info.schedulable_slot_indices[night_idx]
-                for sg in group.children
-            ]))
+            # For each night, take the union of the schedulable time slots for all children of the group.
+            reduce(operator.or_, [group_info.schedulable_slots[night_idx] for group_info in subgroup_infos])
             # If we want intersection of schedulable nights instead of union, use this code.
-            # Requires: from functools import reduce
-            # np.array([reduce(np.intersect1d,
-            #                  [group_data_map[sg.unique_id].group_info.schedulable_slot_indices[night_idx]
-            #                   for sg in group.children])])
+            # reduce(operator.and_, [group_info.schedulable_slots[night_idx] for group_info in subgroup_infos])
             for night_idx in night_indices
         }
 
         # Calculate the scores for the group across all nights across all timeslots.
-        scores = ranker.score_group(group, group_data_map)
+        scores = self._store_scores(ranker.score_group(group, group_data_map))
 
         group_info = GroupInfo(
             minimum_conditions=mrc,
@@ -627,7 +1081,7 @@ class Selector(SchedulerComponent):
             night_filtering=night_filtering,
             conditions_score=conditions_score,
             wind_score=wind_score,
-            schedulable_slot_indices=schedulable_slot_indices,
+            schedulable_slots=schedulable_slots,
             scores=scores
         )
         group_data_map[group.unique_id] = GroupData(group, group_info)
@@ -641,6 +1095,7 @@ class Selector(SchedulerComponent):
                             starting_time_slots: StartingTimeslots,
                             night_configurations: NightConfigurationData,
                             ranker: Ranker,
+                            time_accounting: TimeAccounting,
                             group_data_map: GroupDataMap) -> GroupDataMap:
         """
         Calculate the GroupInfo for an AND group that contains subgroups and add it to
@@ -650,14 +1105,65 @@ class Selector(SchedulerComponent):
         """
         raise NotImplementedError(f'Selector does not yet handle OR groups: {group.id}')
 
+    def _conditions_score(self,
+                          variant_snapshot: VariantSnapshot,
+                          required_conditions: Conditions,
+                          rising: bool,
+                          too_type: Optional[TooType],
+                          total_timeslots_in_night: int,
+                          starting_timeslot_in_night: int) -> npt.NDArray[float]:
+        """
+        The conditions score for a night for the given variant snapshot and requirements, memoized for the selection.
+
+        This creates a Variant spanning the whole night when part of the night up to starting_timeslot_in_night
+        has already been covered and should be ineligible for scheduling, and zeroes out the part of the night
+        that was already done.
+        """
+        key = (variant_snapshot.iq, variant_snapshot.cc, required_conditions.iq, required_conditions.cc,
+               rising, too_type, total_timeslots_in_night, starting_timeslot_in_night)
+        conditions_score = self._conditions_scores.get(key)
+        if conditions_score is None:
+            variant = variant_snapshot.make_variant(total_timeslots_in_night)
+            conditions_score = Selector.match_conditions(required_conditions, variant, rising, too_type)
+            conditions_score[:starting_timeslot_in_night] = 0
+            conditions_score.flags.writeable = False
+            self._conditions_scores[key] = conditions_score
+        return conditions_score
+
+    def _wind_score(self,
+                    variant_snapshot: VariantSnapshot,
+                    azimuth_deg: npt.NDArray[float]) -> npt.NDArray[float]:
+        """
+        The wind score over an azimuth track in degrees for the given variant snapshot, memoized for the selection.
+        This is the same as _wind_conditions for the variant of the snapshot over the track, but as the wind of the
+        snapshot is constant over the night, the score is all ones unless the wind speed is above the bound.
+        """
+        calm = not variant_snapshot.wind_spd > Selector._wind_spd_bound
+        if calm:
+            key = (len(azimuth_deg),)
+        else:
+            key = (variant_snapshot.wind_dir.to_value(), variant_snapshot.wind_spd.to_value(), id(azimuth_deg))
+        memo = self._wind_scores.get(key)
+        if memo is not None:
+            return memo[1]
+
+        wind = np.ones(len(azimuth_deg))
+        if not calm:
+            az_wd = np.abs(azimuth_deg - variant_snapshot.wind_dir.to_value(u.deg))
+            wind[np.logical_or(az_wd <= Selector._wind_sep.to_value(),
+                               360 - az_wd <= Selector._wind_sep.to_value())] = 0
+        wind.flags.writeable = False
+        self._wind_scores[key] = azimuth_deg, wind
+        return wind
+
     @staticmethod
     def _wind_conditions(variant: Variant,
-                         azimuth: Angle) -> npt.NDArray[float]:
+                         azimuth_deg: npt.NDArray[float]) -> npt.NDArray[float]:
         """
-        Calculate the effect of the wind conditions on the score of an observation.
+        Calculate the effect of the wind conditions on the score of an observation over an azimuth track in degrees.
         """
-        wind = np.ones(len(azimuth))
-        az_wd = np.abs(azimuth.to_value() - variant.wind_dir.to_value())
+        wind = np.ones(len(azimuth_deg))
+        az_wd = np.abs(azimuth_deg - variant.wind_dir.to_value(u.deg))
         idx = np.where(np.logical_and(variant.wind_spd > Selector._wind_spd_bound,  # * u.m / u.s
                                       np.logical_or(az_wd <= Selector._wind_sep.to_value(),
                                                     360 - az_wd <= Selector._wind_sep.to_value())))[0]
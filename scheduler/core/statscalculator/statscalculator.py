@@ -127,8 +127,7 @@ class StatCalculator:
                         # Calculate altitude data
                         ti = collector.get_target_info(visit.obs_id)
                         end_time_slot = visit.start_time_slot + visit.time_slots
-                        values = ti[night_idx].alt[visit.start_time_slot: end_time_slot]
-                        alt_degs = [val.dms[0] + (val.dms[1] / 60) + (val.dms[2] / 3600) for val in values]
+                        alt_degs = ti[night_idx].alt_deg[visit.start_time_slot: end_time_slot].tolist()
                         plan.alt_degs.append(alt_degs)
 
                     program_completion = {p.id: StatCalculator.calculate_program_completion(programs[p])
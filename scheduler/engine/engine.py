@@ -185,7 +185,8 @@ class Engine:
 
                     # If the site is blocked, we do not perform a selection or optimizer run for the site.
                     if self.change_monitor.is_site_unblocked(site):
-                        plans = scp.run(site, night_indices, current_timeslot, ranker)
+                        previous_plans = plans if self.params.warm_start else None
+                        plans = scp.run(site, night_indices, current_timeslot, ranker, previous_plans)
                         nightly_timeline.add(NightIndex(night_idx),
                                              site,
                                              current_timeslot,
@@ -28,6 +28,8 @@ class SchedulerParameters:
     semester_visibility: bool = True
     num_nights_to_schedule: Optional[int] = None
     programs_list: Optional[List[str]] = None
+    # Replan from the previous plan for the night, keeping its visits that are still valid.
+    warm_start: bool = False
 
     def __post_init__(self):
         self.semesters = frozenset([Semester.find_semester_from_date(self.start.datetime),
@@ -70,4 +72,5 @@ class SchedulerParameters:
             f"├─mode: {self.mode}\n" + \
             f"├─semester_visibility: {self.semester_visibility}\n" + \
             f"├─num_nights_to_schedule: {self.num_nights_to_schedule}\n" + \
+            f"├─warm_start: {self.warm_start}\n" + \
             f"└─ranker_parameters: {self.ranker_parameters}"
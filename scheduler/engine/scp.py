@@ -2,7 +2,7 @@
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
 from dataclasses import dataclass
-from typing import final
+from typing import final, Optional
 
 import numpy.typing as npt
 from lucupy.minimodel import Site, NightIndex, TimeslotIndex
@@ -33,7 +33,13 @@ class SCP:
             site: Site,
             night_indices: npt.NDArray[NightIndex],
             current_timeslot: TimeslotIndex,
-            ranker: Ranker) -> Plans:
+            ranker: Ranker,
+            previous_plans: Optional[Plans] = None) -> Plans:
+        """
+        Select and optimize the plans for the site from the current time slot.
+        If previous_plans is given, the optimizer keeps the visits in it that are still valid under the new
+        selection and only re-optimizes the rest of the night.
+        """
         selection = self.selector.select(night_indices=night_indices,
                                          sites=frozenset([site]),
                                          starting_time_slots={site: {night_idx: current_timeslot
@@ -45,5 +51,6 @@ class SCP:
         # to the current night index we are looping over.
         # _logger.debug(f'Running optimizer for {site.site_name} for night {night_idx} '
         #               f'starting at time slot {current_timeslot}.')
-        plans = self.optimizer.schedule(selection)[0]
+        previous_nights = None if previous_plans is None else [previous_plans]
+        plans = self.optimizer.schedule(selection, previous_nights=previous_nights)[0]
         return plans
@@ -1,7 +1,7 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
-from typing import final, ClassVar, Dict, Final, Optional
+from typing import final, ClassVar, Dict, Final, Optional, Sequence
 
 from astropy.coordinates import SkyCoord
 from astropy.time import Time, TimeDelta
@@ -50,3 +50,32 @@ class ProperMotionCalculator(metaclass=Singleton):
 
         # Return a single SkyCoord object with all positions
         return SkyCoord(ra=ras * u.deg, dec=decs * u.deg, frame='icrs')
+
+    def calculate_coordinates_for_targets(self,
+                                          targets: Sequence[SiderealTarget],
+                                          start_time: Time,
+                                          num_time_slots: int,
+                                          time_slot_length: Optional[TimeDelta] = None) -> SkyCoord:
+        """
+        As calculate_coordinates for a number of targets at once, returning a SkyCoord with one row per target,
+        i.e. of shape (len(targets), num_time_slots).
+        """
+        if time_slot_length is None:
+            time_slot_length = ProperMotionCalculator._DEFAULT_TIMESLOT_LENGTH
+
+        pm_ra = np.array([target.pm_ra for target in targets], dtype=float) / ProperMotionCalculator._MAS_PER_DEGREE
+        pm_dec = np.array([target.pm_dec for target in targets], dtype=float) / ProperMotionCalculator._MAS_PER_DEGREE
+        ra = np.array([target.ra for target in targets], dtype=float)
+        dec = np.array([target.dec for target in targets], dtype=float)
+
+        # The time offsets only depend on the epoch of the target, so they are calculated once per epoch.
+        times = start_time + time_slot_length * np.arange(num_time_slots)
+        epochs, epoch_indices = np.unique([target.epoch for target in targets], return_inverse=True)
+        time_offsets_years = np.array([
+            (times - ProperMotionCalculator._EPOCH2TIME.setdefault(float(epoch), Time(epoch, format='jyear'))).to(u.yr).value
+            for epoch in epochs
+        ]).reshape(len(epochs), num_time_slots)[epoch_indices.reshape(-1)]
+
+        ras = ra[:, np.newaxis] + pm_ra[:, np.newaxis] * time_offsets_years
+        decs = dec[:, np.newaxis] + pm_dec[:, np.newaxis] * time_offsets_years
+        return SkyCoord(ra=ras * u.deg, dec=decs * u.deg, frame='icrs')
@@ -1,2 +1,3 @@
 from .calculator import *
 from .snapshot import *
+from .track_cache import *
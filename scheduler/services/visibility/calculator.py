@@ -1,9 +1,10 @@
-from dataclasses import dataclass
-from typing import final, Dict, List, Any, Optional, ClassVar, FrozenSet
+from dataclasses import dataclass, replace
+from typing import final, Dict, List, Any, Optional, ClassVar, FrozenSet, Sequence, Tuple
 
 import astropy.units as u
 import numpy as np
 import numpy.typing as npt
+from astropy.coordinates import ICRS, Angle, Longitude, SkyCoord
 from astropy.time import TimeDelta, Time
 from lucupy import sky
 from lucupy.decorators import immutable
@@ -13,19 +14,20 @@ from lucupy.minimodel import SiderealTarget, NonsiderealTarget, SkyBackground, E
 from numpy import dtype, ndarray
 
 from scheduler.config import config
-from scheduler.core.calculations import NightEvents
+from scheduler.core.calculations import NightEvents, SlotMask
 from scheduler.services.proper_motion import ProperMotionCalculator
 from scheduler.services.ephemeris import EphemerisCalculator
 from scheduler.services.redis_client import redis_client
 from scheduler.services.logger_factory import create_logger
 from scheduler.services.resource import NightConfiguration
 
-from .snapshot import VisibilitySnapshot, TargetSnapshot
+from .snapshot import VisibilitySnapshot, TargetSnapshot, TargetTrack, TargetTrackKey
 from scheduler.core.meta import Singleton
 
 _logger = create_logger(__name__)
 
 __all__ = [
+    'calculate_sidereal_target_tracks',
     'calculate_target_snapshot',
     'visibility_calculator',
     'TargetVisibility',
@@ -37,7 +39,7 @@ __all__ = [
 @immutable
 @dataclass(frozen=True)
 class TargetVisibility:
-    visibility_slot_idx: npt.NDArray[int]
+    visibility_slots: SlotMask
     visibility_time: TimeDelta
     rem_visibility_time: TimeDelta
     rem_visibility_frac: float
@@ -124,6 +126,145 @@ def calculate_target_snapshot(night_idx: NightIndex,
                           sky_brightness=sb)
 
 
+def _altitude_above(dec: npt.NDArray[float],
+                    hourangle: npt.NDArray[float],
+                    lat: float) -> Tuple[Angle, Angle, Angle]:
+    """
+    The altitude, azimuth, and parallactic angle as per sky.Altitude.above, for arrays of any shape of declinations
+    and hour angles in radians.
+    """
+    cos_dec = np.cos(dec)
+    sin_dec = np.sin(dec)
+    cos_ha = np.cos(hourangle)
+    sin_ha = np.sin(hourangle)
+    cos_lat = np.cos(lat)
+    sin_lat = np.sin(lat)
+
+    altitude = np.arcsin(cos_dec * cos_ha * cos_lat + sin_dec * sin_lat)
+    y = sin_dec * cos_lat - cos_dec * cos_ha * sin_lat
+    z = -1. * cos_dec * sin_ha
+    azimuth = Longitude(np.arctan2(z, y), unit=u.radian)
+    azimuth_rad = azimuth.to_value(u.radian)
+
+    # Solve the spherical triangle for the parallactic angle, which is pi on the poles.
+    on_pole = cos_dec == 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sinp = -1. * np.sin(azimuth_rad) * cos_lat / cos_dec
+    cosp = -1. * np.cos(azimuth_rad) * cos_ha - np.sin(azimuth_rad) * sin_ha * sin_lat
+    par_ang = np.where(on_pole, np.pi, np.arctan2(sinp, cosp))
+
+    return Angle(altitude, unit=u.radian), azimuth, Angle(par_ang, unit=u.radian)
+
+
+def _calculate_target_tracks(night_idx: NightIndex,
+                             targets: Sequence[SiderealTarget],
+                             night_events: NightEvents,
+                             time_grid_night: Time,
+                             time_slot_length: TimeDelta) -> List[TargetTrack]:
+    """
+    Calculate the tracks of a number of sidereal targets for a night, without their sky brightness.
+
+    The tracks are stacked into arrays of shape (#targets, #timeslots) so that the coordinates, hour angle, altitude,
+    azimuth, parallactic angle, and airmass are calculated for all the targets at once. Each array is converted once
+    to the units of TargetTrack, and the track of each target holds views of its rows of the converted arrays.
+    """
+    num_time_slots = night_events.num_timeslots_per_night[night_idx]
+    coords = ProperMotionCalculator().calculate_coordinates_for_targets(targets,
+                                                                        time_grid_night,
+                                                                        num_time_slots,
+                                                                        time_slot_length)
+
+    # The local sidereal times are broadcast against the right ascension of each target.
+    lst = night_events.local_sidereal_times[night_idx]
+    hourangle = lst - coords.ra
+    hourangle.wrap_at(12.0 * u.hour, inplace=True)
+    lat = night_events.site.location.lat.to_value(u.rad)
+    alt, az, par_ang = _altitude_above(coords.dec.to_value(u.rad), hourangle.to_value(u.rad), lat)
+    airmass = sky.true_airmass(alt.ravel()).reshape(alt.shape)
+
+    ra_deg = coords.ra.to_value(u.deg)
+    dec_deg = coords.dec.to_value(u.deg)
+    alt_deg = alt.to_value(u.deg)
+    az_deg = az.to_value(u.deg)
+    par_ang_deg = par_ang.to_value(u.deg)
+    hourangle_hours = hourangle.to_value(u.hourangle)
+    return [TargetTrack(ra_deg=ra_deg[row],
+                        dec_deg=dec_deg[row],
+                        alt_deg=alt_deg[row],
+                        az_deg=az_deg[row],
+                        par_ang_deg=par_ang_deg[row],
+                        hourangle_hours=hourangle_hours[row],
+                        airmass=airmass[row])
+            for row in range(len(targets))]
+
+
+def _calculate_sky_brightness(night_idx: NightIndex,
+                              tracks: Sequence[TargetTrack],
+                              night_events: NightEvents) -> None:
+    """
+    Calculate the sky brightness of a number of target tracks for a night all at once and set it in the tracks.
+    """
+    # Transform the moon positions to the frame of the targets once, instead of once per target.
+    moon_pos = night_events.moon_pos[night_idx].transform_to(ICRS())
+    num_tracks = len(tracks)
+    coords = SkyCoord(ra=np.stack([track.ra_deg for track in tracks]) * u.deg,
+                      dec=np.stack([track.dec_deg for track in tracks]) * u.deg,
+                      frame=ICRS())
+    targ_moon_ang = coords.separation(moon_pos).ravel()
+    brightness = sky.brightness.calculate_sky_brightness(
+        np.tile(180.0 * u.deg - night_events.sun_moon_ang[night_idx], num_tracks),
+        targ_moon_ang,
+        np.tile(night_events.moon_dist[night_idx], num_tracks),
+        np.tile(90.0 * u.deg - night_events.moon_alt[night_idx], num_tracks),
+        (90.0 - np.concatenate([track.alt_deg for track in tracks])) * u.deg,
+        np.tile(90.0 * u.deg - night_events.sun_alt[night_idx], num_tracks)
+    )
+    sb = sky.brightness.convert_to_sky_background(brightness).reshape(num_tracks, -1)
+    for track, track_sb in zip(tracks, sb):
+        track.sky_brightness = track_sb
+
+
+def calculate_sidereal_target_tracks(night_idx: NightIndex,
+                                     targets: Sequence[Tuple[Observation, SiderealTarget]],
+                                     night_events: NightEvents,
+                                     time_grid_night: Time,
+                                     time_slot_length: TimeDelta,
+                                     tracks: Optional[Dict[TargetTrackKey, TargetTrack]] = None
+                                     ) -> List[TargetTrack]:
+    """
+    Calculate the target information for a night for a number of sidereal targets at the site of night_events,
+    as calculate_target_snapshot does for each of them, as a TargetTrack per target.
+
+    The track of each distinct target is only calculated once, with all the tracks calculated together. The sky
+    brightness of a track is only calculated if an observation of the target has a sky background constraint: for
+    the other targets, the track returned shares the arrays of the calculated track but has a sky brightness of SBANY.
+
+    tracks is a cache of the tracks for the night at the site, which is looked up and filled in here.
+    """
+    if tracks is None:
+        tracks = {}
+
+    keys = [TargetTrack.key(target) for _, target in targets]
+    missing = {key: target for key, (_, target) in zip(keys, targets) if key not in tracks}
+    if missing:
+        tracks.update(zip(missing, _calculate_target_tracks(night_idx,
+                                                            list(missing.values()),
+                                                            night_events,
+                                                            time_grid_night,
+                                                            time_slot_length)))
+
+    # Only the tracks of the targets with a sky background constraint need their sky brightness.
+    has_sb = [bool(obs.constraints) and obs.constraints.conditions.sb < SkyBackground.SBANY for obs, _ in targets]
+    sb_keys = {key for key, target_has_sb in zip(keys, has_sb)
+               if target_has_sb and tracks[key].sky_brightness is None}
+    if sb_keys:
+        _calculate_sky_brightness(night_idx, [tracks[key] for key in sb_keys], night_events)
+
+    sb_any = np.full([len(night_events.times[night_idx])], SkyBackground.SBANY)
+    return [tracks[key] if target_has_sb else replace(tracks[key], sky_brightness=sb_any)
+            for key, target_has_sb in zip(keys, has_sb)]
+
+
 @final
 @dataclass
 class TargetVisibilityTable:
@@ -197,7 +338,7 @@ class VisibilityCalculator(metaclass=Singleton):
             else:
                 rem_visibility_frac = 0.0
 
-            target_visibilities[night_idx] = TargetVisibility(visibility_slot_idx=visibility_snapshot.visibility_slot_idx,
+            target_visibilities[night_idx] = TargetVisibility(visibility_slots=visibility_snapshot.visibility_slots,
                                                               visibility_time=visibility_snapshot.visibility_time,
                                                               rem_visibility_time=rem_visibility_time,
                                                               rem_visibility_frac=rem_visibility_frac)
@@ -228,7 +369,7 @@ class VisibilityCalculator(metaclass=Singleton):
             # Convert to the actual time grid index.
             night_idx = NightIndex(len(time_grid) - ridx - 1)
             # Calculate the time slots for the night in which there is visibility.
-            visibility_slot_idx = np.array([], dtype=int)
+            visible = np.zeros(len(night_events.times[night_idx]), dtype=bool)
 
             # Calculate target snapshot
             target_snapshot = calculate_target_snapshot(night_idx,
@@ -280,21 +421,17 @@ class VisibilityCalculator(metaclass=Singleton):
                     np.logical_and(night_events.times[night_idx][sa_idx[c_idx]] >= tw[0],
                                    night_events.times[night_idx][sa_idx[c_idx]] <= tw[1])
                 )[0]
-                visibility_slot_idx = np.append(visibility_slot_idx, sa_idx[c_idx[tw_idx]])
-
-            # Create a visibility filter that has an entry for every time slot over the night,
-            # with 0 if the target is not visible and 1 if it is visible.
-            visibility_slot_filter = np.zeros(len(night_events.times[night_idx]))
-            visibility_slot_filter.put(visibility_slot_idx, 1.0)
+                visible[sa_idx[c_idx[tw_idx]]] = True
+            visibility_slots = SlotMask.from_bool(visible)
 
             # TODO: Guide star availability for moving targets and parallactic angle modes.
 
             # Calculate the visibility time, the ongoing summed remaining visibility time, and
             # the remaining visibility fraction.
             # If the denominator for the visibility fraction is 0, use a value of 0.
-            visibility_time = TimeDelta(len(visibility_slot_idx) * time_slot_length.to_value(u.s), format='sec')
+            visibility_time = TimeDelta(visibility_slots.count() * time_slot_length.to_value(u.s), format='sec')
 
-            visibility_snapshot = VisibilitySnapshot(visibility_slot_idx=visibility_slot_idx,
+            visibility_snapshot = VisibilitySnapshot(visibility_slots=visibility_slots,
                                                      visibility_time=visibility_time)
             # Pass to int to eliminate decimals and to string to keep the keys after deserialization.
             visibility_snapshots[str(int(jday.jd))] = visibility_snapshot
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Optional, Tuple, TypeAlias
+import astropy.units as u
 import numpy as np
 import numpy.typing as npt
 from astropy.coordinates import SkyCoord, Angle
@@ -7,21 +8,18 @@ from astropy.time import TimeDelta
 from typing import final
 
 from lucupy.decorators import immutable
-from lucupy.minimodel import SkyBackground
-import itertools
+from lucupy.minimodel import SiderealTarget, SkyBackground
+
+from scheduler.core.calculations.slotmask import SlotMask
 
 __all__ = [
     'VisibilitySnapshot',
-    'TargetSnapshot'
+    'TargetSnapshot',
+    'TargetTrack',
+    'TargetTrackKey',
 ]
 
 
-def group_ranges(i):
-    for _, b in itertools.groupby(enumerate(i), lambda pair: pair[1] - pair[0]):
-        b = list(b)
-        yield b[0][1], b[-1][1]
-
-
 @final
 @immutable
 @dataclass(frozen=True)
@@ -30,21 +28,22 @@ class VisibilitySnapshot:
     Visibility information needed to calculate the remaining visibility for
     each target.
     """
-    visibility_slot_idx: npt.NDArray[int]
+    visibility_slots: SlotMask
     visibility_time: TimeDelta
 
     @staticmethod
     def from_dict(ti_dict: Dict) -> 'VisibilitySnapshot':
-        slot_list = [list(range(s[0], s[1] + 1)) for s in ti_dict['visibility_slot_idx']]
-        return VisibilitySnapshot(visibility_slot_idx=np.array([x for xs in slot_list for x in xs], dtype=int),
+        # The visibility slots are stored as inclusive ranges [a, b] of time slot indices.
+        ranges = np.array(ti_dict['visibility_slot_idx'], dtype=int).reshape(-1, 2)
+        return VisibilitySnapshot(visibility_slots=SlotMask.from_runs(ranges + np.array([0, 1])),
                                   visibility_time=TimeDelta(ti_dict['visibility_time']['value'],
                                                             format=ti_dict['visibility_time']['format']),
                                  )
 
     def to_dict(self) -> Dict:
-        visibility_ranges = group_ranges(self.visibility_slot_idx.tolist())
+        visibility_ranges = [(int(start), int(stop) - 1) for start, stop in self.visibility_slots.runs()]
         return {
-            'visibility_slot_idx': [*visibility_ranges],
+            'visibility_slot_idx': visibility_ranges,
             'visibility_time': {
                 'value': self.visibility_time.sec,
                 'format': self.visibility_time.format
@@ -67,4 +66,49 @@ class TargetSnapshot:
     hourangle: Angle
     airmass: npt.NDArray[float]
     target_sb: SkyBackground
-    sky_brightness: npt.NDArray[SkyBackground]
\ No newline at end of file
+    sky_brightness: npt.NDArray[SkyBackground]
+
+
+# The coordinates, proper motion, and epoch of a sidereal target, which determine its track in a night.
+TargetTrackKey: TypeAlias = Tuple[float, float, float, float, float]
+
+
+@final
+@dataclass
+class TargetTrack:
+    """
+    The track of a target in a night at a site as plain float64 arrays (shape == time_slots) in fixed units:
+    * ra_deg, dec_deg, alt_deg, az_deg, and par_ang_deg are in degrees.
+    * hourangle_hours is in hours, wrapped to [-12, 12).
+
+    The track of a sidereal target only depends on the coordinates, proper motion, and epoch of the target, and is
+    thus shared by the observations of all the targets with the same ones. The tracks calculated together are rows of
+    the same (#targets, #timeslots) arrays.
+    The sky brightness is only calculated once an observation of the target has a sky background constraint.
+    """
+    ra_deg: npt.NDArray[np.float64]
+    dec_deg: npt.NDArray[np.float64]
+    alt_deg: npt.NDArray[np.float64]
+    az_deg: npt.NDArray[np.float64]
+    par_ang_deg: npt.NDArray[np.float64]
+    hourangle_hours: npt.NDArray[np.float64]
+    airmass: npt.NDArray[np.float64]
+    sky_brightness: Optional[npt.NDArray[SkyBackground]] = None
+
+    @staticmethod
+    def key(target: SiderealTarget) -> TargetTrackKey:
+        return target.ra, target.dec, target.pm_ra, target.pm_dec, target.epoch
+
+    @staticmethod
+    def from_snapshot(snapshot: TargetSnapshot) -> 'TargetTrack':
+        """
+        The track of a target from its snapshot, e.g. for a nonsidereal target.
+        """
+        return TargetTrack(ra_deg=snapshot.coord.ra.to_value(u.deg),
+                           dec_deg=snapshot.coord.dec.to_value(u.deg),
+                           alt_deg=snapshot.alt.to_value(u.deg),
+                           az_deg=snapshot.az.to_value(u.deg),
+                           par_ang_deg=snapshot.par_ang.to_value(u.deg),
+                           hourangle_hours=snapshot.hourangle.to_value(u.hourangle),
+                           airmass=np.asarray(snapshot.airmass, dtype=np.float64),
+                           sky_brightness=snapshot.sky_brightness)
@@ -0,0 +1,137 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import final, ClassVar, Dict, Iterable, Tuple, Union
+
+import astropy.units as u
+import numpy as np
+from astropy.time import Time, TimeDelta
+from lucupy.minimodel import NightIndex
+
+from scheduler.core.calculations import NightEvents
+from scheduler.services.logger_factory import create_logger
+
+from .snapshot import TargetTrack, TargetTrackKey
+
+_logger = create_logger(__name__)
+
+__all__ = [
+    'TargetTrackCache',
+]
+
+
+@final
+class TargetTrackCache:
+    """
+    An on-disk cache of the tracks of the sidereal targets for a night at a site, without their sky brightness.
+
+    The tracks are stored per target, so that adding or removing programs only adds or leaves unused the files of
+    their targets. There is a directory per night at a site, named by the site, the date of the night, and a content
+    hash of its time grid, i.e. the site, the local sidereal times, the time of the night in the time grid of the
+    Collector (e.g. 08:00 UTC on the date of the night) from which the coordinates of the targets are calculated, and
+    the time slot length. In it, the track of each target is a .npy file named by a hash of its TargetTrackKey,
+    holding a float64 array of shape (#columns, #timeslots). A file is thus never stale: when any of these change,
+    a different file is used.
+
+    The files are written to a temporary file and then moved into place, so that processes may share a directory.
+    Files are never deleted here: the directory of a night can be deleted once the night is no longer scheduled,
+    and the whole directory may be cleared at any time.
+    """
+    # Bump this if the layout of the files or the calculation of the tracks changes.
+    _VERSION: ClassVar[int] = 2
+    _COLUMNS: ClassVar[Tuple[str, ...]] = ('ra_deg', 'dec_deg', 'alt_deg', 'az_deg', 'par_ang_deg',
+                                           'hourangle_hours', 'airmass')
+
+    def __init__(self, directory: Union[str, os.PathLike]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _night_directory(self,
+                         night_idx: NightIndex,
+                         night_events: NightEvents,
+                         time_grid_night: Time,
+                         time_slot_length: TimeDelta) -> Path:
+        digest = hashlib.sha256()
+        digest.update(f'{TargetTrackCache._VERSION}:{night_events.site.name}:'.encode())
+        digest.update(np.array([time_grid_night.jd1, time_grid_night.jd2, time_slot_length.sec,
+                                night_events.site.location.lat.to_value(u.deg)], dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(night_events.local_sidereal_times[night_idx].to_value(u.deg),
+                                           dtype=np.float64).tobytes())
+        date = time_grid_night.to_datetime().strftime('%Y%m%d')
+        return self.directory / f'{night_events.site.name}-{date}-{digest.hexdigest()[:32]}'
+
+    @staticmethod
+    def _file_name(key: TargetTrackKey) -> str:
+        return f'{hashlib.sha256(np.array(key, dtype=np.float64).tobytes()).hexdigest()}.npy'
+
+    def load(self,
+             night_idx: NightIndex,
+             keys: Iterable[TargetTrackKey],
+             night_events: NightEvents,
+             time_grid_night: Time,
+             time_slot_length: TimeDelta) -> Dict[TargetTrackKey, TargetTrack]:
+        """
+        Return the tracks of the targets with the given keys for the night that are in the cache.
+        """
+        night_directory = self._night_directory(night_idx, night_events, time_grid_night, time_slot_length)
+        if not night_directory.is_dir():
+            return {}
+
+        shape = len(TargetTrackCache._COLUMNS), night_events.num_timeslots_per_night[night_idx]
+        tracks = {}
+        for key in set(keys):
+            path = night_directory / TargetTrackCache._file_name(key)
+            if not path.exists():
+                continue
+            try:
+                block = np.load(path)
+            except (OSError, ValueError) as e:
+                _logger.warning(f'Could not read target track from {path}: {e}')
+                continue
+            if block.shape != shape:
+                _logger.warning(f'Ignoring target track in {path} with unexpected shape {block.shape}.')
+                continue
+            tracks[key] = TargetTrack(**{column: block[column_idx]
+                                         for column_idx, column in enumerate(TargetTrackCache._COLUMNS)})
+        return tracks
+
+    def save(self,
+             night_idx: NightIndex,
+             tracks: Dict[TargetTrackKey, TargetTrack],
+             night_events: NightEvents,
+             time_grid_night: Time,
+             time_slot_length: TimeDelta) -> None:
+        """
+        Store the tracks for the night that are not in the cache yet, so that they can be loaded by their keys.
+        Failures to write are logged and otherwise ignored, as the tracks can always be calculated.
+        """
+        if not tracks:
+            return
+        night_directory = self._night_directory(night_idx, night_events, time_grid_night, time_slot_length)
+        try:
+            night_directory.mkdir(exist_ok=True)
+        except OSError as e:
+            _logger.warning(f'Could not create the target track directory {night_directory}: {e}')
+            return
+
+        for key, track in tracks.items():
+            path = night_directory / TargetTrackCache._file_name(key)
+            if path.exists():
+                continue
+            block = np.stack([np.asarray(getattr(track, column), dtype=np.float64)
+                              for column in TargetTrackCache._COLUMNS])
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=night_directory, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, block)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                _logger.warning(f'Could not write target track to {path}: {e}')
+                if tmp_path is not None:
+                    Path(tmp_path).unlink(missing_ok=True)
+                return
@@ -0,0 +1,28 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import pytest
+
+from scheduler.core.calculations import LazyTargetInfoNightIndexMap
+
+
+def test_lazy_target_info_night_index_map():
+    """
+    Ensure that the TargetInfo of a night is only calculated when the night is accessed.
+    """
+    calculated = []
+
+    def calculate_night(night_idx):
+        calculated.append(night_idx)
+        return f'target info {night_idx}'
+
+    target_info = LazyTargetInfoNightIndexMap(3, calculate_night)
+    assert len(target_info) == 3
+    assert list(target_info) == [0, 1, 2]
+    assert not calculated
+
+    assert target_info[1] == 'target info 1'
+    assert calculated == [1]
+    assert 3 not in target_info
+    with pytest.raises(KeyError):
+        _ = target_info[-1]
@@ -0,0 +1,37 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import numpy as np
+
+from scheduler.core.calculations import SlotMask
+
+
+def test_slot_mask_set_operations():
+    """
+    Ensure that the set operations on slot masks agree with those on time slot indices.
+    """
+    a = SlotMask.from_indices(np.array([0, 1, 2, 9, 10, 17]), 20)
+    b = SlotMask.from_indices(np.array([2, 3, 10, 11]))
+    assert b.length == 12
+
+    assert ((a | b).indices() == np.array([0, 1, 2, 3, 9, 10, 11, 17])).all()
+    assert ((a & b).indices() == np.array([2, 10])).all()
+    assert ((a - b).indices() == np.array([0, 1, 9, 17])).all()
+    assert (a | b).length == 20
+    assert a.count() == 6
+    assert a and not SlotMask.empty(20)
+    assert SlotMask.from_indices(np.array([1, 2])) == SlotMask.from_indices(np.array([1, 2]), 30)
+
+
+def test_slot_mask_runs():
+    """
+    Ensure that runs are extracted as [a, b) intervals and that masks can be created from them.
+    """
+    flags = np.array([False, True, True, False, False, True, False, True, True, True])
+    mask = SlotMask.from_bool(flags)
+    runs = mask.runs()
+    assert (runs == np.array([[1, 3], [5, 6], [7, 10]])).all()
+    assert SlotMask.from_runs(runs, len(flags)) == mask
+    assert (mask.to_bool() == flags).all()
+    assert not mask.to_bool(12)[10:].any()
+    assert SlotMask.from_runs(np.array([[0, 4], [2, 6]])).count() == 6
@@ -0,0 +1,29 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import numpy as np
+
+from scheduler.core.calculations import SparseNightScores
+
+
+def test_sparse_night_scores():
+    """
+    Ensure that sparse scores agree with the dense scores they were created from.
+    """
+    dense = np.array([0., 0., 1., 2., 0., 0., 3., 0.5, 0.])
+    scores = SparseNightScores.from_dense(dense)
+
+    assert (scores.non_zero_intervals() == np.array([[2, 4], [6, 8]])).all()
+    assert len(scores) == len(dense)
+    assert (np.asarray(scores) == dense).all()
+    assert (scores[3:7] == dense[3:7]).all()
+    assert (scores[-2:] == dense[-2:]).all()
+    assert scores[3] == 2. and scores[5] == 0. and scores[-2] == 0.5
+    assert np.max(scores) == 3. and np.argmax(scores) == 6 and np.sum(scores) == dense.sum()
+
+    assert (np.asarray(scores * 2.) == dense * 2.).all()
+    other = np.array([1., 1., 1., 0., 1., 1., 2., 0., 1.])
+    product = scores * other
+    assert (np.asarray(product) == dense * other).all()
+    assert (product.non_zero_intervals() == np.array([[2, 3], [6, 7]])).all()
+    assert not (scores * 0.).non_zero_intervals().size
@@ -0,0 +1,33 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import numpy as np
+from lucupy.minimodel import NightIndex
+
+from scheduler.core.calculations import stack_scores, unstack_scores
+
+
+def test_stack_scores():
+    """
+    Ensure that stacking the scores of several groups over nights of different lengths and unstacking them gives
+    back the scores of each night, and that the scores of a night are combined across the groups in place.
+    """
+    night_indices = np.array([NightIndex(2), NightIndex(3), NightIndex(4)])
+    night_lengths = (5, 3, 7)
+    rng = np.random.default_rng(0)
+    scores = [{night_idx: rng.random(length) for night_idx, length in zip(night_indices, night_lengths)}
+              for _ in range(4)]
+
+    stacked, offsets = stack_scores(scores, night_indices)
+    assert stacked.shape == (len(scores), sum(night_lengths))
+    assert (offsets == np.array([0, 5, 8, 15])).all()
+
+    for row, group_scores in enumerate(scores):
+        unstacked = unstack_scores(stacked[row], night_indices, offsets)
+        assert unstacked.keys() == group_scores.keys()
+        for night_idx, night_scores in group_scores.items():
+            assert (unstacked[night_idx] == night_scores).all()
+
+    combined = unstack_scores(np.max(stacked, axis=0), night_indices, offsets)
+    for night_idx in night_indices:
+        assert (combined[night_idx] == np.max([group_scores[night_idx] for group_scores in scores], axis=0)).all()
@@ -0,0 +1,34 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import astropy.units as u
+import numpy as np
+from astropy.time import TimeDelta
+from lucupy.minimodel import SkyBackground
+
+from scheduler.core.calculations import SlotMask, TargetInfo
+
+
+def test_target_info_astropy_values():
+    """
+    Ensure that the astropy values of a TargetInfo agree with its plain arrays.
+    """
+    ti = TargetInfo(ra_deg=np.array([10.0, 10.5]),
+                    dec_deg=np.array([-30.0, -30.0]),
+                    alt_deg=np.array([45.0, 50.0]),
+                    az_deg=np.array([90.0, 95.0]),
+                    par_ang_deg=np.array([-20.0, -10.0]),
+                    hourangle_hours=np.array([-1.5, -1.25]),
+                    airmass=np.array([1.41, 1.31]),
+                    sky_brightness=np.full(2, SkyBackground.SBANY),
+                    visibility_slots=SlotMask.from_indices(np.array([0, 1])),
+                    visibility_time=TimeDelta(120, format='sec'),
+                    rem_visibility_time=TimeDelta(600, format='sec'),
+                    rem_visibility_frac=0.2)
+
+    assert np.allclose(ti.coord.ra.to_value(u.deg), ti.ra_deg)
+    assert np.allclose(ti.coord.dec.to_value(u.deg), ti.dec_deg)
+    assert np.allclose(ti.alt.to_value(u.rad), np.radians(ti.alt_deg))
+    assert np.allclose(ti.az.to_value(u.deg), ti.az_deg)
+    assert np.allclose(ti.par_ang.to_value(u.deg), ti.par_ang_deg)
+    assert np.allclose(ti.hourangle.to_value(u.deg), ti.hourangle_hours * 15.0)
@@ -0,0 +1,59 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+from lucupy.minimodel.observation import ObservationClass, ObservationStatus
+from lucupy.types import ZeroTime
+
+from scheduler.core.builder import ValidationBuilder
+from scheduler.core.calculations import TimeAccounting
+from scheduler.core.programprovider.ocs import ocs_program_data, OcsProgramProvider
+from scheduler.core.sources.sources import Sources
+
+
+def test_time_accounting():
+    """
+    Ensure the TimeAccounting records the charged time and status changes without changing the programs.
+    """
+    obs_classes = frozenset({ObservationClass.SCIENCE, ObservationClass.PROGCAL, ObservationClass.PARTNERCAL})
+    sources = Sources()
+    program_provider = OcsProgramProvider(obs_classes, sources)
+
+    program_data = ocs_program_data()
+    programs = [program_provider.parse_program(data['PROGRAM_BASIC']) for data in program_data]
+    for program in programs:
+        ValidationBuilder._clear_observation_info(program.observations(),
+                                                  ValidationBuilder._obs_statuses_to_ready)
+
+    # Use the observation with the most atoms.
+    program, obs = max(((p, o) for p in programs for o in p.observations()), key=lambda po: len(po[1].sequence))
+    time_accounting = TimeAccounting()
+
+    # With no changes recorded, the programs are read as they are.
+    assert time_accounting.status(obs) == obs.status
+    assert time_accounting.program_used(program) == program.program_used()
+    assert (time_accounting.cumulative_exec_times(obs) == obs.cumulative_exec_times()).all()
+
+    atom = obs.sequence[0]
+    time_accounting.charge_atom(obs, 0, atom.prog_time, atom.part_time)
+    time_accounting.set_status(obs, ObservationStatus.ONGOING)
+
+    assert time_accounting.status(obs) == ObservationStatus.ONGOING
+    assert time_accounting.observed(obs, 0)
+    if len(obs.sequence) > 1:
+        assert not time_accounting.observed(obs, 1)
+    assert time_accounting.obs_program_used(obs) == atom.prog_time
+    assert time_accounting.obs_partner_used(obs) == atom.part_time
+    assert time_accounting.program_used(program) == atom.prog_time
+    assert time_accounting.program_total_used(program) == atom.prog_time + atom.part_time
+    assert time_accounting.group_total_used(program.root_group) == atom.prog_time + atom.part_time
+    assert time_accounting.cumulative_exec_times(obs)[0] == ZeroTime
+    assert time_accounting.cumulative_exec_times(obs)[-1] == obs.cumulative_exec_times()[-1] - atom.exec_time
+
+    # Charging an atom again replaces its time rather than adding to it.
+    time_accounting.charge_atom(obs, 0, atom.prog_time, atom.part_time)
+    assert time_accounting.program_used(program) == atom.prog_time
+
+    # The program itself is unchanged.
+    assert obs.status == ObservationStatus.READY
+    assert not atom.observed
+    assert program.total_used() == ZeroTime
@@ -0,0 +1,85 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+from dataclasses import fields
+
+import numpy as np
+from astropy.time import Time
+from lucupy.minimodel import ALL_SITES, NightIndex, Semester, SemesterHalf, Site
+
+from scheduler.core.builder.blueprint import CollectorBlueprint
+from scheduler.core.builder.validationbuilder import ValidationBuilder
+from scheduler.core.calculations import TargetInfo
+from scheduler.core.components.collector import Collector
+from scheduler.core.eventsqueue import EventQueue
+from scheduler.core.sources.sources import Sources
+from scheduler.services.visibility import calculator
+
+
+def _build_collector(**kwargs) -> Collector:
+    num_nights = 3
+    night_indices = frozenset(NightIndex(idx) for idx in range(num_nights))
+    builder = ValidationBuilder(Sources(), EventQueue(night_indices, ALL_SITES))
+    return builder.build_collector(start=Time('2018-10-01 08:00:00', format='iso', scale='utc'),
+                                   end=Time('2018-10-03 08:00:00', format='iso', scale='utc'),
+                                   num_of_nights=num_nights,
+                                   sites=ALL_SITES,
+                                   semesters=frozenset([Semester(2018, SemesterHalf.B)]),
+                                   with_redis=True,
+                                   blueprint=CollectorBlueprint(obs_class=['SCIENCE', 'PROGCAL', 'PARTNERCAL'],
+                                                                prg_type=['Q', 'LP', 'FT', 'DD'],
+                                                                time_slot_length=1.0,
+                                                                **kwargs))
+
+
+def _assert_same_target_info(target_info: TargetInfo, expected: TargetInfo) -> None:
+    for field in fields(TargetInfo):
+        value, expected_value = getattr(target_info, field.name), getattr(expected, field.name)
+        if isinstance(value, np.ndarray):
+            assert np.array_equal(value, expected_value)
+        else:
+            assert value == expected_value
+
+
+def test_max_target_info_nights(visibility_calculator_fixture):
+    """
+    Ensure that only the given number of nights of target information are kept, and that the nights dropped are
+    calculated again as they were when they are accessed.
+    """
+    collector = _build_collector(max_target_info_nights=2)
+    assert collector.max_target_info_nights == 2
+
+    site = Site.GN
+    obs_id = next(obs.id for obs, _ in collector._site_observations[site])
+    target_info = Collector.get_target_info(obs_id)
+    original = {night_idx: target_info[night_idx] for night_idx in range(collector.num_nights_calculated)}
+
+    # The first night was used least recently, so it was dropped along with its target tracks.
+    assert list(collector._night_target_info) == [(site, NightIndex(1)), (site, NightIndex(2))]
+    assert (site, NightIndex(0)) not in collector._target_tracks
+
+    recalculated = target_info[NightIndex(0)]
+    assert recalculated is not original[NightIndex(0)]
+    _assert_same_target_info(recalculated, original[NightIndex(0)])
+    assert list(collector._night_target_info) == [(site, NightIndex(2)), (site, NightIndex(0))]
+    assert (site, NightIndex(1)) not in collector._target_tracks
+
+
+def test_track_cache_dir(visibility_calculator_fixture, monkeypatch, tmp_path):
+    """
+    Ensure that a Collector with the same track cache directory as a previous one loads the target tracks from it
+    instead of calculating them, and that its target information is the same.
+    """
+    collector = _build_collector(track_cache_dir=tmp_path)
+    obs_ids = [obs.id for observations in collector._site_observations.values() for obs, _ in observations]
+    original = {(obs_id, night_idx): Collector.get_target_info(obs_id)[night_idx]
+                for obs_id in obs_ids for night_idx in range(collector.num_nights_calculated)}
+    assert list(tmp_path.glob('*/*.npy'))
+
+    def _calculate_target_tracks(*args, **kwargs):
+        raise AssertionError('The target tracks should be loaded from the track cache.')
+
+    monkeypatch.setattr(calculator, '_calculate_target_tracks', _calculate_target_tracks)
+    _build_collector(track_cache_dir=tmp_path)
+    for (obs_id, night_idx), expected in original.items():
+        _assert_same_target_info(Collector.get_target_info(obs_id)[night_idx], expected)
@@ -32,3 +32,24 @@ def test_proper_motion(target, time):
     coord = ProperMotionCalculator().calculate_coordinates(target, time, 10)
     assert abs(coord.ra.deg[0] - 78.85740081) < 1e-5
     assert abs(coord.dec.deg[0] - 15.63008372) < 1e-5
+
+
+def test_proper_motion_for_targets(target, time):
+    """
+    Test that the coordinates calculated for a number of targets at once agree with those calculated per target.
+    """
+    other = SiderealTarget(name=TargetName('other'),
+                           magnitudes=frozenset(),
+                           type=TargetType.OTHER,
+                           ra=210.5,
+                           dec=-45.25,
+                           pm_ra=120.0,
+                           pm_dec=-30.0,
+                           epoch=2015.5)
+    calculator = ProperMotionCalculator()
+    coords = calculator.calculate_coordinates_for_targets([target, other, target], time, 10)
+    assert coords.shape == (3, 10)
+    for row, t in enumerate([target, other, target]):
+        coord = calculator.calculate_coordinates(t, time, 10)
+        assert (coords[row].ra.deg == coord.ra.deg).all()
+        assert (coords[row].dec.deg == coord.dec.deg).all()
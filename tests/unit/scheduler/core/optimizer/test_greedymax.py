@@ -0,0 +1,337 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import itertools
+from dataclasses import replace
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+from lucupy.minimodel import NightIndex, Site, UniqueGroupID
+from lucupy.timeutils import time2slots
+
+from scheduler.core.builder.blueprint import SelectorBlueprint
+from scheduler.core.builder.schedulerbuilder import SchedulerBuilder
+from scheduler.core.calculations.selection import Selection
+from scheduler.core.components.optimizer import Optimizer
+from scheduler.core.components.optimizer import base
+from scheduler.core.components.optimizer.greedymax import GreedyMaxOptimizer
+from scheduler.core.plans import Plans
+
+
+def _select(collector, **kwargs) -> Selection:
+    selector = SchedulerBuilder.build_selector(collector=collector,
+                                               num_nights_to_schedule=collector.num_nights_calculated,
+                                               blueprint=SelectorBlueprint('NONE', None))
+    for site in collector.sites:
+        selector.update_site_variant(site)
+    return selector.select(**kwargs)
+
+
+def _num_visits(nights: List[Plans]) -> int:
+    return sum(len(plan.visits) for plans in nights for plan in plans)
+
+
+def _rescan_max_group(optimizer: GreedyMaxOptimizer,
+                      night_idx: NightIndex) -> Optional[Tuple[UniqueGroupID, int, int, float]]:
+    """
+    Find the group to schedule next by evaluating every remaining group on every open interval, as GreedyMax did
+    before it kept a candidate queue. Returns the group, the start and end of its interval, and its score.
+    """
+    n_slots_min_visit = time2slots(optimizer.time_slot_length, optimizer.min_visit_len)
+    candidates = []
+    for group_data in optimizer.group_data_map.values():
+        timeline = optimizer.timelines[night_idx][group_data.group.observations()[0].site]
+        if timeline.is_full:
+            continue
+        scores = group_data.group_info.scores[night_idx]
+        n_min, n_slots_remaining, _, _ = optimizer._min_slots_remaining(group_data.group)
+        for interval in timeline.get_available_intervals():
+            if len(interval) == 0 or np.max(scores[interval]) <= 0.0:
+                continue
+            best_score, best_interval = 0.0, None
+            for start, stop in GreedyMaxOptimizer.non_zero_intervals(scores[interval]):
+                score = np.max(scores[interval[start:stop]])
+                if 0 < n_slots_remaining - (stop - start) < n_slots_min_visit:
+                    score *= 0.5
+                if score > best_score and stop - start >= n_min:
+                    best_score, best_interval = score, interval[start:stop]
+            if best_interval is not None:
+                candidates.append((best_score, group_data.group.unique_id, best_interval, n_slots_remaining))
+
+    if not candidates:
+        return None
+
+    # Prefer a group within 10% of the top score if it does not need to be split.
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    score_limit = candidates[0][0] * 0.9
+    score, unique_group_id, interval, _ = next((candidate for candidate in candidates
+                                                if candidate[0] >= score_limit and candidate[3] <= len(candidate[2])),
+                                               candidates[0])
+    return unique_group_id, interval[0], interval[-1] + 1, score
+
+
+def _schedule_checked(algorithm: GreedyMaxOptimizer, selection: Selection, monkeypatch) -> int:
+    """
+    Schedule the selection, checking each group picked against _rescan_max_group.
+    Returns the number of groups picked.
+    """
+    find_max_group = algorithm._find_max_group
+    picks = []
+
+    def checked_find_max_group(plans, *args, **kwargs):
+        expected = _rescan_max_group(algorithm, plans.night_idx)
+        max_group_info = find_max_group(plans, *args, **kwargs)
+        if expected is None:
+            assert max_group_info is None
+        else:
+            unique_group_id, start, stop, score = expected
+            assert max_group_info.group_data.group.unique_id == unique_group_id
+            assert (max_group_info.interval[0], max_group_info.interval[-1] + 1) == (start, stop)
+            assert np.isclose(max_group_info.max_score, score)
+            picks.append(expected)
+        return max_group_info
+
+    monkeypatch.setattr(algorithm, '_find_max_group', checked_find_max_group)
+    Optimizer(algorithm).schedule(selection)
+    return len(picks)
+
+
+def test_find_max_group(scheduler_collector, visibility_calculator_fixture, set_observatory_properties, monkeypatch):
+    """
+    Ensure that every group picked from the candidate queue is the one a rescan of all the groups would pick.
+    """
+    assert _schedule_checked(GreedyMaxOptimizer(), _select(scheduler_collector), monkeypatch) > 1
+
+
+def test_find_max_group_without_split(scheduler_collector, visibility_calculator_fixture, set_observatory_properties,
+                                      monkeypatch):
+    """
+    Ensure that the candidate queue prefers the groups within 10% of the top score that do not need to be split
+    as a rescan does.
+    """
+    selection = _select(scheduler_collector)
+    algorithm = GreedyMaxOptimizer()
+
+    # Have every other group need more time than a night has, so that it would have to be split.
+    split_group_ids = set(list(selection.schedulable_groups)[::2])
+    night_length = max(len(night_events.times[0]) for night_events in selection.night_events.values())
+    min_slots_remaining = algorithm._min_slots_remaining
+
+    def long_min_slots_remaining(group):
+        n_min, n_slots_remaining, n_std, exec_sci_nir = min_slots_remaining(group)
+        if group.unique_id in split_group_ids:
+            n_slots_remaining += night_length
+        return n_min, n_slots_remaining, n_std, exec_sci_nir
+
+    monkeypatch.setattr(algorithm, '_min_slots_remaining', long_min_slots_remaining)
+    assert _schedule_checked(algorithm, selection, monkeypatch) > 1
+
+
+def test_stale_candidate(scheduler_collector, visibility_calculator_fixture, set_observatory_properties):
+    """
+    Ensure that an entry for a group is superseded when its program is rescored.
+    """
+    selection = _select(scheduler_collector)
+    optimizer = GreedyMaxOptimizer().setup(selection)
+    night_idx = NightIndex(0)
+    optimizer._init_candidates(night_idx)
+
+    # The programs of the fixture are all at GN.
+    site = Site.GN
+    max_group_info, (_, gap_start, gap_stop) = optimizer._pop_candidate(night_idx, site)
+    unique_group_id = max_group_info.group_data.group.unique_id
+    program = selection.program_info[max_group_info.group_data.group.program_id].program
+
+    # An entry with a score the group no longer has, e.g. from before its program was charged.
+    stale_group_info = replace(max_group_info, max_score=2 * max_group_info.max_score)
+    optimizer._push_candidate(stale_group_info.max_score, unique_group_id, site, gap_start, gap_stop, stale_group_info)
+    assert optimizer._pop_candidate(night_idx, site)[0] is stale_group_info
+
+    optimizer._push_candidate(stale_group_info.max_score, unique_group_id, site, gap_start, gap_stop, stale_group_info)
+    optimizer._update_score(program, night_idx)
+    top, _ = optimizer._pop_candidate(night_idx, site)
+    assert top is not stale_group_info
+    assert top.group_data.group.unique_id == unique_group_id
+    assert np.isclose(top.max_score, max_group_info.max_score)
+
+
+def test_penalized_candidate(scheduler_collector, visibility_calculator_fixture, set_observatory_properties,
+                             monkeypatch):
+    """
+    Ensure that a group whose score was penalized on an open interval is queued again when the interval is split.
+    """
+    selection = _select(scheduler_collector)
+    optimizer = GreedyMaxOptimizer().setup(selection)
+    night_idx = NightIndex(0)
+    optimizer._init_candidates(night_idx)
+
+    # The programs of the fixture are all at GN.
+    site = Site.GN
+    max_group_info, (_, gap_start, gap_stop) = optimizer._pop_candidate(night_idx, site)
+    group_data = max_group_info.group_data
+    unique_group_id = group_data.group.unique_id
+    start, stop = max_group_info.interval[0], max_group_info.interval[-1] + 1
+
+    # Have the group need one more time slot than it can get, which halves its score.
+    min_slots_remaining = optimizer._min_slots_remaining
+
+    def short_min_slots_remaining(group):
+        n_min, n_slots_remaining, n_std, exec_sci_nir = min_slots_remaining(group)
+        if group.unique_id == unique_group_id:
+            return 1, stop - start + 1, n_std, exec_sci_nir
+        return n_min, n_slots_remaining, n_std, exec_sci_nir
+
+    monkeypatch.setattr(optimizer, '_min_slots_remaining', short_min_slots_remaining)
+    optimizer._push_candidates(night_idx, group_data, [(gap_start, gap_stop)])
+    penalized_group_info = None
+    while penalized_group_info is None:
+        candidate, _ = optimizer._pop_candidate(night_idx, site)
+        if candidate.group_data.group.unique_id == unique_group_id:
+            penalized_group_info = candidate
+    assert np.isclose(penalized_group_info.max_score, max_group_info.max_score / 2)
+    assert not any(key[0] == unique_group_id for key in optimizer._live_candidates)
+
+    # Fill a time slot inside the interval of the group: the group is queued on the open intervals left.
+    timeline = optimizer.timelines[night_idx][site]
+    time_slot = (start + stop) // 2
+    timeline.add(0, 1, np.array([time_slot]))
+    optimizer._split_gap(night_idx, site, time_slot)
+    requeued_gaps = {(key[2], key[3]) for key in optimizer._live_candidates if key[0] == unique_group_id}
+    assert requeued_gaps == {(gap_start, time_slot), (time_slot + 1, gap_stop)}
+
+
+def test_anytime_plans(scheduler_collector, visibility_calculator_fixture, set_observatory_properties, monkeypatch):
+    """
+    Ensure that the optimizer stops at the deadline of its time budget and returns the plans built so far.
+    """
+    algorithm = GreedyMaxOptimizer()
+    nights = Optimizer(algorithm).schedule(_select(scheduler_collector))
+    full_placements = sum(algorithm.placements.values())
+    assert full_placements > 1
+    assert _num_visits(nights) > 0
+
+    # With no time left, the plans are returned empty.
+    algorithm = GreedyMaxOptimizer(time_budget=timedelta(0))
+    nights = Optimizer(algorithm).schedule(_select(scheduler_collector))
+    assert all(placements == 0 for placements in algorithm.placements.values())
+    assert _num_visits(nights) == 0
+
+    # With a clock that advances by one second each time it is read, the deadline of a budget of two seconds is
+    # set at the start of schedule and reached after one check, so only the first group of the first night is placed.
+    clock = itertools.count()
+    monkeypatch.setattr(base, 'monotonic', lambda: next(clock))
+    algorithm = GreedyMaxOptimizer(time_budget=timedelta(seconds=2))
+    nights = Optimizer(algorithm).schedule(_select(scheduler_collector))
+    assert [algorithm.placements[plans.night_idx] for plans in nights] == [1] + [0] * (len(nights) - 1)
+    assert _num_visits(nights[:1]) > 0
+    assert _num_visits(nights[1:]) == 0
+
+
+def test_warm_start(scheduler_collector, visibility_calculator_fixture, set_observatory_properties, monkeypatch):
+    """
+    Ensure that replanning from the previous plans keeps the visits that are still valid and drops the others.
+    """
+    previous_nights = Optimizer(GreedyMaxOptimizer()).schedule(_select(scheduler_collector))
+    previous_plan = max(previous_nights[0], key=lambda plan: len(plan.visits))
+    site = previous_plan.site
+    assert len(previous_plan.visits) > 1
+
+    # Replan the night from the start of its second visit: only the visits from then on can be kept.
+    starting_time_slot = sorted(visit.start_time_slot for visit in previous_plan.visits)[1]
+    selection = _select(scheduler_collector, starting_time_slots={site: {0: starting_time_slot}})
+
+    kept_groups = {}
+    warm_start = GreedyMaxOptimizer._warm_start
+
+    def counting_warm_start(self, night_idx):
+        kept_groups[night_idx] = warm_start(self, night_idx)
+        return kept_groups[night_idx]
+
+    monkeypatch.setattr(GreedyMaxOptimizer, '_warm_start', counting_warm_start)
+    nights = Optimizer(GreedyMaxOptimizer()).schedule(selection, previous_nights=previous_nights)
+    assert kept_groups[0] > 0
+
+    def visits(plan):
+        return {(visit.obs_id, visit.start_time_slot, visit.atom_start_idx, visit.atom_end_idx)
+                for visit in plan.visits}
+
+    plan = nights[0][site]
+    assert {visit for visit in visits(previous_plan) if visit[1] >= starting_time_slot} <= visits(plan)
+    assert all(visit.start_time_slot >= starting_time_slot for visit in plan.visits)
+
+
+def test_min_slots_remaining(scheduler_collector, visibility_calculator_fixture, set_observatory_properties,
+                             monkeypatch):
+    """
+    Ensure that the cached remaining time of a group is the one calculated from scratch once time is charged to it,
+    both when the group is placed and when time is charged to one of its observations directly.
+    """
+    selection = _select(scheduler_collector)
+    optimizer = GreedyMaxOptimizer().setup(selection)
+    night_idx = NightIndex(0)
+    optimizer._init_candidates(night_idx)
+    plans = Plans(selection.night_events, selection.night_conditions, night_idx)
+
+    # Do not rescore the program so that only the charged time changes the remaining time.
+    monkeypatch.setattr(optimizer, '_update_score', lambda program, night_idx: None)
+    max_group_info = optimizer._find_max_group(plans)
+    placed_group = max_group_info.group_data.group
+    slots_remaining = optimizer._min_slots_remaining(placed_group)
+    assert optimizer.add(night_idx, max_group_info)
+    assert optimizer._calculate_min_slots_remaining(placed_group) != slots_remaining
+    assert optimizer._min_slots_remaining(placed_group) == optimizer._calculate_min_slots_remaining(placed_group)
+
+    group = next(group_data.group for unique_group_id, group_data in optimizer.group_data_map.items()
+                 if unique_group_id != placed_group.unique_id)
+    slots_remaining = optimizer._min_slots_remaining(group)
+    for obs in group.observations():
+        optimizer._charge_time(obs)
+    assert optimizer._calculate_min_slots_remaining(group) != slots_remaining
+    assert optimizer._min_slots_remaining(group) == optimizer._calculate_min_slots_remaining(group)
+
+
+def _visits(nights: List[Plans]) -> List[List[Tuple]]:
+    return [[(plan.site, visit.obs_id, visit.start_time_slot, visit.atom_start_idx, visit.atom_end_idx)
+             for plan in plans for visit in plan.visits]
+            for plans in nights]
+
+
+def test_score_matrices(scheduler_collector, visibility_calculator_fixture, set_observatory_properties):
+    """
+    Ensure that the scores of the schedulable groups become views of the rows of the score matrices, and that
+    updating the scores of a group writes them into its rows.
+    """
+    selection = _select(scheduler_collector)
+    scores = {unique_group_id: {night_idx: np.array(night_scores)
+                                for night_idx, night_scores in group_data.group_info.scores.items()}
+              for unique_group_id, group_data in selection.schedulable_groups.items()}
+    score_matrices = selection.build_score_matrices()
+    assert selection.build_score_matrices() is score_matrices
+
+    for unique_group_id, group_data in selection.schedulable_groups.items():
+        site = group_data.group.observations()[0].site
+        for night_idx in selection.night_indices:
+            row = group_data.group_info.scores[night_idx]
+            assert np.shares_memory(row, score_matrices[(site, night_idx)].scores)
+            assert np.array_equal(row, scores[unique_group_id][night_idx])
+
+    unique_group_id, group_data = next(iter(selection.schedulable_groups.items()))
+    site = group_data.group.observations()[0].site
+    rescored = {night_idx: night_scores * 0.5 for night_idx, night_scores in scores[unique_group_id].items()}
+    selection.update_scores(unique_group_id, rescored)
+    for night_idx in selection.night_indices:
+        assert np.array_equal(group_data.group_info.scores[night_idx], rescored[night_idx])
+        assert np.array_equal(score_matrices[(site, night_idx)].row(unique_group_id), rescored[night_idx])
+
+
+def test_dense_scores(scheduler_collector, visibility_calculator_fixture, set_observatory_properties):
+    """
+    Ensure that scheduling from the score matrices gives the same plans as scheduling from the scores per group.
+    """
+    nights = Optimizer(GreedyMaxOptimizer()).schedule(_select(scheduler_collector))
+    dense_selection = _select(scheduler_collector)
+    dense_nights = Optimizer(GreedyMaxOptimizer(dense_scores=True)).schedule(dense_selection)
+    assert dense_selection.score_matrices
+    assert _num_visits(nights) > 0
+    assert _visits(dense_nights) == _visits(nights)
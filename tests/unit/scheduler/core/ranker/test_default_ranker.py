@@ -0,0 +1,80 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import numpy as np
+from lucupy.minimodel import ProgramID
+
+from scheduler.core.components.collector import Collector
+from scheduler.core.components.ranker import DefaultRanker, RankerParameters
+from scheduler.core.components.ranker.default import _combine_scores_default, _default_score_combiner
+
+
+def test_score_observations(scheduler_collector, visibility_calculator_fixture):
+    """
+    Ensure that scoring the observations of a program together gives the same scores as scoring them one at a time.
+    """
+    night_indices = np.arange(scheduler_collector.num_nights_calculated)
+    ranker = DefaultRanker(scheduler_collector, night_indices, scheduler_collector.sites)
+
+    scored = False
+    for program_id in Collector.get_program_ids():
+        program = Collector.get_program(program_id)
+        observations = program.observations()
+        DefaultRanker.clear_static_factors()
+        scores = ranker.score_observations(program, observations)
+        assert scores.keys() == {obs.id for obs in observations}
+        scored |= any(np.any(night_scores > 0) for obs_scores in scores.values() for night_scores in obs_scores.values())
+
+        for obs in observations:
+            DefaultRanker.clear_static_factors()
+            obs_scores = ranker.score_observation(program, obs)
+            for night_idx in night_indices:
+                assert np.allclose(scores[obs.id][night_idx], obs_scores[night_idx])
+    assert scored
+
+
+def test_static_factors_invalidation(scheduler_collector, visibility_calculator_fixture, monkeypatch):
+    """
+    Ensure that the cached static factors are not used after the ranker parameters change or programs are reloaded.
+    """
+    night_indices = np.arange(scheduler_collector.num_nights_calculated)
+    program = Collector.get_program(ProgramID('GN-2018B-Q-101'))
+    observations = program.observations()
+
+    DefaultRanker.clear_static_factors()
+    ranker = DefaultRanker(scheduler_collector, night_indices, scheduler_collector.sites)
+    scores = ranker.score_observations(program, observations)
+
+    # A ranker with other parameters gives the scores calculated afresh for its parameters.
+    params = RankerParameters(vis_power=2.0)
+    other_scores = DefaultRanker(scheduler_collector, night_indices, scheduler_collector.sites,
+                                 params=params).score_observations(program, observations)
+    DefaultRanker.clear_static_factors()
+    expected_scores = DefaultRanker(scheduler_collector, night_indices, scheduler_collector.sites,
+                                    params=params).score_observations(program, observations)
+    assert any(not np.allclose(other_scores[obs.id][0], scores[obs.id][0]) for obs in observations)
+    for obs in observations:
+        for night_idx in night_indices:
+            assert np.allclose(other_scores[obs.id][night_idx], expected_scores[obs.id][night_idx])
+
+    # After the programs are reloaded, the static factors are calculated again.
+    ranker.score_observations(program, observations)
+    cached_factors = ranker.cached_factors(obs.id for obs in observations)
+    monkeypatch.setattr(Collector, '_load_generation', Collector.get_load_generation() + 1)
+    ranker.score_observations(program, observations)
+    assert all(ranker.cached_factors([key[0]])[key] is not factors for key, factors in cached_factors.items())
+
+
+def test_combine_scores_default():
+    """
+    Ensure that combining the stacked scores of the subgroups of an AND group for all time slots at once gives the
+    scores of the default score combiner applied to each time slot.
+    """
+    rng = np.random.default_rng(0)
+    stacked = rng.random((3, 50))
+    stacked[rng.random(stacked.shape) < 0.2] = 0.
+    stacked[:, :5] = 0.
+    expected = np.apply_along_axis(_default_score_combiner, 0, stacked)[0]
+    combined = _combine_scores_default(stacked)
+    assert (combined == 0.).any() and (combined > 0.).any()
+    assert (combined == expected).all()
@@ -0,0 +1,222 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import operator
+from copy import deepcopy
+from dataclasses import replace
+from datetime import timedelta
+from functools import reduce
+
+import astropy.units as u
+import numpy as np
+from astropy.coordinates import Angle
+from lucupy.minimodel import (CloudCover, Conditions, GroupID, ImageQuality, ProgramID, SkyBackground, TooType,
+                              VariantSnapshot, WaterVapor)
+
+from scheduler.core.builder.blueprint import SelectorBlueprint
+from scheduler.core.builder.schedulerbuilder import SchedulerBuilder
+from scheduler.core.calculations import GroupDataMap
+from scheduler.core.components.ranker import DefaultRanker
+from scheduler.core.components.ranker.default import _default_score_combiner
+from scheduler.core.components.selector import Selector
+
+
+def _selector(collector, **kwargs) -> Selector:
+    selector = SchedulerBuilder.build_selector(collector=collector,
+                                               num_nights_to_schedule=collector.num_nights_calculated,
+                                               blueprint=SelectorBlueprint('NONE', None),
+                                               **kwargs)
+    for site in collector.sites:
+        selector.update_site_variant(site)
+    return selector
+
+
+def _assert_same_scores(group_data_map: GroupDataMap, expected_group_data_map: GroupDataMap) -> None:
+    assert group_data_map.keys() == expected_group_data_map.keys()
+    for unique_group_id, group_data in group_data_map.items():
+        expected_scores = expected_group_data_map[unique_group_id].group_info.scores
+        assert group_data.group_info.scores.keys() == expected_scores.keys()
+        for night_idx, scores in group_data.group_info.scores.items():
+            assert np.allclose(scores, expected_scores[night_idx])
+
+
+def test_rescore_program(scheduler_collector, visibility_calculator_fixture):
+    """
+    Ensure that rescoring a program after charging time to it gives the same scores as scoring it again.
+    """
+    selection = _selector(scheduler_collector).select()
+    program_info = selection.program_info[ProgramID('GN-2018B-Q-101')]
+    program = program_info.program
+    obs, other_obs = list(program_info.observations.values())[:2]
+
+    selection.time_accounting.charge_atom(obs, 0, obs.sequence[0].exec_time / 2, timedelta())
+    rescored = selection.rescore_program(program)
+    scored = selection.score_program(program)
+
+    _assert_same_scores(rescored.group_data_map, scored.group_data_map)
+    # The time charged to the program changes the scores of its other observations.
+    unique_group_id = other_obs.to_unique_group_id
+    assert not np.allclose(scored.group_data_map[unique_group_id].group_info.scores[0],
+                           program_info.group_data_map[unique_group_id].group_info.scores[0])
+
+
+def test_parallel_scores(scheduler_collector, visibility_calculator_fixture):
+    """
+    Ensure that scoring the programs in forked processes gives the same scores as scoring them sequentially, and that
+    the static factors calculated by the workers are added to the cache of the ranker.
+    """
+    DefaultRanker.clear_static_factors()
+    selection = _selector(scheduler_collector).select()
+
+    DefaultRanker.clear_static_factors()
+    parallel_selection = _selector(scheduler_collector, num_processes=2).select()
+
+    assert parallel_selection.program_info.keys() == selection.program_info.keys()
+    for program_id, program_info in parallel_selection.program_info.items():
+        _assert_same_scores(program_info.group_data_map, selection.program_info[program_id].group_data_map)
+    for program_info in selection.program_info.values():
+        for obs_id in program_info.observations:
+            assert all((obs_id, night_idx) in DefaultRanker._static_factors for night_idx in selection.night_indices)
+
+
+def test_incremental_select(scheduler_collector, visibility_calculator_fixture, monkeypatch):
+    """
+    Ensure that a selection derived from the last one for later starting time slots is the same as a new selection.
+    """
+    selector = _selector(scheduler_collector, incremental=True)
+    selector.select()
+
+    starting_time_slots = {site: {0: 120} for site in scheduler_collector.sites}
+    selection = _selector(scheduler_collector).select(starting_time_slots=deepcopy(starting_time_slots))
+
+    # The derived selection does not score the programs again.
+    def fail(*args, **kwargs):
+        raise AssertionError('The programs were scored again.')
+    monkeypatch.setattr(Selector, '_score_programs', fail)
+    incremental_selection = selector.select(starting_time_slots=deepcopy(starting_time_slots))
+
+    assert incremental_selection.schedulable_groups.keys() == selection.schedulable_groups.keys()
+    assert incremental_selection.program_info.keys() == selection.program_info.keys()
+    for program_id, program_info in incremental_selection.program_info.items():
+        _assert_same_scores(program_info.group_data_map, selection.program_info[program_id].group_data_map)
+
+
+def test_conditions_scores(scheduler_collector, visibility_calculator_fixture):
+    """
+    Ensure that the memoized conditions and wind scores are the same as the ones calculated for the variant, and that
+    the memos are cleared when a variant changes and at the start of a selection.
+    """
+    selector = _selector(scheduler_collector)
+    required_conditions = [Conditions(cc=CloudCover.CC50, iq=ImageQuality.IQ20, sb=SkyBackground.SBANY,
+                                      wv=WaterVapor.WVANY),
+                           Conditions(cc=CloudCover.CC80, iq=ImageQuality.IQ85, sb=SkyBackground.SB50,
+                                      wv=WaterVapor.WV80),
+                           Conditions(cc=CloudCover.CCANY, iq=ImageQuality.IQANY, sb=SkyBackground.SBANY,
+                                      wv=WaterVapor.WVANY)]
+    azimuth_deg = np.array([0., 75., 90., 105., 115., 270., 355.])
+    variant_snapshots = [VariantSnapshot(iq=iq, cc=cc, wind_dir=Angle(wind_dir, unit=u.deg), wind_spd=wind_spd)
+                         for iq, cc in ((ImageQuality.IQ20, CloudCover.CC50),
+                                        (ImageQuality.IQ70, CloudCover.CC70),
+                                        (ImageQuality.IQANY, CloudCover.CCANY))
+                         for wind_dir, wind_spd in ((0., 0. * u.m / u.s),
+                                                    (1.5, 15. * u.m / u.s),
+                                                    (90., 15. * u.m / u.s))]
+
+    for variant_snapshot in variant_snapshots:
+        variant = variant_snapshot.make_variant(len(azimuth_deg))
+        for conditions in required_conditions:
+            for rising in (False, True):
+                for too_type in (None, TooType.RAPID):
+                    for starting_time_slot in (0, 3):
+                        expected = Selector.match_conditions(conditions, variant, rising, too_type)
+                        expected[:starting_time_slot] = 0
+                        for _ in range(2):
+                            conditions_score = selector._conditions_score(variant_snapshot, conditions, rising,
+                                                                          too_type, len(azimuth_deg),
+                                                                          starting_time_slot)
+                            assert np.array_equal(conditions_score, expected)
+        for _ in range(2):
+            wind_score = selector._wind_score(variant_snapshot, azimuth_deg)
+            assert np.array_equal(wind_score, Selector._wind_conditions(variant, azimuth_deg))
+    assert selector._conditions_scores and selector._wind_scores
+
+    site = next(iter(scheduler_collector.sites))
+    selector.update_site_variant(site, variant_snapshots[-1])
+    assert not selector._conditions_scores and not selector._wind_scores
+
+    # A selection only keeps the scores it calculated itself.
+    key = (None,)
+    selector._conditions_scores[key] = np.zeros(1)
+    selector._wind_scores[key] = np.zeros(1), np.zeros(1)
+    selector.select()
+    assert key not in selector._conditions_scores and key not in selector._wind_scores
+
+
+def test_and_group_scores(scheduler_collector, visibility_calculator_fixture):
+    """
+    Ensure that the AND groups of a program, including those nested in other AND groups, are calculated after their
+    subgroups and get the scores, conditions and wind scores, and schedulable slots combined from them for each night.
+    """
+    selection = _selector(scheduler_collector).select()
+    program_info = selection.program_info[ProgramID('GN-2018B-Q-101')]
+
+    # Nest the AND groups of the program that can be scored in another AND group under the root group, so that all
+    # the groups of the program are scored.
+    program = program_info.program
+    and_groups = [group for group in program.root_group.children
+                  if not group.is_observation_group() and group.unique_id in program_info.group_data_map]
+    assert len(and_groups) > 1
+    nested_group = replace(program.root_group, id=GroupID('nested'), group_name='nested',
+                           number_to_observe=len(and_groups), children=and_groups)
+    program = replace(program, root_group=replace(program.root_group, number_to_observe=1, children=[nested_group]))
+
+    def post_order(group):
+        if group.is_observation_group():
+            return [group]
+        return [subgroup for child in group.children for subgroup in post_order(child)] + [group]
+
+    assert Selector._post_order(program.root_group) == post_order(program.root_group)
+
+    group_data_map = selection.score_program(program).unfiltered_group_data_map
+    assert nested_group.unique_id in group_data_map and program.root_group.unique_id in group_data_map
+    for group in post_order(program.root_group):
+        if group.is_observation_group():
+            continue
+        group_info = group_data_map[group.unique_id].group_info
+        subgroup_infos = [group_data_map[subgroup.unique_id].group_info for subgroup in group.children]
+        for night_idx in selection.night_indices:
+            for attr in ('conditions_score', 'wind_score'):
+                expected = np.prod([getattr(subgroup_info, attr)[night_idx] for subgroup_info in subgroup_infos],
+                                   axis=0)
+                assert np.allclose(getattr(group_info, attr)[night_idx], expected)
+            expected = reduce(operator.or_, [subgroup_info.schedulable_slots[night_idx]
+                                             for subgroup_info in subgroup_infos])
+            assert group_info.schedulable_slots[night_idx] == expected
+            expected = np.apply_along_axis(_default_score_combiner, 0,
+                                           np.array([np.asarray(subgroup_info.scores[night_idx])
+                                                     for subgroup_info in subgroup_infos]))[0]
+            assert np.allclose(np.asarray(group_info.scores[night_idx]), expected)
+
+
+def test_wind_score(scheduler_collector, visibility_calculator_fixture):
+    """
+    Ensure that the wind score is zero where the azimuth is within 20 degrees of the wind direction when the wind
+    is above the speed bound, and one elsewhere.
+    """
+    selector = _selector(scheduler_collector)
+    azimuth_deg = np.array([0.0, 75.0, 90.0, 105.0, 115.0, 270.0, 355.0])
+
+    windy = VariantSnapshot(iq=ImageQuality.IQ70, cc=CloudCover.CC70, wind_dir=Angle(90.0, unit=u.deg),
+                            wind_spd=15.0 * u.m / u.s)
+    expected = np.array([1.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0])
+    assert np.array_equal(selector._wind_score(windy, azimuth_deg), expected)
+    assert np.array_equal(Selector._wind_conditions(windy.make_variant(len(azimuth_deg)), azimuth_deg), expected)
+
+    # The separation wraps around north.
+    windy_north = VariantSnapshot(iq=ImageQuality.IQ70, cc=CloudCover.CC70, wind_dir=Angle(10.0, unit=u.deg),
+                                  wind_spd=15.0 * u.m / u.s)
+    assert np.array_equal(selector._wind_score(windy_north, azimuth_deg), [0.0, 1.0, 1.0, 1.0, 1.0, 1.0, 0.0])
+
+    calm = VariantSnapshot(iq=ImageQuality.IQ70, cc=CloudCover.CC70, wind_dir=Angle(90.0, unit=u.deg),
+                           wind_spd=5.0 * u.m / u.s)
+    assert np.array_equal(selector._wind_score(calm, azimuth_deg), np.ones(len(azimuth_deg)))
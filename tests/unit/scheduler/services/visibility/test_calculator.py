@@ -0,0 +1,67 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+from dataclasses import replace
+
+import numpy as np
+from lucupy.minimodel import NightIndex, SiderealTarget, Site, SkyBackground
+
+from scheduler.core.components.collector import Collector
+from scheduler.services.visibility import TargetTrack
+from scheduler.services.visibility.calculator import calculate_sidereal_target_tracks, calculate_target_snapshot
+
+
+def _with_sb(obs, sb: SkyBackground):
+    conditions = replace(obs.constraints.conditions, sb=sb)
+    return replace(obs, constraints=replace(obs.constraints, conditions=conditions))
+
+
+def _assert_close(values, expected, period=None):
+    diff = values - expected
+    if period is not None:
+        diff = (diff + period / 2) % period - period / 2
+    assert np.allclose(diff, 0.0, atol=1e-6)
+
+
+def test_sidereal_target_tracks(scheduler_collector, visibility_calculator_fixture):
+    """
+    Ensure that the tracks of sidereal targets calculated together agree with the snapshots calculated per target,
+    including the sky brightness, and that observations of the same target with different sky background constraints
+    share its track.
+    """
+    site = Site.GN
+    night_idx = NightIndex(0)
+    night_events = scheduler_collector.get_night_events(site)
+    time_grid_night = scheduler_collector.time_grid[night_idx]
+    time_slot_length = scheduler_collector.time_slot_length
+
+    targets = [(obs, target) for obs, target in Collector._observations.values()
+               if obs.site == site and isinstance(target, SiderealTarget) and obs.constraints is not None]
+    assert targets
+
+    # Add two observations of the same target, with and without a sky background constraint.
+    obs, target = targets[0]
+    targets += [(_with_sb(obs, SkyBackground.SB50), target), (_with_sb(obs, SkyBackground.SBANY), target)]
+
+    tracks = calculate_sidereal_target_tracks(night_idx, targets, night_events, time_grid_night, time_slot_length)
+    assert len(tracks) == len(targets)
+    for (obs, target), track in zip(targets, tracks):
+        expected = TargetTrack.from_snapshot(calculate_target_snapshot(night_idx,
+                                                                       obs,
+                                                                       target,
+                                                                       night_events,
+                                                                       time_grid_night,
+                                                                       time_slot_length))
+        _assert_close(track.ra_deg, expected.ra_deg, 360.0)
+        _assert_close(track.dec_deg, expected.dec_deg)
+        _assert_close(track.alt_deg, expected.alt_deg)
+        _assert_close(track.az_deg, expected.az_deg, 360.0)
+        _assert_close(track.par_ang_deg, expected.par_ang_deg, 360.0)
+        _assert_close(track.hourangle_hours, expected.hourangle_hours, 24.0)
+        _assert_close(track.airmass, expected.airmass)
+        assert np.array_equal(track.sky_brightness, expected.sky_brightness)
+
+    sb_track, sb_any_track = tracks[-2:]
+    assert sb_track.alt_deg is sb_any_track.alt_deg
+    assert np.all(sb_any_track.sky_brightness == SkyBackground.SBANY)
+    assert np.any(sb_track.sky_brightness < SkyBackground.SBANY)
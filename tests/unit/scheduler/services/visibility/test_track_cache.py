@@ -0,0 +1,57 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+from types import SimpleNamespace
+
+import astropy.units as u
+import numpy as np
+from astropy.coordinates import Angle
+from astropy.time import Time, TimeDelta
+from lucupy.minimodel import NightIndex, Site
+
+from scheduler.services.visibility import TargetTrack, TargetTrackCache
+
+
+def _track(rng: np.random.Generator, num_time_slots: int) -> TargetTrack:
+    return TargetTrack(**{column: rng.uniform(-90, 90, num_time_slots) for column in TargetTrackCache._COLUMNS})
+
+
+def test_target_track_cache(tmp_path):
+    """
+    Ensure that the cached tracks are stored per target and only found for the same targets and time grid.
+    """
+    num_time_slots = 20
+    night_idx = NightIndex(0)
+    night_events = SimpleNamespace(site=Site.GS,
+                                   num_timeslots_per_night=[num_time_slots],
+                                   local_sidereal_times=[Angle(np.linspace(0, 5, num_time_slots), unit=u.hourangle)])
+    time_grid_night = Time('2018-10-01 00:00:00')
+    time_slot_length = TimeDelta(60 * u.s)
+
+    rng = np.random.default_rng(0)
+    tracks = {(10.0, -30.0, 0.0, 0.0, 2000.0): _track(rng, num_time_slots),
+              (200.0, 15.0, 1.5, -2.0, 2000.0): _track(rng, num_time_slots)}
+
+    cache = TargetTrackCache(tmp_path / 'tracks')
+    assert cache.load(night_idx, tracks, night_events, time_grid_night, time_slot_length) == {}
+    cache.save(night_idx, tracks, night_events, time_grid_night, time_slot_length)
+    assert len(list((tmp_path / 'tracks').glob('*/*.npy'))) == len(tracks)
+
+    loaded = TargetTrackCache(tmp_path / 'tracks').load(night_idx, reversed(list(tracks)),
+                                                        night_events, time_grid_night, time_slot_length)
+    assert loaded.keys() == tracks.keys()
+    for key, track in tracks.items():
+        for column in TargetTrackCache._COLUMNS:
+            assert np.array_equal(getattr(loaded[key], column), getattr(track, column))
+        assert loaded[key].sky_brightness is None
+
+    # A different set of targets only finds the cached tracks of its targets, and only the new tracks are written.
+    other_key = (300.0, 45.0, 0.0, 0.0, 2000.0)
+    keys = [next(iter(tracks)), other_key]
+    assert cache.load(night_idx, keys, night_events, time_grid_night, time_slot_length).keys() == {keys[0]}
+    cache.save(night_idx, {other_key: _track(rng, num_time_slots)}, night_events, time_grid_night, time_slot_length)
+    assert len(list((tmp_path / 'tracks').glob('*/*.npy'))) == len(tracks) + 1
+    assert cache.load(night_idx, keys, night_events, time_grid_night, time_slot_length).keys() == set(keys)
+
+    # A different time grid does not use the cached tracks.
+    assert cache.load(night_idx, tracks, night_events, time_grid_night + 1 * u.day, time_slot_length) == {}